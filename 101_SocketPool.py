@@ -4,6 +4,9 @@ import selectors
 import threading
 import json
 import os
+import time
+import struct
+import packetlibX
 
 # ——— Load configuration ———
 cfg_path = os.path.join(os.path.dirname(__file__), 'config/socket_pool_config.json')
@@ -15,6 +18,9 @@ CONTROL_PORT = cfg['CONTROL_PORT']
 DATA_HOST    = cfg['DATA_HOST']
 DATA_PORT    = cfg['DATA_PORT']
 BUFFER_SIZE  = cfg['BUFFER_SIZE']
+COUNTER_LOG_INTERVAL = cfg.get('COUNTER_LOG_INTERVAL', 10.0)   # seconds between udp counter and drop reports
+UDP_RCVBUF   = cfg.get('UDP_RCVBUF', 16 << 20)   # kernel buffers of the board UDP ports, 0 for the system default
+UDP_SNDBUF   = cfg.get('UDP_SNDBUF', 1 << 20)
 
 class SocketPool:
     def __init__(self):
@@ -22,6 +28,11 @@ class SocketPool:
         self.port_socks    = {}   # UDP port → socket
         self.registrations = {}   # (typ, port, src_ip) → set(worker_id)
         self.data_conns    = {}   # (worker_id, typ) → TCP data socket
+        self.data_framed   = set()# (worker_id, typ) sent as length + datagram
+        self.counters      = {}   # (src_ip, port) → packetlibX.counter_tracker
+        self.counters_logged = {} # (src_ip, port) → snapshot at the last report
+        self.drops_logged  = {}   # UDP port → kernel drop counter at the last report
+        self.next_counter_log = time.monotonic() + COUNTER_LOG_INTERVAL
 
         # --- TCP control server ---
         self.ctrl_svr = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -68,7 +79,14 @@ class SocketPool:
                 continue
             # store per‐worker, per‐direction data socket
             self.data_conns[(wid, direction)] = conn
-            print(f"[Pool] {direction.upper():4} socket connected: {wid}", flush=True)
+            # workers that ask for it get length-prefixed datagrams
+            # (packetlibX.framed_socket), so any datagram size keeps its
+            # boundaries on the TCP stream
+            if msg.get("framing") == "length":
+                self.data_framed.add((wid, direction))
+            else:
+                self.data_framed.discard((wid, direction))
+            print(f"[Pool] {direction.upper():4} socket connected: {wid}{' (framed)' if (wid, direction) in self.data_framed else ''}", flush=True)
 
     def _handle_control(self, conn):
         try:
@@ -103,6 +121,9 @@ class SocketPool:
                         print(f"[Pool] UNREGISTER {worker_id} → {key}")
                     else:
                         conn.send(b'{"status":"error","reason":"not registered"}')
+                elif action == "stats":
+                    conn.send(json.dumps({"status": "ok", "counters": self.counter_stats(), "sockets": self.socket_stats()}).encode())
+
                 else:
                     conn.send(b'{"status":"error","reason":"bad action"}')
         except Exception as e:
@@ -118,10 +139,23 @@ class SocketPool:
         udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try: udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         except AttributeError: pass
+        # large kernel buffers, a machine-gun burst of 8 ASICs arrives faster
+        # than the forwarding loop can empty the default ones
+        if UDP_RCVBUF > 0:
+            packetlibX.set_socket_buffer(udp, UDP_RCVBUF, socket.SO_RCVBUF)
+        if UDP_SNDBUF > 0:
+            packetlibX.set_socket_buffer(udp, UDP_SNDBUF, socket.SO_SNDBUF)
         udp.bind(("0.0.0.0", port))
         self.sel.register(udp, selectors.EVENT_READ, data=port)
         self.port_socks[port] = udp
-        print(f"[Pool] Bound UDP port {port}", flush=True)
+        rcvbuf, sndbuf = packetlibX.socket_buffer_sizes(udp)
+        print(f"[Pool] Bound UDP port {port} (rcvbuf {rcvbuf} B, sndbuf {sndbuf} B)", flush=True)
+        # Linux reports twice the granted size, less than the request means
+        # the request was capped by net.core.rmem_max
+        if rcvbuf < UDP_RCVBUF:
+            print(f"[Pool] UDP port {port}: rcvbuf capped below {UDP_RCVBUF} B, raise net.core.rmem_max or run with CAP_NET_ADMIN", flush=True)
+        stats = packetlibX.udp_socket_stats(udp)
+        self.drops_logged[port] = stats['drops'] if stats is not None else 0
 
     def _close_udp(self, port):
         udp = self.port_socks.pop(port, None)
@@ -131,12 +165,54 @@ class SocketPool:
         udp.close()
         print(f"[Pool] Closed UDP port {port}", flush=True)
 
+    def socket_stats(self):
+        sockets = {}
+        for port, udp in list(self.port_socks.items()):
+            rcvbuf, sndbuf = packetlibX.socket_buffer_sizes(udp)
+            sockets[str(port)] = {'rcvbuf': rcvbuf, 'sndbuf': sndbuf}
+            stats = packetlibX.udp_socket_stats(udp)
+            if stats is not None:
+                sockets[str(port)].update(stats)
+        return sockets
+
+    # kernel drops of the board UDP ports (/proc/net/udp), reported when they grew
+    def _log_drops(self):
+        for port, udp in list(self.port_socks.items()):
+            stats = packetlibX.udp_socket_stats(udp)
+            if stats is None or stats['drops'] == self.drops_logged.get(port, 0):
+                continue
+            print(f"[Pool] DROPS      UDP port {port}: {stats['drops'] - self.drops_logged.get(port, 0)} datagrams dropped by the kernel "
+                  f"({stats['drops']} in total, rx queue {stats['rx_queue']} B of {packetlibX.socket_buffer_sizes(udp)[0]} B)", flush=True)
+            self.drops_logged[port] = stats['drops']
+
+    def counter_stats(self):
+        return {f"{src_ip}:{port}": tracker.snapshot() for (src_ip, port), tracker in self.counters.items()}
+
+    # udp counter per board and port, reported when it changed
+    def _log_counters(self):
+        for (src_ip, port), tracker in self.counters.items():
+            snapshot = tracker.snapshot()
+            last     = self.counters_logged.get((src_ip, port), {})
+            if snapshot['missing'] == last.get('missing', 0) and snapshot['reordered'] == last.get('reordered', 0) and snapshot['duplicates'] == last.get('duplicates', 0):
+                continue
+            print(f"[Pool] COUNTER    {src_ip}:{port} {tracker.summary()}", flush=True)
+            self.counters_logged[(src_ip, port)] = snapshot
+
     def _udp_event_loop(self):
         while True:
+            if time.monotonic() >= self.next_counter_log:
+                self._log_counters()
+                self._log_drops()
+                self.next_counter_log = time.monotonic() + COUNTER_LOG_INTERVAL
             for key, _ in self.sel.select(timeout=1.0):
                 udp_sock = key.fileobj
                 port     = key.data
                 data, (src_ip, _) = udp_sock.recvfrom(BUFFER_SIZE)
+                framed = None
+                tracker = self.counters.get((src_ip, port))
+                if tracker is None:
+                    tracker = self.counters[(src_ip, port)] = packetlibX.counter_tracker()
+                tracker.update_datagram(data)
 
                 # forward to each worker’s matching data_conn
                 # if len(data) < 1000:
@@ -155,10 +231,16 @@ class SocketPool:
                                 # if typ == "data":
                                 #     # print all the bytes in hex
                                 #     print(' '.join([f"{x:02x}" for x in data]))
-                                conn.sendall(data)
+                                if (wid, typ) in self.data_framed:
+                                    if framed is None:
+                                        framed = struct.pack(packetlibX.frame_header_format, len(data)) + data
+                                    conn.sendall(framed)
+                                else:
+                                    conn.sendall(data)
                             except Exception:
                                 conn.close()
                                 del self.data_conns[(wid, typ)]
+                                self.data_framed.discard((wid, typ))
                                 print(f"[Pool] Dropped {typ.upper():4} conn for {wid}", flush=True)
 
 if __name__ == "__main__":
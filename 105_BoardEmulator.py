@@ -0,0 +1,47 @@
+import packetlibX
+import argparse     # for input arguments
+import os, json
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+script_folder       = os.path.dirname(__file__)
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Software emulator of the KCU board with H2GCROC ASICs')
+parser.add_argument('-c', '--config', type=str, help='Path to the common settings JSON file', default=os.path.join(script_folder, 'config', 'common_settings_emulator.json'))
+parser.add_argument('-a', '--asic', type=int, help='Number of emulated ASICs', default=2)
+parser.add_argument('--lock', type=str, help='IO delay lock window as min,max', default='200,300')
+parser.add_argument('--dead', type=str, help='Comma-separated dead channels (asic*72 + channel)', default='')
+parser.add_argument('--loss', type=float, help='Probability to drop an outgoing datagram', default=0.0)
+parser.add_argument('--latency', type=float, help='Delay before every reply and burst in seconds', default=0.0)
+parser.add_argument('--seed', type=int, help='Random seed of the analog model', default=0)
+parser.add_argument('--verbose', action='store_true', help='Print every request')
+args = parser.parse_args()
+
+# * --- Load udp settings from config file ----------------------------
+with open(args.config, 'r') as f:
+    udp_config = json.load(f)['udp']
+
+lock_window   = [int(x) for x in args.lock.split(',')]
+dead_channels = [int(x) for x in args.dead.split(',') if x.strip() != '']
+
+print(f"- UDP from {args.config}:")
+print(f"-- PC IP: {udp_config['pc_ip']}, Port: {udp_config['pc_cmd_port']}/{udp_config['pc_data_port']}")
+print(f"-- Board IP: {udp_config['h2gcroc_ip']}, Port: {udp_config['h2gcroc_port']}")
+print(f"- Emulated ASICs: {args.asic}, lock window: {lock_window}, dead channels: {dead_channels}")
+print(f"- Packet loss: {args.loss}, latency: {args.latency} s")
+
+# * --- Run the emulator ----------------------------------------------
+emulator = packetlibX.board_emulator(
+    udp_config['h2gcroc_ip'], int(udp_config['h2gcroc_port']),
+    udp_config['pc_ip'], int(udp_config['pc_cmd_port']), int(udp_config['pc_data_port']),
+    asic_num=args.asic, lock_window=lock_window, dead_channels=dead_channels,
+    seed=args.seed, loss_rate=args.loss, latency=args.latency, verbose=args.verbose)
+
+try:
+    emulator.serve_forever()
+except KeyboardInterrupt:
+    print("- Emulator stopped")
@@ -0,0 +1,50 @@
+import caliblibX
+import argparse     # for input arguments
+import os, sys
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+script_folder       = os.path.dirname(os.path.abspath(__file__))
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Long-lived calibration worker of one FPGA, runs 201-204 on request from the UI')
+parser.add_argument('-c', '--config', type=str, help='Path to the common settings JSON file')
+parser.add_argument('-p', '--port', type=int, help='Local TCP port to listen on (0: any free port)', default=0)
+args = parser.parse_args()
+
+# * --- Preload the modules used by the jobs --------------------------
+import numpy as np
+try:
+    # loguru keeps the stderr of its import time, send its records to the
+    # stderr of the running job instead
+    from loguru import logger
+    logger.remove()
+    logger.add(lambda msg: sys.stderr.write(msg))
+except ImportError:
+    pass
+
+# * --- Connect to the pool -------------------------------------------
+udp_target = caliblibX.udp_target('10.1.2.207', 11000, 11001, '10.1.2.208', 11000)
+if args.config:
+    udp_target.load_udp_json_file(args.config)
+udp_target.load_pool_json_file(os.path.join(script_folder, 'config', 'socket_pool_configX.json'))
+
+print(f"- UDP from {args.config if args.config else 'default settings'}:")
+print(f"-- PC IP: {udp_target.pc_ip}, Port: {udp_target.pc_port_cmd}/{udp_target.pc_port_data}")
+print(f"-- Board IP: {udp_target.board_ip}, Port: {udp_target.board_port}")
+
+udp_target.connect_to_pool(timeout=0.1)
+udp_target.register_image = {}
+caliblibX.share_pool_connection(udp_target)
+
+# * --- Serve calibration jobs ----------------------------------------
+worker = caliblibX.calib_worker(udp_target, script_folder, _port=args.port)
+caliblibX.exit_with_parent()
+print(f"{caliblibX.calib_worker_port_line} {worker.port}")
+try:
+    worker.serve_forever()
+except KeyboardInterrupt:
+    print("- Calibration worker stopped")
@@ -0,0 +1,238 @@
+import caliblibX
+import packetlibX
+import os, json, time, socket, argparse
+import numpy as np
+
+# * --- Set up script information ---------------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+script_start_time   = time.perf_counter()
+script_folder       = os.path.dirname(__file__)
+script_info_str = "-- " + script_id_str + " (v" + script_version_str + ")"
+while len(script_info_str) < 80:
+    script_info_str += "-"
+print(script_info_str)
+print("------------------------------------------------------------------------")
+
+# * --- Read command line arguments -------------------------------------------
+parser = argparse.ArgumentParser(description='Continuous DAQ recorder writing the raw data datagrams to rotating files')
+parser.add_argument('-c', '--config', type=str, help='Path to the common settings JSON file')
+parser.add_argument('-i', '--i2c', type=str, help='I2C settings JSON file(s) to send before the run, the ASICs are used as configured otherwise')
+parser.add_argument('-a', '--asic', type=int, help='Number of ASICs', default=2)
+parser.add_argument('-o', '--output', type=str, help='Output folder, default dump/107_DAQRecorder_<time>')
+parser.add_argument('-t', '--time', type=float, help='Run duration in seconds, 0 to run until Ctrl-C', default=0)
+
+# daq settings
+parser.add_argument('--machine_gun', type=int, help='Machine-gun samples per trigger', default=0)
+parser.add_argument('--gen_cycles', type=int, help='Generator cycles per generator start', default=1)
+parser.add_argument('--gen_interval', type=int, help='Generator interval between cycles', default=255)
+parser.add_argument('--ext_trigger', type=bool, help='Take data on the external trigger instead of the internal generator', default=False, nargs='?', const=True)
+parser.add_argument('--retrigger', type=float, help='Restart the generator every this many seconds, 0 to start it once', default=0.1)
+parser.add_argument('--jumbo', type=bool, help='Jumbo data datagrams', default=False, nargs='?', const=True)
+
+# recorder settings
+parser.add_argument('--file_size', type=int, help='Size of a data file in MB before the next one is started', default=1024)
+parser.add_argument('--rcvbuf', type=int, help='Kernel receive buffer of the data socket in MB', default=64)
+parser.add_argument('--report', type=float, help='Seconds between two rate reports', default=2.0)
+parser.add_argument('--decode', type=int, help='Worker processes of the online decode, 0 to only record', default=0)
+args = parser.parse_args()
+
+# * --- Load configuration file -----------------------------------------------
+if args.output:
+    output_dump_folder = args.output
+    os.makedirs(output_dump_folder, exist_ok=True)
+    output_config_path = os.path.join(output_dump_folder, f"{script_id_str}_config.json")
+else:
+    output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
+output_config_json = {}
+
+# * --- Load udp settings from config file ------------------------------------
+udp_target = caliblibX.udp_target('10.1.2.207', 11000, 11001, '10.1.2.208', 11000)
+if args.config:
+    udp_target.load_udp_json_file(args.config)
+udp_target.load_pool_json_file(os.path.join(script_folder, 'config', 'socket_pool_configX.json'))
+
+print(f"- UDP from {args.config if args.config else 'default settings'}:")
+print(f"-- PC IP: {udp_target.pc_ip}, Port: {udp_target.pc_port_cmd}/{udp_target.pc_port_data}")
+print(f"-- Board IP: {udp_target.board_ip}, Port: {udp_target.board_port}")
+
+# - commands go through the pool, the data port is taken over by the recorder:
+#   the pool forwards every datagram over TCP, which caps the rate far below
+#   what the board sends
+udp_target.connect_to_pool(timeout=0.1)
+udp_target.pool_do("unregister", "data", udp_target.pc_port_data)
+
+data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+data_rcvbuf = packetlibX.set_socket_buffer(data_socket, args.rcvbuf << 20)
+try:
+    data_socket.bind((udp_target.pc_ip, udp_target.pc_port_data))
+except OSError as e:
+    print(f"Error: Cannot bind the data port {udp_target.pc_port_data} ({e}), is another worker registered for it in the pool?")
+    exit()
+data_socket.settimeout(0.2)
+print(f"- Data socket {udp_target.pc_ip}:{udp_target.pc_port_data}, receive buffer {data_rcvbuf >> 20} MB")
+
+# * --- Set running parameters ------------------------------------------------
+total_asic = int(args.asic)
+
+gen_fcmd_internal_injection = 0b00101101
+gen_fcmd_L1A                = 0b01001011
+
+# * --- Send I2C settings -----------------------------------------------------
+if args.i2c:
+    i2c_files = args.i2c.split(',')
+    if len(i2c_files) != total_asic and len(i2c_files) != 1:
+        print(f"Error: Number of I2C files provided ({len(i2c_files)}) does not match number of ASICs ({total_asic}).")
+        exit()
+    for asic_idx in range(total_asic):
+        i2c_file = i2c_files[asic_idx] if len(i2c_files) == total_asic else i2c_files[0]
+        try:
+            _asic_i2c_settings = caliblibX.h2gcroc_registers_full()
+            _asic_i2c_settings.load_from_json(i2c_file)
+            _asic_i2c_settings.sync_udp_settings(udp_target, asic_idx)
+        except Exception as e:
+            print(f"Error loading I2C settings from {i2c_file}: {e}")
+            exit()
+        _asic_i2c_settings.turn_on_daq()
+        _asic_i2c_settings.send_all_registers(udp_target)
+        print(f"- Sent I2C settings from {i2c_file} to ASIC {asic_idx}")
+
+asic_values = [0x30 if i < total_asic else 0x00 for i in range(8)]
+a0, a1, a2, a3, a4, a5, a6, a7 = asic_values
+
+if not caliblibX.send_check_DAQ_gen_params_calib(
+    udp_target,
+    data_coll_en        = 0x00, trig_coll_en        = 0x00,
+    daq_fcmd            = gen_fcmd_L1A,
+    gen_pre_fcmd        = gen_fcmd_internal_injection,
+    gen_fcmd            = gen_fcmd_L1A,
+    ext_trg_en          = 0x01 if args.ext_trigger else 0x00, ext_trg_delay = 0x00,
+    ext_trg_deadtime    = 10000,
+    jumbo_en            = 0x01 if args.jumbo else 0x00,
+    gen_preimp_en       = 0x00, gen_pre_interval    = 0x0010,
+    gen_nr_of_cycle     = args.gen_cycles,
+    gen_interval        = args.gen_interval,
+    daq_push_fcmd       = gen_fcmd_L1A,
+    machine_gun         = args.machine_gun,
+    ext_trg_out_0_len   = 0x00, ext_trg_out_1_len   = 0x00,
+    ext_trg_out_2_len   = 0x00, ext_trg_out_3_len   = 0x00,
+    asic0_collection    = a0,   asic1_collection    = a1,
+    asic2_collection    = a2,   asic3_collection    = a3,
+    asic4_collection    = a4,   asic5_collection    = a5,
+    asic6_collection    = a6,   asic7_collection    = a7,
+    verbose             = False,
+    readback            = True
+):
+    print("-- Warning: Failed to set DAQ/Gen parameters.")
+
+output_config_json['run'] = {
+    'asic'          : total_asic,
+    'machine_gun'   : args.machine_gun,
+    'gen_cycles'    : args.gen_cycles,
+    'gen_interval'  : args.gen_interval,
+    'ext_trigger'   : bool(args.ext_trigger),
+    'retrigger'     : args.retrigger,
+    'jumbo'         : bool(args.jumbo),
+    'file_size_mb'  : args.file_size,
+    'rcvbuf'        : data_rcvbuf,
+    'start_time'    : time.strftime('%Y-%m-%d %H:%M:%S'),
+}
+
+# * --- Record -----------------------------------------------------------------
+writer = packetlibX.record_writer(output_dump_folder, file_size=args.file_size << 20)
+decoder = caliblibX.decode_pool(total_asic * 76, _workers=args.decode, _histogram=True) if args.decode > 0 else None
+
+# - the data socket is not the data connection of the pool, so the stream
+#   only drives the generator here
+daq_stream = caliblibX.daq_stream(udp_target)
+daq_stream.start()
+if args.ext_trigger or args.retrigger <= 0:
+    daq_stream.trigger()
+
+# - udp packet counter of the data datagrams, see packetlibX.counter_tracker
+data_counter = udp_target.data_counter
+
+run_start       = time.perf_counter()
+next_trigger    = run_start
+next_report     = run_start + args.report
+report_records  = 0
+report_bytes    = 0
+report_time     = run_start
+print(f"- Recording to {output_dump_folder}, Ctrl-C to stop")
+try:
+    while True:
+        _now = time.perf_counter()
+        if args.time > 0 and _now - run_start >= args.time:
+            break
+        if not args.ext_trigger and args.retrigger > 0 and _now >= next_trigger:
+            daq_stream.rearm()
+            daq_stream.trigger()
+            next_trigger += args.retrigger
+            if next_trigger < _now:
+                next_trigger = _now + args.retrigger
+        if _now >= next_report:
+            _elapsed = _now - report_time
+            _socket_stats = packetlibX.udp_socket_stats(data_socket)
+            print(f"-- {_now - run_start:8.1f} s: {(writer.records - report_records) / _elapsed:9.0f} datagrams/s, {(writer.bytes - report_bytes) / _elapsed / 1e6:8.2f} MB/s, "
+                  f"{writer.bytes / 1e6:.1f} MB in {writer.file_index + 1} file(s), {data_counter.missing} missing, {data_counter.reordered} reordered, {data_counter.duplicates} duplicated"
+                  + (f", {_socket_stats['drops']} kernel drops" if _socket_stats is not None else ""))
+            report_records, report_bytes, report_time = writer.records, writer.bytes, _now
+            next_report = _now + args.report
+
+        try:
+            _size = writer.receive(data_socket)
+        except socket.timeout:
+            continue
+        if _size <= 0:
+            continue
+
+        if writer.last_counter is not None and data_counter.update(writer.last_counter) == 'duplicate':
+            continue
+
+        if decoder is not None:
+            _datagram = writer.last_datagram()
+            decoder.submit(_datagram)
+            _datagram.release()
+except KeyboardInterrupt:
+    print("- Stopped by user")
+
+run_time = time.perf_counter() - run_start
+daq_stream.stop()
+writer.close()
+data_socket_stats = packetlibX.udp_socket_stats(data_socket)
+data_socket.close()
+
+# * --- Summary ----------------------------------------------------------------
+print(f"- Recorded {writer.records} datagrams, {writer.bytes / 1e6:.1f} MB in {run_time:.1f} s ({writer.bytes / max(run_time, 1e-9) / 1e6:.2f} MB/s) to {len(writer.files)} file(s)")
+print(f"- UDP packet counter: {data_counter.summary()}")
+if data_socket_stats is not None:
+    print(f"- Kernel drops on the data socket: {data_socket_stats['drops']}")
+output_config_json['summary'] = {
+    'run_time'          : run_time,
+    'datagrams'         : writer.records,
+    'bytes'             : writer.bytes,
+    'files'             : [_file['file'] for _file in writer.files],
+    'bursts'            : daq_stream.bursts,
+    'udp_counter'       : data_counter.snapshot(),
+    'kernel_drops'      : data_socket_stats['drops'] if data_socket_stats is not None else None,
+}
+
+if decoder is not None:
+    accumulator = decoder.close()
+    mean, err, rms = accumulator.statistics()
+    median, median_err, _ = accumulator.statistics('median')
+    trimmed, trimmed_err, _ = accumulator.statistics('trimmed')
+    counts = accumulator.channel_counts()
+    np.savez(os.path.join(output_dump_folder, 'online_statistics.npz'), counts=counts, mean=mean, err=err, rms=rms, median=median, median_err=median_err, trimmed=trimmed, trimmed_err=trimmed_err)
+    print(f"- Online decode: {accumulator.halves} half packets, {accumulator.halves_bad} bad, {decoder.waits} waits for a free slot")
+    for _half in range(2 * total_asic):
+        _channels = slice(_half * 38, _half * 38 + 37)
+        _used = counts[_channels] > 0
+        if np.any(_used):
+            print(f"-- ASIC {_half // 2} half {_half % 2}: ADC mean {np.mean(mean[0][_channels][_used]):6.1f}, rms {np.mean(rms[0][_channels][_used]):5.2f}")
+    output_config_json['summary']['halves']     = accumulator.halves
+    output_config_json['summary']['halves_bad'] = accumulator.halves_bad
+
+with open(output_config_path, 'w') as f:
+    json.dump(output_config_json, f, indent=4)
+print(f"- Run information saved to {output_config_path}")
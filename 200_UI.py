@@ -138,12 +138,14 @@ class CalibX(App):
             )
             self.pool_process = process
 
+            log_sink = caliblibX.LogSink(log)
+
             async def stream_reader(stream, prefix):
                 while True:
                     line = await stream.readline()
                     if not line:
                         break
-                    log.write_line(f"{prefix}{line.decode().rstrip()}")
+                    log_sink.write(f"{prefix}{line.decode().rstrip()}")
 
             async def process_monitor():
                 await asyncio.gather(
@@ -151,6 +153,7 @@ class CalibX(App):
                     stream_reader(process.stderr, "ERROR: "),
                 )
                 rc = await process.wait()
+                log_sink.close()
                 log.write_line(f"▶ Socket Pool exited with code {rc}")
 
                 self.query_one("#start-pool-btn", Button).disabled = False
@@ -242,6 +245,8 @@ class CalibX(App):
         """Q to quit the app."""
         # Save config before quitting
         await self.save_config()
+        for panel in self.query(caliblibX.FpgaPanel):
+            await panel.calib_worker.stop()
         await self._stop_socket_pool()
         self.exit()
 
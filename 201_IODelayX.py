@@ -1,11 +1,11 @@
 import caliblibX
 import argparse     # for input arguments
 import os, json, time
-import matplotlib.pyplot as plt
 
 # * --- Set up script information -------------------------------------
 script_id_str       = os.path.basename(__file__).split('.')[0]
 script_version_str  = '1.2'
+script_start_time   = time.perf_counter()
 script_folder       = os.path.dirname(__file__)
 print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
 print(f"---------------------------------------")
@@ -23,6 +23,9 @@ parser.add_argument('--plot', action='store_true', help='Enable plotting of resu
 parser.add_argument('--ui', type=bool, help='Enable UI updates during scan', default=False, nargs='?', const=True)
 args = parser.parse_args()
 
+if args.plot:
+    import matplotlib.pyplot as plt
+
 # * --- Load configuration file ---------------------------------------
 output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
 output_config_json = {}
@@ -134,7 +137,7 @@ for _asic in range(total_asic):
 
         if args.ui:
             current_progress = int(100 * (_io_delay // 2 + _asic * len(io_dealy_scan_range)) / ui_pb_total_steps)
-            print(f"ui_progress:{current_progress}%")
+            caliblibX.ui_progress(current_progress)
 
     # find the 3 longest locked segments
     top_segments = caliblibX.find_top_n_ones(io_delay_scan_io_delay_values[_asic], io_delay_scan_results[_asic], 3)
@@ -176,7 +179,7 @@ for _asic in range(total_asic):
 
     if args.ui:
         current_progress = int(100 * (len(io_dealy_scan_range) + _asic * len(io_dealy_scan_range)) / ui_pb_total_steps)
-        print(f"ui_progress:{current_progress}%")
+        caliblibX.ui_progress(current_progress)
 
 # load the optimal io delay settings to ASIC
 for _asic in range(total_asic):
@@ -213,5 +216,6 @@ with open(os.path.join(output_dump_folder, 'io_delay_scan_config.json'), 'w') as
 del udp_target
 if args.ui:
     current_progress = 100
-    print(f"ui_progress:{current_progress}%")
+    caliblibX.ui_progress(current_progress)
+    caliblibX.ui_timing(script_id_str, time.perf_counter() - script_start_time)
 print("-- End of Script ----------------------")
\ No newline at end of file
@@ -1,12 +1,11 @@
 import caliblibX
 import os, json, time, argparse
-import matplotlib.pyplot as plt
-import termplotlib as tpl
 import numpy as np
 
 # * --- Set up script information ---------------------------------------------
 script_id_str       = os.path.basename(__file__).split('.')[0]
 script_version_str  = '1.5'
+script_start_time   = time.perf_counter()
 script_folder       = os.path.dirname(__file__)
 script_info_str = "-- " + script_id_str + " (v" + script_version_str + ")"
 while len(script_info_str) < 80:
@@ -28,13 +27,37 @@ parser.add_argument('--cf', type=int, help='Feedback capacitor setting (0-15)',
 parser.add_argument('--cc', type=int, help='Current conveyor gain setting (0-15)', default=0x04)
 parser.add_argument('--cfcomp', type=int, help='Feedback capacitor compensation setting (0-15)', default=0x0a)
 
+# warm start settings
+parser.add_argument('--warm', type=str, help='Previous result I2C JSON file(s) to start the trims and inv_vref from')
+
+# resume settings
+parser.add_argument('--resume', type=str, help='Checkpoint file (or output folder of an interrupted run) to resume from')
+
+# daq settings
+parser.add_argument('--no_stream', type=bool, help='Start and stop the DAQ in every measurement instead of keeping it armed for the whole scan', default=False, nargs='?', const=True)
+parser.add_argument('--jumbo', type=bool, help='Jumbo data datagrams (46 instead of 7 half packets per datagram, needs jumbo frames on the data link)', default=False, nargs='?', const=True)
+parser.add_argument('--estimator', type=str, help='Pedestal estimator: mean, or median / trimmed (10 percent cut at each end) from per-channel ADC histograms', default='mean', choices=caliblibX.measure_estimators)
+
+# capture settings
+parser.add_argument('--capture', type=bool, help='Record the received data datagrams to data_capture.h2gcap in the output folder', default=False, nargs='?', const=True)
+
 # ui update
 parser.add_argument('--ui', type=bool, help='Enable UI updates during scan', default=False, nargs='?', const=True)
 args = parser.parse_args()
 
 # * --- Load configuration file -----------------------------------------------
-output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
+resume_checkpoint = None
+if args.resume:
+    resume_checkpoint, resume_arrays = caliblibX.load_checkpoint(args.resume, script_id_str)
+    if resume_checkpoint is None:
+        print(f"Error: Cannot resume from {args.resume}.")
+        exit()
+    output_dump_folder = resume_checkpoint['output_folder']
+    print(f"- Resuming in {output_dump_folder}")
+else:
+    output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
 output_config_json = {}
+plot_worker = caliblibX.plot_worker()
 
 # * --- Load udp settings from config file ------------------------------------
 udp_target = caliblibX.udp_target('10.1.2.207', 11000, 11001, '10.1.2.208', 11000)
@@ -47,6 +70,8 @@ print(f"-- PC IP: {udp_target.pc_ip}, Port: {udp_target.pc_port_cmd}/{udp_target
 print(f"-- Board IP: {udp_target.board_ip}, Port: {udp_target.board_port}")
 
 udp_target.connect_to_pool(timeout=0.1)
+if args.capture:
+    udp_target.start_capture(os.path.join(output_dump_folder, 'data_capture.h2gcap'))
 
 # * --- Set running parameters ------------------------------------------------
 total_asic = 2
@@ -87,6 +112,26 @@ else:
             exit()
     print("- Using the same I2C settings for all ASICs")
 
+# * --- Load previous results for warm start ----------------------------------
+warm_start = False
+warm_register_list = []
+if args.warm:
+    warm_files = args.warm.split(',')
+    if len(warm_files) != total_asic and len(warm_files) != 1:
+        print(f"Error: Number of warm start files provided ({len(warm_files)}) does not match number of ASICs to scan ({total_asic}).")
+        exit()
+    for asic_idx in range(total_asic):
+        warm_file = warm_files[asic_idx] if len(warm_files) == total_asic else warm_files[0]
+        try:
+            warm_i2c_settings = caliblibX.h2gcroc_registers_full()
+            warm_i2c_settings.load_from_json(warm_file)
+            warm_register_list.append(warm_i2c_settings)
+            print(f"- Warm start from {warm_file} for ASIC {asic_idx}.")
+        except Exception as e:
+            print(f"Error loading warm start settings from {warm_file}: {e}")
+            exit()
+    warm_start = True
+
 # * --- Set running parameters ------------------------------------------------
 target_pedestal = 100
 if args.target is not None:
@@ -115,27 +160,38 @@ noinv_vref_default  = 512
 inputdac_default    = 0
 pede_trim_default   = 31
 
-# - (DNU) global_scan_range: range for the step 1 - global scan
+# - (DNU) global_scan_range: coarse points for the step 1 - global scan
+# - global_scan_refine_number: secant refinement steps after the coarse points
+# - global_scan_fine_number: secant steps of the fine search after trim tuning
+# - global_scan_tolerance: stop the inv_vref search once all halves are this close
 # - (DNU) dead_channel_scan_range: range for the step 2 - dead channel scan
 # - (DNU) dead_channel_std_threshold: threshold to determine if a channel is dead
 # global_scan_range           = range(0, 1024, 32)
-global_scan_range           = range(200, 800, 30)
-global_scan_fine_offset_left    = -20
-global_scan_fine_offset_right   = 100
-global_scan_fine_step       = 5
+global_scan_range           = range(200, 800, 140)
+global_scan_refine_number   = 4
+global_scan_fine_number     = 4
+global_scan_tolerance       = 2
 dead_channel_scan_range     = range(0, 64, 8)
 dead_channel_std_threshold  = 10
 
-# - (DNU) pede_trim_step_size: step size for the pedestal trim tunning
+# - pede_trim_probe_offsets: trim offsets measured to fit the adc-vs-trim slope
+# - pede_trim_correction_number: correction passes after the predicted trim
 # - (DNU) pede_tolerance: tolerance for the pedestal trim tunning
-pede_trim_step_size = 4
+pede_trim_probe_offsets     = [-16, 16]
+pede_trim_correction_number = 2
 pede_tolerance      = 2
-pede_trim_attempt_number = 64 // pede_trim_step_size + 1
-pede_trim_coarse_attempt_number = 16 // pede_trim_step_size + 1
+pede_trim_probe_number          = len(pede_trim_probe_offsets)
+pede_trim_attempt_number        = pede_trim_correction_number + 1
+pede_trim_coarse_attempt_number = pede_trim_correction_number + 1
 
 # - target pedestal value for the global inverted reference voltage scan
 global_coarse_scan_target = 150
 
+# - warm_half_tolerance: half average deviation that triggers a new inv_vref search
+# - warm_inv_vref_probe_step: first inv_vref step of a drifted half in warm start
+warm_half_tolerance      = 4
+warm_inv_vref_probe_step = 20
+
 # - delay time after setting i2c values before measurement
 delay_after_setting_i2c = 0.1  # seconds
 
@@ -144,7 +200,9 @@ c_f_code = args.cf & 0x0F if args.cf is not None else 0x0F
 cc_gain_code = args.cc & 0x0F if args.cc is not None else 0x0F
 c_f_comp_code = args.cfcomp & 0x0F if args.cfcomp is not None else 0x0F
 
-ui_total_measurements = pede_trim_attempt_number + pede_trim_coarse_attempt_number + len(global_scan_range) + (global_coarse_scan_target - global_scan_fine_offset_left + global_scan_fine_step - 1) // global_scan_fine_step
+global_scan_coarse_number = len(global_scan_range) + global_scan_refine_number
+
+ui_total_measurements = pede_trim_probe_number + pede_trim_attempt_number + pede_trim_coarse_attempt_number + global_scan_coarse_number + global_scan_fine_number
 
 # - running result storage
 dead_channels           = []
@@ -155,6 +213,43 @@ for _asic in range(total_asic):
     best_chn_trim.append(_asic_chn_trim)
 best_inv_vref_fine   = []
 
+# - warm start: trims and inv_vref from the previous result, dead channels
+#   from the checkpoint written next to it (if any)
+warm_inv_vref           = []
+warm_drift_halves       = []
+warm_drift_channels     = []
+if warm_start:
+    for _asic in range(total_asic):
+        _warm_chn_trim = warm_register_list[_asic].get_chn_trim_inv_all()
+        if _warm_chn_trim is not None:
+            best_chn_trim[_asic] = _warm_chn_trim
+        for _half in range(2):
+            warm_inv_vref.append(warm_register_list[_asic].get_inv_vref(_half))
+    _warm_checkpoint_path = os.path.join(os.path.dirname(os.path.abspath(warm_files[0])), 'checkpoint.json')
+    if os.path.exists(_warm_checkpoint_path):
+        _warm_checkpoint, _ = caliblibX.load_checkpoint(_warm_checkpoint_path, script_id_str)
+        if _warm_checkpoint is not None:
+            dead_channels = _warm_checkpoint['state'].get('dead_channels', [])
+    print(f"- Warm start inv_vref: {warm_inv_vref}, dead channels: {dead_channels}")
+
+# * --- Restore state from checkpoint ------------------------------------------
+# - dead channels and best inv_vref values are recomputed from the restored
+#   scan arrays, only the channel trims need to be carried over
+checkpoint_stages = ['global_coarse', 'trim_slope', 'coarse_trim', 'global_fine', 'final_trim', 'final']
+checkpoint_arrays = {}
+if resume_checkpoint is not None:
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'final'):
+        print(f"- Checkpoint in {output_dump_folder} is already complete, nothing to resume.")
+        exit()
+    resume_state = resume_checkpoint['state']
+    if resume_state['total_asic'] != total_asic:
+        print(f"Error: Checkpoint was taken with {resume_state['total_asic']} ASICs, not {total_asic}.")
+        exit()
+    if resume_state['target_pedestal'] != target_pedestal:
+        print(f"Error: Checkpoint target {resume_state['target_pedestal']} does not match target {target_pedestal}.")
+        exit()
+    best_chn_trim = resume_state['best_chn_trim']
+
 # 10% from setting i2c
 for _asic in range(total_asic):
     print(f"- Setting I2C for ASIC {_asic}...")
@@ -202,7 +297,7 @@ if not caliblibX.send_check_DAQ_gen_params_calib(
     gen_fcmd            = gen_fcmd_L1A,
     ext_trg_en          = 0x00, ext_trg_delay       = 0x00,
     ext_trg_deadtime    = 10000,
-    jumbo_en            = 0x00,
+    jumbo_en            = 0x01 if args.jumbo else 0x00,
     gen_preimp_en       = 0x00, gen_pre_interval    = 0x0010,
     gen_nr_of_cycle     = gen_nr_cycle,
     gen_interval        = gen_interval_value,
@@ -219,85 +314,103 @@ if not caliblibX.send_check_DAQ_gen_params_calib(
 ):
     print("-- Warning: Failed to set DAQ/Gen parameters.")
 
-# * --- Global scan of inverted reference voltage ------------------------------
-scan_global_inv_ref_adc_avg = np.zeros((2*total_asic, len(global_scan_range)), dtype=float)
-scan_global_inv_ref_adc_err = np.zeros((2*total_asic, len(global_scan_range)), dtype=float)
+# * --- Keep the DAQ armed for the whole scan ---------------------------------
+# - every measurement only triggers a generator burst (see caliblibX.daq_stream)
+if not args.no_stream:
+    udp_target.daq_stream = caliblibX.daq_stream(udp_target)
+    udp_target.daq_stream.start()
 
-scan_global_inv_ref_chn_adc_avg = np.zeros((2*total_asic, 36, len(global_scan_range)), dtype=float)
-
-for _ref_inv in global_scan_range:
-    print(f"- Setting Inverted Vref to {_ref_inv}")
-    for _asic in range(total_asic):
-        _asic_i2c_settings = register_settings_list[_asic]
-        if not _asic_i2c_settings.set_inv_vref(_ref_inv, 0):
-            print(f"Error: Failed to set Inverted Vref 0 for ASIC {_asic}.")
-        if not _asic_i2c_settings.set_inv_vref(_ref_inv, 1):
-            print(f"Error: Failed to set Inverted Vref 1 for ASIC {_asic}.")
-
-        _asic_i2c_settings.send_reference_voltage_0_register(udp_target)
-        _asic_i2c_settings.send_reference_voltage_1_register(udp_target)
-
-    time.sleep(delay_after_setting_i2c)
-    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
-    adc_mean_list_filtered = caliblibX.channel_list_remove_cm_calib(adc_mean_list)
-    for _asic in range(total_asic):
-        for _chn in range(72):
-            scan_global_inv_ref_chn_adc_avg[2*_asic + (_chn // 36), _chn % 36, global_scan_range.index(_ref_inv)] = adc_mean_list_filtered[_asic * 72 + _chn]
+# * --- Global scan of inverted reference voltage ------------------------------
+# - skipped in warm start, the previous inv_vref is verified instead
+if not warm_start:
+    # - measure a few coarse points for all halves, then refine every half in
+    #   parallel by interpolation/secant steps towards the coarse target
+    scan_global_inv_ref_vref    = np.full((2*total_asic, global_scan_coarse_number), np.nan, dtype=float)
+    scan_global_inv_ref_adc_avg = np.full((2*total_asic, global_scan_coarse_number), np.nan, dtype=float)
+    scan_global_inv_ref_adc_err = np.full((2*total_asic, global_scan_coarse_number), np.nan, dtype=float)
+
+    scan_global_inv_ref_chn_adc_avg = np.zeros((2*total_asic, 36, len(global_scan_range)), dtype=float)
+
+    checkpoint_arrays['scan_global_inv_ref_vref']        = scan_global_inv_ref_vref
+    checkpoint_arrays['scan_global_inv_ref_adc_avg']     = scan_global_inv_ref_adc_avg
+    checkpoint_arrays['scan_global_inv_ref_adc_err']     = scan_global_inv_ref_adc_err
+    checkpoint_arrays['scan_global_inv_ref_chn_adc_avg'] = scan_global_inv_ref_chn_adc_avg
+    if resume_checkpoint is not None:
+        for _key in ['scan_global_inv_ref_vref', 'scan_global_inv_ref_adc_avg', 'scan_global_inv_ref_adc_err', 'scan_global_inv_ref_chn_adc_avg']:
+            if _key in resume_arrays and resume_arrays[_key].shape == checkpoint_arrays[_key].shape:
+                checkpoint_arrays[_key][...] = resume_arrays[_key]
+
+    for _scan_index in range(global_scan_coarse_number):
+        if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'global_coarse', _scan_index):
+            continue
+        if _scan_index < len(global_scan_range):
+            _halves_inv_vref = [global_scan_range[_scan_index]] * (2*total_asic)
+        else:
+            _halves_adc_diff = np.abs(scan_global_inv_ref_adc_avg[:, :_scan_index] - global_coarse_scan_target)
+            if np.all(np.nanmin(_halves_adc_diff, axis=1) <= global_scan_tolerance):
+                print(f"-- All halves within {global_scan_tolerance} ADC of {global_coarse_scan_target}")
+                break
+            _halves_inv_vref, _ = caliblibX.interpolate_halves_inv_vref(scan_global_inv_ref_vref[:, :_scan_index], scan_global_inv_ref_adc_avg[:, :_scan_index], [global_coarse_scan_target] * (2*total_asic))
+
+        print(f"- Setting Inverted Vref to {_halves_inv_vref}")
+        for _asic in range(total_asic):
+            _asic_i2c_settings = register_settings_list[_asic]
+            if not _asic_i2c_settings.set_inv_vref(_halves_inv_vref[2*_asic], 0):
+                print(f"Error: Failed to set Inverted Vref 0 for ASIC {_asic}.")
+            if not _asic_i2c_settings.set_inv_vref(_halves_inv_vref[2*_asic + 1], 1):
+                print(f"Error: Failed to set Inverted Vref 1 for ASIC {_asic}.")
+
+            _asic_i2c_settings.send_reference_voltage_0_register(udp_target)
+            _asic_i2c_settings.send_reference_voltage_1_register(udp_target)
+
+        time.sleep(delay_after_setting_i2c)
+        adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
+        if _scan_index < len(global_scan_range):
+            adc_mean_list_filtered = caliblibX.channel_list_remove_cm_calib(adc_mean_list)
+            for _asic in range(total_asic):
+                for _chn in range(72):
+                    scan_global_inv_ref_chn_adc_avg[2*_asic + (_chn // 36), _chn % 36, _scan_index] = adc_mean_list_filtered[_asic * 72 + _chn]
+
+        caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
+        half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
+        for _half in range(2*total_asic):
+            scan_global_inv_ref_vref[_half, _scan_index]    = _halves_inv_vref[_half]
+            scan_global_inv_ref_adc_avg[_half, _scan_index] = half_avg_list[_half]
+            scan_global_inv_ref_adc_err[_half, _scan_index] = half_err_list[_half]
+
+        if args.ui:
+            current_progress_int = int(100 * _scan_index / ui_total_measurements)
+            caliblibX.ui_progress(current_progress_int)
+
+        caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'global_coarse', _scan_index, {
+            'total_asic'        : total_asic,
+            'target_pedestal'   : target_pedestal,
+            'best_chn_trim'     : best_chn_trim
+        }, checkpoint_arrays)
 
-    caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
-    half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
     for _half in range(2*total_asic):
-        scan_global_inv_ref_adc_avg[_half, global_scan_range.index(_ref_inv)] = half_avg_list[_half]
-        scan_global_inv_ref_adc_err[_half, global_scan_range.index(_ref_inv)] = half_err_list[_half]
-
-    if args.ui:
-        current_progress_int = int(100 * global_scan_range.index(_ref_inv) / ui_total_measurements)
-        print(f"ui_progress:{current_progress_int}%")
-
-for _half in range(2*total_asic):
-    adc_values = scan_global_inv_ref_adc_avg[_half, :]
-    diffs = np.abs(adc_values - global_coarse_scan_target)
-    best_index = np.argmin(diffs)
-    best_inv_vref = list(global_scan_range)[best_index]
-    best_inv_vref_coarse.append(best_inv_vref)
-    print(f"-- Half {_half}: Best Inverted Vref = {best_inv_vref}, Achieved Pedestal = {adc_values[best_index]:.2f}")
-
-fig_global_inv_coarse, axs_global_inv_coarse = plt.subplots(1, 1, figsize=(10, 6))
-for _half in range(2*total_asic):
-    axs_global_inv_coarse.errorbar(
-        list(global_scan_range),
-        scan_global_inv_ref_adc_avg[_half, :],
-        yerr=scan_global_inv_ref_adc_err[_half, :],
-        label=f'Half {_half}'
-    )
-    # draw the best point as a vertical line
-    best_inv_vref = best_inv_vref_coarse[_half]
-    axs_global_inv_coarse.axvline(x=best_inv_vref, color='r', linestyle='--', alpha=0.5)
-axs_global_inv_coarse.set_title('Global Scan of Inverted Reference Voltage')
-axs_global_inv_coarse.set_xlabel('Inverted Reference Voltage Setting')
-axs_global_inv_coarse.set_ylabel('Average ADC Value')
-axs_global_inv_coarse.legend()
-fig_global_inv_coarse.tight_layout()
-fig_global_inv_coarse_path = os.path.join(output_dump_folder, '00_global_inv_ref_scan.png')
-fig_global_inv_coarse.savefig(fig_global_inv_coarse_path)
-print(f"- Saved global inverted reference voltage scan plot to {fig_global_inv_coarse_path}")
-
-# find dead channels
-dead_channels, channel_rms_values = caliblibX.dead_chn_discrimination(scan_global_inv_ref_chn_adc_avg, dead_channel_std_threshold)
-# draw a hist of the rms values
-fig_dead_chn_rms, ax_dead_chn_rms = plt.subplots(1, 1, figsize=(8, 5))
-ax_dead_chn_rms.hist(channel_rms_values, bins=50, color='blue', alpha=0.7)
-ax_dead_chn_rms.axvline(x=dead_channel_std_threshold, color='r', linestyle='--', label='Dead Channel Threshold')
-ax_dead_chn_rms.set_title('Channel RMS Distribution from Inverted Vref Scan')
-ax_dead_chn_rms.set_xlabel('Channel RMS')
-ax_dead_chn_rms.set_ylabel('Number of Channels')
-ax_dead_chn_rms.legend()
-fig_dead_chn_rms_path = os.path.join(output_dump_folder, '01_dead_channel_rms.png')
-fig_dead_chn_rms.savefig(fig_dead_chn_rms_path)
-print(f"- Saved dead channel RMS distribution plot to {fig_dead_chn_rms_path}")
-
-if dead_channels is not []:
-    print(f"-- Detected dead channels: {dead_channels}")
+        adc_values = scan_global_inv_ref_adc_avg[_half, :]
+        diffs = np.abs(adc_values - global_coarse_scan_target)
+        best_index = np.nanargmin(diffs)
+        best_inv_vref = int(scan_global_inv_ref_vref[_half, best_index])
+        best_inv_vref_coarse.append(best_inv_vref)
+        print(f"-- Half {_half}: Best Inverted Vref = {best_inv_vref}, Achieved Pedestal = {adc_values[best_index]:.2f}")
+
+    fig_global_inv_coarse_path = os.path.join(output_dump_folder, '00_global_inv_ref_scan.png')
+    if plot_worker.submit('plot_inv_vref_scan', fig_global_inv_coarse_path, scan_global_inv_ref_vref, scan_global_inv_ref_adc_avg, scan_global_inv_ref_adc_err, best_inv_vref_coarse, global_coarse_scan_target, 'Global Scan of Inverted Reference Voltage'):
+        print(f"- Queued global inverted reference voltage scan plot to {fig_global_inv_coarse_path}")
+
+    # find dead channels
+    dead_channels, channel_rms_values = caliblibX.dead_chn_discrimination(scan_global_inv_ref_chn_adc_avg, dead_channel_std_threshold)
+    # draw a hist of the rms values
+    fig_dead_chn_rms_path = os.path.join(output_dump_folder, '01_dead_channel_rms.png')
+    if plot_worker.submit('plot_channel_rms', fig_dead_chn_rms_path, channel_rms_values, dead_channel_std_threshold):
+        print(f"- Queued dead channel RMS distribution plot to {fig_dead_chn_rms_path}")
+
+    if dead_channels is not []:
+        print(f"-- Detected dead channels: {dead_channels}")
+else:
+    best_inv_vref_coarse = list(warm_inv_vref)
 
 # set the best inverted reference voltage found
 for _asic in range(total_asic):
@@ -314,19 +427,85 @@ for _asic in range(total_asic):
 
 time.sleep(delay_after_setting_i2c)
 
-adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
+adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
 
 caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
 half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
 
-fig_pede_after_global_inv, ax_pede_after_global_inv = caliblibX.plot_channel_adc(adc_mean_list, adc_err_list, 'Coarse Global Inverted Reference Voltage Scan', dead_channels, half_avg_list)
-fig_pede_after_global_inv.savefig(os.path.join(output_dump_folder, '02_pede_after_global_inv_scan.png'))
-print(f"- Saved pedestal plot after global inverted reference voltage scan to {os.path.join(output_dump_folder, '02_pede_after_global_inv_scan.png')}")
-# * --- Coarse pedestal trim tuning with inverted reference voltage -------------
+if plot_worker.submit('plot_channel_adc', os.path.join(output_dump_folder, '02_pede_after_global_inv_scan.png'), adc_mean_list, adc_err_list, 'Warm Start Verification' if warm_start else 'Coarse Global Inverted Reference Voltage Scan', dead_channels, half_avg_list):
+    print(f"- Queued pedestal plot after global inverted reference voltage scan to {os.path.join(output_dump_folder, '02_pede_after_global_inv_scan.png')}")
+
+# - warm start: only halves and channels that drifted beyond tolerance are tuned
+if warm_start:
+    warm_verify_half_avg = list(half_avg_list)
+    warm_verify_half_err = list(half_err_list)
+    _warm_adc_filtered = caliblibX.channel_list_remove_cm_calib(adc_mean_list)
+    for _half in range(2*total_asic):
+        if abs(half_avg_list[_half] - target_pedestal) > warm_half_tolerance:
+            warm_drift_halves.append(_half)
+    for _chn in range(72*total_asic):
+        if _chn in dead_channels:
+            continue
+        if _chn // 36 in warm_drift_halves or abs(_warm_adc_filtered[_chn] - target_pedestal) > pede_tolerance:
+            warm_drift_channels.append(_chn)
+    print(f"-- Warm start: drifted halves {warm_drift_halves}, {len(warm_drift_channels)} channels out of tolerance")
+# * --- Pedestal trim slope fit ------------------------------------------------
+# - measure the pedestal at a few trim offsets and fit the adc-vs-trim slope of
+#   every channel, the trim tuning then jumps to the predicted trim directly
+pede_trim_slope = np.zeros(72 * total_asic, dtype=float)
+checkpoint_arrays['pede_trim_slope'] = pede_trim_slope
+if resume_checkpoint is not None:
+    if 'pede_trim_slope' in resume_arrays and resume_arrays['pede_trim_slope'].shape == pede_trim_slope.shape:
+        pede_trim_slope[...] = resume_arrays['pede_trim_slope']
+
+if not caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'trim_slope') and not (warm_start and len(warm_drift_channels) == 0):
+    probe_trim_list = [np.array(best_chn_trim, dtype=float).reshape(-1)]
+    probe_adc_list  = [np.array(caliblibX.channel_list_remove_cm_calib(adc_mean_list), dtype=float)]
+
+    for _probe_index, _probe_offset in enumerate(pede_trim_probe_offsets):
+        print(f"- Trim Probe {_probe_index + 1} / {pede_trim_probe_number}: offset {_probe_offset:+d}")
+        _probe_chn_trim = [[min(max(_trim + _probe_offset, 0), 63) for _trim in best_chn_trim[_asic]] for _asic in range(total_asic)]
+        if warm_start:
+            # only the drifted channels are probed, the others keep their trims
+            _probe_chn_trim = [[_probe_chn_trim[_asic][_chn] if _asic*72 + _chn in warm_drift_channels else best_chn_trim[_asic][_chn] for _chn in range(72)] for _asic in range(total_asic)]
+
+        for _asic in range(total_asic):
+            _asic_i2c_settings = register_settings_list[_asic]
+            if not _asic_i2c_settings.set_chn_trim_inv_all(_probe_chn_trim[_asic]):
+                print(f"Error: Failed to set Pedestal Trim for ASIC {_asic}.")
+            _asic_i2c_settings.send_all_channel_registers(udp_target)
+
+        time.sleep(delay_after_setting_i2c)
+
+        _probe_adc_mean_list, _probe_adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
+        caliblibX.print_adc_to_terminal(_probe_adc_mean_list, _probe_adc_err_list)
+
+        probe_trim_list.append(np.array(_probe_chn_trim, dtype=float).reshape(-1))
+        probe_adc_list.append(np.array(caliblibX.channel_list_remove_cm_calib(_probe_adc_mean_list), dtype=float))
+
+        if args.ui:
+            current_progress_int = int(100 * (global_scan_coarse_number + _probe_index) / ui_total_measurements)
+            caliblibX.ui_progress(current_progress_int)
+
+    pede_trim_slope[...] = caliblibX.fit_chn_trim_slope(probe_trim_list, probe_adc_list)
+    print(f"-- Fitted trim slope: median {np.median(pede_trim_slope):.2f} ADC/code, range [{np.min(pede_trim_slope):.2f}, {np.max(pede_trim_slope):.2f}]")
+
+    caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'trim_slope', -1, {
+        'total_asic'        : total_asic,
+        'target_pedestal'   : target_pedestal,
+        'best_chn_trim'     : best_chn_trim
+    }, checkpoint_arrays)
 
-caliblibX.tune_chn_trim_inv(best_chn_trim, adc_mean_list, half_avg_list, pede_tolerance, pede_trim_step_size)
+# * --- Coarse pedestal trim tuning with inverted reference voltage -------------
+# - skipped in warm start, the trims are only tuned to the final target
+# - coarse_trim_history: best trim measured of every channel at this inv_vref
+coarse_trim_history = {}
+if not warm_start and not caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'coarse_trim', 0):
+    caliblibX.solve_chn_trim_inv(best_chn_trim, adc_mean_list, half_avg_list, pede_trim_slope, pede_tolerance, dead_channels, coarse_trim_history)
 
-for _tune_attempt in range(pede_trim_coarse_attempt_number):
+for _tune_attempt in range(0 if warm_start else pede_trim_coarse_attempt_number):
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'coarse_trim', _tune_attempt):
+        continue
 
     print(f"- Tune Attempt {_tune_attempt + 1} / {pede_trim_coarse_attempt_number}:")
 
@@ -338,85 +517,130 @@ for _tune_attempt in range(pede_trim_coarse_attempt_number):
 
     time.sleep(delay_after_setting_i2c)
 
-    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
+    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
 
     caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
     half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
 
+    if args.ui:
+        current_progress_int = int(100 * (global_scan_coarse_number + pede_trim_probe_number + _tune_attempt) / ui_total_measurements)
+        caliblibX.ui_progress(current_progress_int)
+
+    _changed_chn_num = 0
     if _tune_attempt < pede_trim_coarse_attempt_number - 1:
-        caliblibX.tune_chn_trim_inv(best_chn_trim, adc_mean_list, half_avg_list, pede_tolerance, pede_trim_step_size)
+        _changed_chn_num = caliblibX.solve_chn_trim_inv(best_chn_trim, adc_mean_list, half_avg_list, pede_trim_slope, pede_tolerance, dead_channels, coarse_trim_history)
+        print(f"-- {_changed_chn_num} channels out of tolerance")
     else:
-        fig_pede_after_global_inv, ax_pede_after_global_inv = caliblibX.plot_channel_adc(adc_mean_list, adc_err_list, 'Coarse Pedestal Trim', dead_channels, half_avg_list)
-        fig_pede_after_global_inv.savefig(os.path.join(output_dump_folder, '03_coarse_pede_trim.png'))
-        print(f"- Saved pedestal plot after global inverted reference voltage scan to {os.path.join(output_dump_folder, '03_coarse_pede_trim.png')}")
-
-    if args.ui:
-        current_progress_int = int(100 * (len(global_scan_range) + _tune_attempt) / ui_total_measurements)
-        print(f"ui_progress:{current_progress_int}%")
-
-# * --- Fine inv_vref scan ---------------------------------------------------
-global_inv_scan_range_min = min(best_inv_vref_coarse) - global_scan_fine_offset_left
-global_inv_scan_range_max = max(best_inv_vref_coarse) + global_scan_fine_offset_right
-if global_inv_scan_range_min < 0:
-    global_inv_scan_range_min = 0
-if global_inv_scan_range_max > 1023:
-    global_inv_scan_range_max = 1023
-global_scan_fine = range(global_inv_scan_range_min, global_inv_scan_range_max, global_scan_fine_step)
-scan_global_inv_ref_adc_avg_fine = np.zeros((2*total_asic, len(global_scan_fine)), dtype=float)
-scan_global_inv_ref_adc_err_fine = np.zeros((2*total_asic, len(global_scan_fine)), dtype=float)
-
-for _ref_inv in global_scan_fine:
-    print(f"- Setting Inverted Vref to {_ref_inv}")
+        _restored_chn_num = caliblibX.restore_best_chn_trim(best_chn_trim, coarse_trim_history, adc_mean_list, half_avg_list, dead_channels)
+        if _restored_chn_num > 0:
+            print(f"-- Restored the best measured trim of {_restored_chn_num} channels")
+            for _asic in range(total_asic):
+                _asic_i2c_settings = register_settings_list[_asic]
+                if not _asic_i2c_settings.set_chn_trim_inv_all(best_chn_trim[_asic]):
+                    print(f"Error: Failed to set Pedestal Trim for ASIC {_asic}.")
+                _asic_i2c_settings.send_all_channel_registers(udp_target)
+    if _changed_chn_num == 0:
+        if plot_worker.submit('plot_channel_adc', os.path.join(output_dump_folder, '03_coarse_pede_trim.png'), adc_mean_list, adc_err_list, 'Coarse Pedestal Trim', dead_channels, half_avg_list):
+            print(f"- Queued pedestal plot after coarse pedestal trim to {os.path.join(output_dump_folder, '03_coarse_pede_trim.png')}")
+        caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'coarse_trim', -1, {
+            'total_asic'        : total_asic,
+            'target_pedestal'   : target_pedestal,
+            'best_chn_trim'     : best_chn_trim
+        }, checkpoint_arrays)
+        break
+
+    caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'coarse_trim', _tune_attempt, {
+        'total_asic'        : total_asic,
+        'target_pedestal'   : target_pedestal,
+        'best_chn_trim'     : best_chn_trim
+    }, checkpoint_arrays)
+
+# * --- Fine inv_vref search -------------------------------------------------
+# - start from the coarse best values, the first step uses the local slope of
+#   the coarse search, later steps interpolate the fine points only
+# - warm start: the verification is the first point, only drifted halves move
+global_inv_slope_coarse = None
+if not warm_start:
+    _, global_inv_slope_coarse = caliblibX.interpolate_halves_inv_vref(scan_global_inv_ref_vref, scan_global_inv_ref_adc_avg, [target_pedestal] * (2*total_asic))
+global_scan_fine_halves = warm_drift_halves if warm_start else list(range(2*total_asic))
+
+global_scan_fine = range(global_scan_fine_number)
+scan_global_inv_ref_vref_fine    = np.full((2*total_asic, len(global_scan_fine)), np.nan, dtype=float)
+scan_global_inv_ref_adc_avg_fine = np.full((2*total_asic, len(global_scan_fine)), np.nan, dtype=float)
+scan_global_inv_ref_adc_err_fine = np.full((2*total_asic, len(global_scan_fine)), np.nan, dtype=float)
+
+checkpoint_arrays['scan_global_inv_ref_vref_fine']    = scan_global_inv_ref_vref_fine
+checkpoint_arrays['scan_global_inv_ref_adc_avg_fine'] = scan_global_inv_ref_adc_avg_fine
+checkpoint_arrays['scan_global_inv_ref_adc_err_fine'] = scan_global_inv_ref_adc_err_fine
+if resume_checkpoint is not None:
+    for _key in ['scan_global_inv_ref_vref_fine', 'scan_global_inv_ref_adc_avg_fine', 'scan_global_inv_ref_adc_err_fine']:
+        if _key in resume_arrays and resume_arrays[_key].shape == checkpoint_arrays[_key].shape:
+            checkpoint_arrays[_key][...] = resume_arrays[_key]
+
+for _scan_index in global_scan_fine:
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'global_fine', _scan_index):
+        continue
+    if warm_start and _scan_index == 0:
+        scan_global_inv_ref_vref_fine[:, 0]    = best_inv_vref_coarse
+        scan_global_inv_ref_adc_avg_fine[:, 0] = warm_verify_half_avg
+        scan_global_inv_ref_adc_err_fine[:, 0] = warm_verify_half_err
+        continue
+    if _scan_index == 0:
+        _halves_inv_vref = list(best_inv_vref_coarse)
+    else:
+        _halves_adc_diff = np.abs(scan_global_inv_ref_adc_avg_fine[global_scan_fine_halves, :_scan_index] - target_pedestal)
+        if np.all(np.nanmin(_halves_adc_diff, axis=1) <= global_scan_tolerance):
+            print(f"-- All halves within {global_scan_tolerance} ADC of {target_pedestal}")
+            break
+        if warm_start and _scan_index == 1:
+            _halves_inv_vref = [min(max(best_inv_vref_coarse[_half] + warm_inv_vref_probe_step, 0), 1023) for _half in range(2*total_asic)]
+        else:
+            _halves_inv_vref, _ = caliblibX.interpolate_halves_inv_vref(scan_global_inv_ref_vref_fine[:, :_scan_index], scan_global_inv_ref_adc_avg_fine[:, :_scan_index], [target_pedestal] * (2*total_asic), global_inv_slope_coarse)
+        # halves that are not searched keep their inv_vref
+        _halves_inv_vref = [_halves_inv_vref[_half] if _half in global_scan_fine_halves else best_inv_vref_coarse[_half] for _half in range(2*total_asic)]
+
+    print(f"- Setting Inverted Vref to {_halves_inv_vref}")
     for _asic in range(total_asic):
         _asic_i2c_settings = register_settings_list[_asic]
-        if not _asic_i2c_settings.set_inv_vref(_ref_inv, 0):
+        if not _asic_i2c_settings.set_inv_vref(_halves_inv_vref[2*_asic], 0):
             print(f"Error: Failed to set Inverted Vref 0 for ASIC {_asic}.")
-        if not _asic_i2c_settings.set_inv_vref(_ref_inv, 1):
+        if not _asic_i2c_settings.set_inv_vref(_halves_inv_vref[2*_asic + 1], 1):
             print(f"Error: Failed to set Inverted Vref 1 for ASIC {_asic}.")
 
         _asic_i2c_settings.send_reference_voltage_0_register(udp_target)
         _asic_i2c_settings.send_reference_voltage_1_register(udp_target)
 
     time.sleep(delay_after_setting_i2c)
-    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
+    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
 
     caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
     half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
     for _half in range(2*total_asic):
-        scan_global_inv_ref_adc_avg_fine[_half, global_scan_fine.index(_ref_inv)] = half_avg_list[_half]
-        scan_global_inv_ref_adc_err_fine[_half, global_scan_fine.index(_ref_inv)] = half_err_list[_half]
+        scan_global_inv_ref_vref_fine[_half, _scan_index]    = _halves_inv_vref[_half]
+        scan_global_inv_ref_adc_avg_fine[_half, _scan_index] = half_avg_list[_half]
+        scan_global_inv_ref_adc_err_fine[_half, _scan_index] = half_err_list[_half]
 
     if args.ui:
-        current_progress_int = int(100 * (len(global_scan_range) + pede_trim_coarse_attempt_number + global_scan_fine.index(_ref_inv)) / ui_total_measurements)
-        print(f"ui_progress:{current_progress_int}%")
+        current_progress_int = int(100 * (global_scan_coarse_number + pede_trim_probe_number + pede_trim_coarse_attempt_number + _scan_index) / ui_total_measurements)
+        caliblibX.ui_progress(current_progress_int)
+
+    caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'global_fine', _scan_index, {
+        'total_asic'        : total_asic,
+        'target_pedestal'   : target_pedestal,
+        'best_chn_trim'     : best_chn_trim
+    }, checkpoint_arrays)
 
 for _half in range(2*total_asic):
     adc_values = scan_global_inv_ref_adc_avg_fine[_half, :]
     diffs = np.abs(adc_values - target_pedestal)
-    best_index = np.argmin(diffs)
-    best_inv_vref = list(global_scan_fine)[best_index]
+    best_index = np.nanargmin(diffs)
+    best_inv_vref = int(scan_global_inv_ref_vref_fine[_half, best_index])
     best_inv_vref_fine.append(best_inv_vref)
     print(f"-- Half {_half}: Best Inverted Vref = {best_inv_vref}, Achieved Pedestal = {adc_values[best_index]:.2f}")
 
-fig_global_inv_fine, axs_global_inv_fine = plt.subplots(1, 1, figsize=(10, 6))
-for _half in range(2*total_asic):
-    axs_global_inv_fine.errorbar(
-        list(global_scan_fine),
-        scan_global_inv_ref_adc_avg_fine[_half, :],
-        yerr=scan_global_inv_ref_adc_err_fine[_half, :],
-        label=f'Half {_half}'
-    )
-    # draw the best point as a vertical line
-    best_inv_vref = best_inv_vref_fine[_half]
-    axs_global_inv_fine.axvline(x=best_inv_vref, color='r', linestyle='--', alpha=0.5)
-axs_global_inv_fine.set_title('Fine Scan of Inverted Reference Voltage')
-axs_global_inv_fine.set_xlabel('Inverted Reference Voltage Setting')
-axs_global_inv_fine.set_ylabel('Average ADC Value')
-axs_global_inv_fine.legend()
-fig_global_inv_fine.tight_layout()
 fig_global_inv_fine_path = os.path.join(output_dump_folder, '04_global_inv_ref_scan_fine.png')
-fig_global_inv_fine.savefig(fig_global_inv_fine_path)
-print(f"- Saved fine global inverted reference voltage scan plot to {fig_global_inv_fine_path}")
+if plot_worker.submit('plot_inv_vref_scan', fig_global_inv_fine_path, scan_global_inv_ref_vref_fine, scan_global_inv_ref_adc_avg_fine, scan_global_inv_ref_adc_err_fine, best_inv_vref_fine, target_pedestal, 'Fine Scan of Inverted Reference Voltage'):
+    print(f"- Queued fine global inverted reference voltage scan plot to {fig_global_inv_fine_path}")
 
 # set the best inverted reference voltage found
 for _asic in range(total_asic):
@@ -433,20 +657,25 @@ for _asic in range(total_asic):
 
 time.sleep(delay_after_setting_i2c)
 
-adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
+adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
 
 caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
 halves_target_list = [target_pedestal] * 2 * total_asic
 
-fig_pede_after_global_inv, ax_pede_after_global_inv = caliblibX.plot_channel_adc(adc_mean_list, adc_err_list, 'Fine Inverted Reference Voltage Scan', dead_channels, halves_target_list)
-fig_pede_after_global_inv.savefig(os.path.join(output_dump_folder, '05_fine_inv_vref_scan.png'))
-print(f"- Saved pedestal plot after fine inverted reference voltage scan to {os.path.join(output_dump_folder, '05_fine_inv_vref_scan.png')}")
+if plot_worker.submit('plot_channel_adc', os.path.join(output_dump_folder, '05_fine_inv_vref_scan.png'), adc_mean_list, adc_err_list, 'Fine Inverted Reference Voltage Scan', dead_channels, halves_target_list):
+    print(f"- Queued pedestal plot after fine inverted reference voltage scan to {os.path.join(output_dump_folder, '05_fine_inv_vref_scan.png')}")
 
 # * --- Final fine tune of pedestal trim with inverted reference voltage -----
-caliblibX.tune_chn_trim_inv(best_chn_trim, adc_mean_list, halves_target_list, pede_tolerance//2, pede_trim_step_size//2)
+# - the fitted slope is still valid after the fine inv_vref change, so the
+#   trims jump to the predicted values right away
+final_trim_history = {}
+if not caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'final_trim', 0):
+    caliblibX.solve_chn_trim_inv(best_chn_trim, adc_mean_list, halves_target_list, pede_trim_slope, pede_tolerance//2, dead_channels, final_trim_history)
 
 for _tune_attempt in range(pede_trim_attempt_number):
-    
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'final_trim', _tune_attempt):
+        continue
+
     print(f"- Final Tune Attempt {_tune_attempt + 1} / {pede_trim_attempt_number}:")
 
     for _asic in range(total_asic):
@@ -457,21 +686,43 @@ for _tune_attempt in range(pede_trim_attempt_number):
 
     time.sleep(delay_after_setting_i2c)
 
-    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False)
+    adc_mean_list, adc_err_list = caliblibX.measure_adc(udp_target, total_asic, machine_gun, expected_event_number, i2c_fragment_life, i2c_retry, _verbose=False, _estimator=args.estimator)
 
     caliblibX.print_adc_to_terminal(adc_mean_list, adc_err_list)
     half_avg_list, half_err_list = caliblibX.calculate_half_average_adc(adc_mean_list, adc_err_list, total_asic, dead_channels)
 
+    if args.ui:
+        current_progress_int = int(100 * (global_scan_coarse_number + pede_trim_probe_number + pede_trim_coarse_attempt_number + len(global_scan_fine) + _tune_attempt) / ui_total_measurements)
+        caliblibX.ui_progress(current_progress_int)
+
+    _changed_chn_num = 0
     if _tune_attempt < pede_trim_attempt_number - 1:
-        caliblibX.tune_chn_trim_inv(best_chn_trim, adc_mean_list, halves_target_list, pede_tolerance//2, pede_trim_step_size//2)
+        _changed_chn_num = caliblibX.solve_chn_trim_inv(best_chn_trim, adc_mean_list, halves_target_list, pede_trim_slope, pede_tolerance//2, dead_channels, final_trim_history)
+        print(f"-- {_changed_chn_num} channels out of tolerance")
     else:
-        fig_pede_after_global_inv, ax_pede_after_global_inv = caliblibX.plot_channel_adc(adc_mean_list, adc_err_list, 'Final Fine Pedestal Trim', dead_channels, halves_target_list)
-        fig_pede_after_global_inv.savefig(os.path.join(output_dump_folder, '06_final_fine_pede_trim.png'))
-        print(f"- Saved pedestal plot after final fine pedestal trim to {os.path.join(output_dump_folder, '06_final_fine_pede_trim.png')}")
-
-    if args.ui:
-        current_progress_int = int(100 * (len(global_scan_range) + pede_trim_coarse_attempt_number + len(global_scan_fine) + _tune_attempt) / ui_total_measurements)
-        print(f"ui_progress:{current_progress_int}%")
+        _restored_chn_num = caliblibX.restore_best_chn_trim(best_chn_trim, final_trim_history, adc_mean_list, halves_target_list, dead_channels)
+        if _restored_chn_num > 0:
+            print(f"-- Restored the best measured trim of {_restored_chn_num} channels")
+            for _asic in range(total_asic):
+                _asic_i2c_settings = register_settings_list[_asic]
+                if not _asic_i2c_settings.set_chn_trim_inv_all(best_chn_trim[_asic]):
+                    print(f"Error: Failed to set Pedestal Trim for ASIC {_asic}.")
+                _asic_i2c_settings.send_all_channel_registers(udp_target)
+    if _changed_chn_num == 0:
+        if plot_worker.submit('plot_channel_adc', os.path.join(output_dump_folder, '06_final_fine_pede_trim.png'), adc_mean_list, adc_err_list, 'Final Fine Pedestal Trim', dead_channels, halves_target_list):
+            print(f"- Queued pedestal plot after final fine pedestal trim to {os.path.join(output_dump_folder, '06_final_fine_pede_trim.png')}")
+        caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'final_trim', -1, {
+            'total_asic'        : total_asic,
+            'target_pedestal'   : target_pedestal,
+            'best_chn_trim'     : best_chn_trim
+        }, checkpoint_arrays)
+        break
+
+    caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'final_trim', _tune_attempt, {
+        'total_asic'        : total_asic,
+        'target_pedestal'   : target_pedestal,
+        'best_chn_trim'     : best_chn_trim
+    }, checkpoint_arrays)
 
 # * --- Save final settings -----------------------------------------------
 for _asic in range(total_asic):
@@ -479,6 +730,23 @@ for _asic in range(total_asic):
     output_i2c_path = os.path.join(output_dump_folder, f'asic_{_asic}_final_i2c_settings.json')
     _asic_i2c_settings.save_to_json(output_i2c_path)
     print(f"- Saved final I2C settings for ASIC {_asic} to {output_i2c_path}")
+    caliblibX.ui_output_file(_asic, output_i2c_path)
+
+caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'final', -1, {
+    'total_asic'        : total_asic,
+    'target_pedestal'   : target_pedestal,
+    'best_chn_trim'     : best_chn_trim,
+    'dead_channels'     : dead_channels
+})
+
+if udp_target.daq_stream is not None:
+    udp_target.daq_stream.stop()
+
+if args.capture:
+    udp_target.stop_capture()
+
+plot_worker.join()
 
 if args.ui:
-    print("ui_progress:100%")
\ No newline at end of file
+    caliblibX.ui_progress(100)
+    caliblibX.ui_timing(script_id_str, time.perf_counter() - script_start_time)
\ No newline at end of file
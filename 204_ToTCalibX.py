@@ -1,13 +1,12 @@
 from loguru import logger
 import caliblibX
 import os, json, time, argparse
-import matplotlib.pyplot as plt
-import termplotlib as tpl
 import numpy as np
 
 # * --- Set up script information ---------------------------------------------
 script_id_str       = os.path.basename(__file__).split('.')[0]
 script_version_str  = '1.1'
+script_start_time   = time.perf_counter()
 script_folder       = os.path.dirname(__file__)
 script_info_str = "-- " + script_id_str + " (v" + script_version_str + ")"
 while len(script_info_str) < 73:
@@ -33,13 +32,38 @@ parser.add_argument('--cfcomp', type=int, help='Feedback capacitor compensation
 parser.add_argument('--scan-pack', type=int, help='Number of channels to scan in parallel', default=8)
 parser.add_argument('--scan-chn', type=int, help='Number of channels to scan per ASIC', default=76)
 
+# warm start settings
+parser.add_argument('--warm', type=str, help='Previous result I2C JSON file(s) to start the ToT thresholds and trims from')
+parser.add_argument('--touch-up', type=bool, help='With --warm, only retune the channels failing a quick check of the previous result', default=False, nargs='?', const=True)
+
+# resume settings
+parser.add_argument('--resume', type=str, help='Checkpoint file (or output folder of an interrupted run) to resume from')
+
+# daq settings
+parser.add_argument('--no_stream', type=bool, help='Start and stop the DAQ in every measurement instead of keeping it armed for the whole scan', default=False, nargs='?', const=True)
+parser.add_argument('--jumbo', type=bool, help='Jumbo data datagrams (46 instead of 7 half packets per datagram, needs jumbo frames on the data link)', default=False, nargs='?', const=True)
+
+# capture settings
+parser.add_argument('--capture', type=bool, help='Record the received data datagrams to data_capture.h2gcap in the output folder', default=False, nargs='?', const=True)
+
 # ui update
 parser.add_argument('--ui', type=bool, help='Enable UI updates during scan', default=False, nargs='?', const=True)
 args = parser.parse_args()
 
 # * --- Load configuration file -----------------------------------------------
-output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
+resume_checkpoint = None
+if args.resume:
+    resume_checkpoint, resume_arrays = caliblibX.load_checkpoint(args.resume, script_id_str)
+    if resume_checkpoint is None:
+        print(f"Error: Cannot resume from {args.resume}.")
+        exit()
+    output_dump_folder = resume_checkpoint['output_folder']
+    print(f"- Resuming in {output_dump_folder}")
+else:
+    output_dump_folder, output_config_path = caliblibX.output_path_setup(script_id_str, time.strftime('%Y%m%d_%H%M%S'), os.path.dirname(__file__))
 output_config_json = {}
+scan_results_store = caliblibX.scan_store(output_dump_folder, script_id_str)
+plot_worker = caliblibX.plot_worker()
 
 # * --- Load udp settings from config file ------------------------------------
 udp_target = caliblibX.udp_target('10.1.2.207', 11000, 11001, '10.1.2.208', 11000)
@@ -52,6 +76,8 @@ print(f"-- PC IP: {udp_target.pc_ip}, Port: {udp_target.pc_port_cmd}/{udp_target
 print(f"-- Board IP: {udp_target.board_ip}, Port: {udp_target.board_port}")
 
 udp_target.connect_to_pool(timeout=0.1)
+if args.capture:
+    udp_target.start_capture(os.path.join(output_dump_folder, 'data_capture.h2gcap'))
 
 # * --- Set running parameters ------------------------------------------------
 total_asic = 2
@@ -92,10 +118,38 @@ else:
             exit()
     print("- Using the same I2C settings for all ASICs")
 
+# * --- Load previous results for warm start ----------------------------------
+warm_start = False
+warm_register_list = []
+if args.warm:
+    warm_files = args.warm.split(',')
+    if len(warm_files) != total_asic and len(warm_files) != 1:
+        print(f"Error: Number of warm start files provided ({len(warm_files)}) does not match number of ASICs to scan ({total_asic}).")
+        exit()
+    for asic_idx in range(total_asic):
+        warm_file = warm_files[asic_idx] if len(warm_files) == total_asic else warm_files[0]
+        try:
+            warm_i2c_settings = caliblibX.h2gcroc_registers_full()
+            warm_i2c_settings.load_from_json(warm_file)
+            warm_register_list.append(warm_i2c_settings)
+            print(f"- Warm start from {warm_file} for ASIC {asic_idx}.")
+        except Exception as e:
+            print(f"Error loading warm start settings from {warm_file}: {e}")
+            exit()
+    warm_start = True
+touch_up = False
+if args.touch_up:
+    if not warm_start:
+        print("Error: --touch-up needs the previous result given with --warm.")
+        exit()
+    touch_up = True
+
 # * --- Set running parameters ------------------------------------------------
 target_tot = 350
 if args.target is not None:
     target_tot = int(args.target)
+elif resume_checkpoint is not None:
+    target_tot = int(resume_checkpoint['state']['target_tot'])
 
 print(f"- Target ToT threshold: {target_tot} DAC")
 # - generator settings
@@ -147,12 +201,101 @@ _round_enable_half_tuning = [True, True, False, False, False]
 _round_enable_channel_tuning_reference_half = [False, True, True, False, False]
 _round_enable_channel_tuning_reference_target = [False, False, False, True, True]
 
+# - warm start: ToT thresholds and trims from the previous result, dead channels
+#   from the checkpoint written next to it (if any). Round 0 verifies the
+#   previous result with a full fine scan, the following rounds only scan the
+#   channels that drifted beyond tolerance.
+# - warm_half_tolerance: half average deviation that triggers half tuning
+# - warm_chn_tolerance: channel deviation that triggers channel tuning
+# - touch-up: round 0 only injects at target -/+ warm_chn_tolerance, channels
+#   not turning on in between are scanned again and merged into the final
+#   scan of the previous result (checkpoint.npz next to the --warm file, the
+#   last scan round for checkpoints without the final scan)
+warm_half_tolerance     = 16
+warm_chn_tolerance      = 8
+warm_drift_halves       = []
+warm_drift_channels     = []
+warm_scan_chn_list      = []
+warm_scan_values        = None
+warm_scan_base          = None
+if warm_start:
+    for _asic in range(total_asic):
+        for _half in range(2):
+            _warm_vref = warm_register_list[_asic].get_tot_vref(_half)
+            if _warm_vref is not None:
+                tot_halves[_asic*2 + _half] = _warm_vref
+        for _chn in range(72):
+            _warm_trim = warm_register_list[_asic].get_chn_trim_tot(_chn)
+            if _warm_trim is not None:
+                tot_channel_trims[_asic*72 + _chn] = _warm_trim
+    _warm_checkpoint_path = os.path.join(os.path.dirname(os.path.abspath(warm_files[0])), 'checkpoint.json')
+    if os.path.exists(_warm_checkpoint_path):
+        _warm_checkpoint, _warm_arrays = caliblibX.load_checkpoint(_warm_checkpoint_path, script_id_str)
+        if _warm_checkpoint is not None:
+            dead_channel_list = _warm_checkpoint['state'].get('dead_channel_list', [])
+            if touch_up:
+                for _warm_key in ['final'] + [f'scan{_warm_round}' for _warm_round in range(4, -1, -1)]:
+                    if f'{_warm_key}_values' in _warm_arrays and list(_warm_arrays[f'{_warm_key}_values']) == list(scan_12b_fine_range):
+                        warm_scan_values = list(scan_12b_fine_range)
+                        warm_scan_base   = [_warm_arrays[f'{_warm_key}_val{_val}'] for _val in range(3)]
+                        break
+    if touch_up and warm_scan_base is None:
+        print("- Warning: No previous scan with the same range found, only the touched up channels will be shown in the plots.")
+    print(f"- Warm start ToT thresholds: {tot_halves}, dead channels: {dead_channel_list}")
+    _round_use_fine_scan = [True, True, True]
+    _round_enable_half_tuning = [True, False, False]
+    _round_enable_channel_tuning_reference_half = [False, False, False]
+    _round_enable_channel_tuning_reference_target = [True, True, True]
+    if touch_up:
+        _round_enable_half_tuning = [False, False, False]
+        _round_enable_channel_tuning_reference_target = [False, True, True]
+touch_up_check_range = [max(int(target_tot - warm_chn_tolerance), 0), int(target_tot + warm_chn_tolerance)]
+
 ui_total_steps = len(scan_12b_fine_range) * sum(_round_enable_half_tuning) + len(scan_12b_fine_range) * sum(_round_enable_channel_tuning_reference_half) + len(scan_final_12b_range) * sum(_round_enable_channel_tuning_reference_target)
 ui_current_step = 0
+if warm_start:
+    ui_total_steps = len(scan_12b_fine_range) * (len(_round_use_fine_scan) + 1)
+if touch_up:
+    ui_total_steps = len(touch_up_check_range) + len(scan_12b_fine_range) * len(_round_use_fine_scan)
 if not args.ui:
     ui_total_steps = 0
     ui_current_step = 0
 
+# * --- Restore state from checkpoint ------------------------------------------
+checkpoint_stages = ['scan_round', 'final_scan']
+checkpoint_arrays = {}
+if resume_checkpoint is not None:
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'final_scan'):
+        print(f"- Checkpoint in {output_dump_folder} is already complete, nothing to resume.")
+        exit()
+    resume_state = resume_checkpoint['state']
+    if resume_state['total_asic'] != total_asic:
+        print(f"Error: Checkpoint was taken with {resume_state['total_asic']} ASICs, not {total_asic}.")
+        exit()
+    if resume_state['target_tot'] != target_tot:
+        print(f"Error: Checkpoint target {resume_state['target_tot']} does not match target {target_tot}.")
+        exit()
+    toa_halves          = resume_state['toa_halves']
+    tot_halves          = resume_state['tot_halves']
+    toa_channel_trims   = resume_state['toa_channel_trims']
+    tot_channel_trims   = resume_state['tot_channel_trims']
+    dead_channel_list   = resume_state['dead_channel_list']
+    if args.ui:
+        ui_current_step = resume_state['ui_current_step']
+    checkpoint_arrays   = dict(resume_arrays)
+    if resume_state.get('warm_start', False) != warm_start or resume_state.get('touch_up', False) != touch_up:
+        print("Error: Checkpoint warm start mode does not match, use --warm/--touch-up as in the interrupted run.")
+        exit()
+    if warm_start:
+        warm_drift_halves   = resume_state['warm_drift_halves']
+        warm_drift_channels = resume_state['warm_drift_channels']
+        warm_scan_chn_list  = resume_state['warm_scan_chn_list']
+        _last_round = resume_checkpoint['step'] if resume_checkpoint['stage'] == 'scan_round' else len(_round_use_fine_scan) - 1
+        # - touch-up: the round 0 check is not merged, keep the previous result
+        if f'scan{_last_round}_values' in checkpoint_arrays and not (touch_up and _last_round == 0):
+            warm_scan_values = list(checkpoint_arrays[f'scan{_last_round}_values'])
+            warm_scan_base   = [checkpoint_arrays[f'scan{_last_round}_val{_val}'] for _val in range(3)]
+
 r_f_code = args.rf & 0x0F
 c_f_code = args.cf & 0x0F
 cc_gain_code = args.cc & 0x0F
@@ -225,7 +368,7 @@ if not caliblibX.send_check_DAQ_gen_params_calib(
     gen_fcmd            = gen_fcmd_L1A,
     ext_trg_en          = 0x00, ext_trg_delay       = 0x00,
     ext_trg_deadtime    = 10000,
-    jumbo_en            = 0x00,
+    jumbo_en            = 0x01 if args.jumbo else 0x00,
     gen_preimp_en       = 0x01, 
     gen_pre_interval    = gen_pre_interval_value,
     gen_nr_of_cycle     = gen_nr_cycle,
@@ -243,12 +386,29 @@ if not caliblibX.send_check_DAQ_gen_params_calib(
 ):
     print("-- Warning: Failed to set DAQ/Gen parameters.")
 
+# * --- Keep the DAQ armed for the whole scan ---------------------------------
+# - every measurement only triggers a generator burst (see caliblibX.daq_stream)
+if not args.no_stream:
+    udp_target.daq_stream = caliblibX.daq_stream(udp_target)
+    udp_target.daq_stream.start()
+
 for _scan_round in range(len(_round_use_fine_scan)):
+    if caliblibX.checkpoint_completed(resume_checkpoint, checkpoint_stages, 'scan_round', _scan_round):
+        print(f"- Skipping scan round {_scan_round}, restored from checkpoint")
+        continue
     _round_scan_range = scan_12b_fine_range if _round_use_fine_scan[_scan_round] else scan_12b_range
+    if touch_up and _scan_round == 0:
+        _round_scan_range = touch_up_check_range
+    _round_scan_chn_list = None
+    if warm_start and _scan_round > 0:
+        if sum([len(_chn_list) for _chn_list in warm_scan_chn_list]) == 0:
+            print(f"- Skipping scan round {_scan_round}, no channel drifted beyond tolerance")
+            continue
+        _round_scan_chn_list = warm_scan_chn_list
 
     print(f"- Starting scan round {_scan_round}...")
-    used_scan_values, scan_adc_list, scan_adc_error_list, scan_tot_list, scan_tot_error_list, scan_toa_list, scan_toa_error_list = caliblibX.Scan_12b(
-        udp_target, _round_scan_range, total_asic, scan_chn_pack, scan_asic_chn, machine_gun, expected_event_number, i2c_fragment_life, dead_channel_list, register_settings_list, toa_halves, tot_halves, toa_channel_trims, tot_channel_trims, i2c_retry, _toa_setting=False, _total_steps = ui_total_steps, _current_step = ui_current_step
+    used_scan_values, scan_adc_list, scan_adc_error_list, scan_tot_list, scan_tot_error_list, scan_toa_list, scan_toa_error_list, ui_current_step = caliblibX.Scan_12b(
+        udp_target, _round_scan_range, total_asic, scan_chn_pack, scan_asic_chn, machine_gun, expected_event_number, i2c_fragment_life, dead_channel_list, register_settings_list, toa_halves, tot_halves, toa_channel_trims, tot_channel_trims, i2c_retry, _toa_setting=False, _total_steps = ui_total_steps, _current_step = ui_current_step, _scan_chn_list = _round_scan_chn_list, _stream = not args.no_stream
     )
 
     if scan_adc_list is None:
@@ -258,26 +418,76 @@ for _scan_round in range(len(_round_use_fine_scan)):
     scan_tot_list_np = np.array(scan_tot_list).transpose().transpose()
     scan_toa_list_np = np.array(scan_toa_list).transpose().transpose()
 
+    # * Only the drifted channels were scanned, keep the previous values of the others
+    if _round_scan_chn_list is not None:
+        scan_adc_list_np = caliblibX.merge_scan_channels(warm_scan_base[0], scan_adc_list_np, total_asic, _round_scan_chn_list)
+        scan_tot_list_np = caliblibX.merge_scan_channels(warm_scan_base[1], scan_tot_list_np, total_asic, _round_scan_chn_list)
+        scan_toa_list_np = caliblibX.merge_scan_channels(warm_scan_base[2], scan_toa_list_np, total_asic, _round_scan_chn_list)
+    if warm_start and not (touch_up and _scan_round == 0 and warm_scan_base is not None):
+        warm_scan_values = list(used_scan_values)
+        warm_scan_base   = [scan_adc_list_np, scan_tot_list_np, scan_toa_list_np]
+
     tot_turn_on  = caliblibX.TurnOnPoints(scan_tot_list_np, used_scan_values, tot_turn_on_threshold)
     half_turn_on = caliblibX.HalfTurnOnAverage(tot_turn_on, [], dead_channel_list, total_asic)
     half_turn_on[np.isnan(half_turn_on)] = target_tot
 
+    # * Find the halves and channels that drifted away from the previous result
+    if warm_start and _scan_round == 0:
+        warm_drift_halves   = [] if touch_up else [_half for _half in range(total_asic * 2) if abs(half_turn_on[_half] - target_tot) > warm_half_tolerance]
+        warm_drift_channels = []
+        warm_scan_chn_list  = [[] for _ in range(total_asic)]
+        for _asic in range(total_asic):
+            for _chn in range(76):
+                _chn_valid = caliblibX.single_channel_index_remove_cm_calib(_chn)
+                if _chn_valid == -1 or _chn_valid in dead_channel_list:
+                    continue
+                if touch_up:
+                    _chn_drifted = scan_tot_list_np[0][_asic*76 + _chn] > tot_turn_on_threshold or scan_tot_list_np[-1][_asic*76 + _chn] <= tot_turn_on_threshold
+                else:
+                    _chn_drifted = _asic*2 + (_chn // 38) in warm_drift_halves or abs(tot_turn_on[_asic*76 + _chn] - target_tot) > warm_chn_tolerance
+                if _chn_drifted:
+                    warm_drift_channels.append(_asic * 72 + _chn_valid)
+                    warm_scan_chn_list[_asic].append(_chn)
+        if touch_up:
+            for _half in range(total_asic * 2):
+                if len([_chn for _chn in warm_scan_chn_list[_half // 2] if _chn // 38 == _half % 2]) > 18:
+                    print(f"- Warning: More than half of the channels in half {_half} failed the check, a --warm run without --touch-up is recommended")
+        print(f"- Warm start: {len(warm_drift_halves)} halves and {len(warm_drift_channels)} channels drifted beyond tolerance")
+
     if args.ui:
         for _asic in range(total_asic):
             tot_turn_on_asic = tot_turn_on[_asic*76:(_asic+1)*76]
             tot_turn_on_asic_valid = caliblibX.channel_list_remove_cm_calib(tot_turn_on_asic)
-            print(f"ui_asic{_asic}: " + " ".join([f"{int(x):3d}" for x in tot_turn_on_asic_valid]))
-
-    fig_adc, ax_adc = caliblibX.Draw2DIM("ADC Values", "Channel Number", "12b DAC Value", total_asic, scan_adc_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val0.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val0.csv"), _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val0.png"))
-    plt.close(fig_adc)
-    fig_tot, ax_tot = caliblibX .Draw2DIM("ToT Values", "Channel Number", "12b DAC Value", total_asic, scan_tot_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val1.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val1.csv"), _turn_on_points=tot_turn_on, _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val1.png"))
-    plt.close(fig_tot)
-    fig_toa, ax_toa = caliblibX.Draw2DIM("ToA Values", "Channel Number", "12b DAC Value", total_asic, scan_toa_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val2.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val2.csv"), _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val2.png"))
-    plt.close(fig_toa)
+            caliblibX.ui_asic_values(_asic, 'tot_turn_on', tot_turn_on_asic_valid)
+
+    # * Keep the round in the scan store, with the thresholds and trims used in the scan
+    scan_error_list_np = [np.array(_err) for _err in (scan_adc_error_list, scan_tot_error_list, scan_toa_error_list)]
+    if _round_scan_chn_list is not None:
+        scan_error_list_np = [caliblibX.merge_scan_channels(np.zeros_like(_err), _err, total_asic, _round_scan_chn_list) for _err in scan_error_list_np]
+    scan_results_store.append(f'scan{_scan_round}', {
+        'scan_values'   : used_scan_values,
+        'val0'          : scan_adc_list_np,
+        'val0_err'      : scan_error_list_np[0],
+        'val1'          : scan_tot_list_np,
+        'val1_err'      : scan_error_list_np[1],
+        'val2'          : scan_toa_list_np,
+        'val2_err'      : scan_error_list_np[2],
+        'turn_on'       : tot_turn_on,
+        'toa_halves'    : toa_halves,
+        'tot_halves'    : tot_halves,
+        'toa_trims'     : toa_channel_trims,
+        'tot_trims'     : tot_channel_trims
+    }, {'round': _scan_round, 'target_tot': target_tot, 'scanned_channels': 'all' if _round_scan_chn_list is None else 'drifted'})
+
+    plot_worker.submit('Draw2DIM', None, "ADC Values", "Channel Number", "12b DAC Value", total_asic, scan_adc_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val0.pdf"), [str(x) for x in used_scan_values], _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val0.png"))
+    plot_worker.submit('Draw2DIM', None, "ToT Values", "Channel Number", "12b DAC Value", total_asic, scan_tot_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val1.pdf"), [str(x) for x in used_scan_values], _turn_on_points=tot_turn_on, _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val1.png"))
+    plot_worker.submit('Draw2DIM', None, "ToA Values", "Channel Number", "12b DAC Value", total_asic, scan_toa_list_np, os.path.join(output_dump_folder, f"scan{_scan_round}_val2.pdf"), [str(x) for x in used_scan_values], _image_saving_path = os.path.join(output_dump_folder, f"scan{_scan_round}_val2.png"))
 
     # * Update the half-wise ToA thresholds
     if _round_enable_half_tuning[_scan_round]:
         for _half in range(total_asic * 2):
+            if warm_start and _half not in warm_drift_halves:
+                continue
             tot_halves[_half] += int(tot_global_threshold_ratio * (target_tot - half_turn_on[_half]))
             if tot_halves[_half] < 0:
                 tot_halves[_half] = 0
@@ -303,22 +513,59 @@ for _scan_round in range(len(_round_use_fine_scan)):
                 _chn_valid = caliblibX.single_channel_index_remove_cm_calib(_chn)
                 if _chn_valid == -1 or _chn_valid in dead_channel_list:
                     continue
+                # - warm start: halves retuned in this round are checked again in the next one
+                if warm_start and (_asic * 72 + _chn_valid not in warm_drift_channels or (_scan_round == 0 and _asic*2 + (_chn // 38) in warm_drift_halves)):
+                    continue
                 tot_channel_trims[_asic * 72 + _chn_valid] += int(tot_channel_threshold_ratio * (tot_turn_on[_asic*76 + _chn] - target_tot))
                 if tot_channel_trims[_asic * 72 + _chn_valid] < 0:
                     tot_channel_trims[_asic * 72 + _chn_valid] = 0
                 elif tot_channel_trims[_asic * 72 + _chn_valid] > 63:
                     tot_channel_trims[_asic * 72 + _chn_valid] = 63
+
+    checkpoint_arrays[f'scan{_scan_round}_values'] = used_scan_values
+    checkpoint_arrays[f'scan{_scan_round}_val0']   = scan_adc_list_np
+    checkpoint_arrays[f'scan{_scan_round}_val1']   = scan_tot_list_np
+    checkpoint_arrays[f'scan{_scan_round}_val2']   = scan_toa_list_np
+    caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'scan_round', _scan_round, {
+        'total_asic'        : total_asic,
+        'target_tot'        : target_tot,
+        'toa_halves'        : toa_halves,
+        'tot_halves'        : tot_halves,
+        'toa_channel_trims' : toa_channel_trims,
+        'tot_channel_trims' : tot_channel_trims,
+        'dead_channel_list' : dead_channel_list,
+        'ui_current_step'   : ui_current_step,
+        'warm_start'        : warm_start,
+        'touch_up'          : touch_up,
+        'warm_drift_halves' : warm_drift_halves,
+        'warm_drift_channels': warm_drift_channels,
+        'warm_scan_chn_list': warm_scan_chn_list
+    }, checkpoint_arrays)
+
 # show the final scan result
-used_scan_values, scan_adc_list, scan_adc_error_list, scan_tot_list, scan_tot_error_list, scan_toa_list, scan_toa_error_list = caliblibX.Scan_12b(
-    udp_target, scan_12b_fine_range, total_asic, scan_chn_pack, scan_asic_chn, machine_gun, expected_event_number, i2c_fragment_life, dead_channel_list, register_settings_list, toa_halves, tot_halves, toa_channel_trims, tot_channel_trims, i2c_retry, _toa_setting=False, _total_steps = ui_total_steps, _current_step = ui_current_step
-)
+# - warm start: only the drifted channels are scanned again
+if warm_start and sum([len(_chn_list) for _chn_list in warm_scan_chn_list]) == 0:
+    print("- No channel drifted beyond tolerance, using the previous scan as final scan")
+    used_scan_values = warm_scan_values
+    scan_adc_list_np, scan_tot_list_np, scan_toa_list_np = warm_scan_base
+    final_error_list_np = None
+else:
+    used_scan_values, scan_adc_list, scan_adc_error_list, scan_tot_list, scan_tot_error_list, scan_toa_list, scan_toa_error_list, ui_current_step = caliblibX.Scan_12b(
+        udp_target, scan_12b_fine_range, total_asic, scan_chn_pack, scan_asic_chn, machine_gun, expected_event_number, i2c_fragment_life, dead_channel_list, register_settings_list, toa_halves, tot_halves, toa_channel_trims, tot_channel_trims, i2c_retry, _toa_setting=False, _total_steps = ui_total_steps, _current_step = ui_current_step, _scan_chn_list = warm_scan_chn_list if warm_start else None, _stream = not args.no_stream
+    )
 
-if scan_adc_list is None:
-    print(f"Error: Final scan failed for ASIC {_asic}.")
+    if scan_adc_list is None:
+        print(f"Error: Final scan failed for ASIC {_asic}.")
 
-scan_adc_list_np = np.array(scan_adc_list).transpose().transpose()
-scan_tot_list_np = np.array(scan_tot_list).transpose().transpose()
-scan_toa_list_np = np.array(scan_toa_list).transpose().transpose()
+    scan_adc_list_np = np.array(scan_adc_list).transpose().transpose()
+    scan_tot_list_np = np.array(scan_tot_list).transpose().transpose()
+    scan_toa_list_np = np.array(scan_toa_list).transpose().transpose()
+    final_error_list_np = [np.array(_err) for _err in (scan_adc_error_list, scan_tot_error_list, scan_toa_error_list)]
+    if warm_start:
+        final_error_list_np = [caliblibX.merge_scan_channels(np.zeros_like(_err), _err, total_asic, warm_scan_chn_list) for _err in final_error_list_np]
+        scan_adc_list_np = caliblibX.merge_scan_channels(warm_scan_base[0], scan_adc_list_np, total_asic, warm_scan_chn_list)
+        scan_tot_list_np = caliblibX.merge_scan_channels(warm_scan_base[1], scan_tot_list_np, total_asic, warm_scan_chn_list)
+        scan_toa_list_np = caliblibX.merge_scan_channels(warm_scan_base[2], scan_toa_list_np, total_asic, warm_scan_chn_list)
 
 half_turn_on = caliblibX.HalfTurnOnAverage(caliblibX.TurnOnPoints(scan_tot_list_np, used_scan_values, tot_turn_on_threshold), [], dead_channel_list, total_asic)
 half_turn_on[np.isnan(half_turn_on)] = target_tot
@@ -327,14 +574,26 @@ if args.ui:
     for _asic in range(total_asic):
         tot_turn_on_asic = caliblibX.TurnOnPoints(scan_tot_list_np[_asic*76:(_asic+1)*76], used_scan_values, tot_turn_on_threshold)
         tot_turn_on_asic_valid = caliblibX.channel_list_remove_cm_calib(tot_turn_on_asic)
-        print(f"ui_final_asic{_asic}: " + " ".join([f"{int(x):3d}" for x in tot_turn_on_asic_valid]))
-
-fig_adc, ax_adc = caliblibX.Draw2DIM("Final ADC Values", "Channel Number", "12b DAC Value", total_asic, scan_adc_list_np, os.path.join(output_dump_folder, f"final_scan_val0.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"final_scan_val0.csv"), _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val0.png"))
-plt.close(fig_adc)
-fig_tot, ax_tot = caliblibX.Draw2DIM("Final ToT Values", "Channel Number", "12b DAC Value", total_asic, scan_tot_list_np, os.path.join(output_dump_folder, f"final_scan_val1.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"final_scan_val1.csv"), _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val1.png"))
-plt.close(fig_tot)
-fig_toa, ax_toa = caliblibX.Draw2DIM("Final ToA Values", "Channel Number", "12b DAC Value", total_asic, scan_toa_list_np, os.path.join(output_dump_folder, f"final_scan_val2.pdf"), [str(x) for x in used_scan_values], _data_saving_path = os.path.join(output_dump_folder, f"final_scan_val2.csv"), _turn_on_points=caliblibX.TurnOnPoints(scan_toa_list_np, used_scan_values, tot_turn_on_threshold), _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val2.png"))
-plt.close(fig_toa)
+        caliblibX.ui_asic_values(_asic, 'tot_turn_on', tot_turn_on_asic_valid, _final=True)
+
+scan_results_store.append('final', {
+    'scan_values'   : used_scan_values,
+    'val0'          : scan_adc_list_np,
+    'val0_err'      : final_error_list_np[0] if final_error_list_np is not None else None,
+    'val1'          : scan_tot_list_np,
+    'val1_err'      : final_error_list_np[1] if final_error_list_np is not None else None,
+    'val2'          : scan_toa_list_np,
+    'val2_err'      : final_error_list_np[2] if final_error_list_np is not None else None,
+    'turn_on'       : caliblibX.TurnOnPoints(scan_tot_list_np, used_scan_values, tot_turn_on_threshold),
+    'toa_halves'    : toa_halves,
+    'tot_halves'    : tot_halves,
+    'toa_trims'     : toa_channel_trims,
+    'tot_trims'     : tot_channel_trims
+}, {'target_tot': target_tot})
+
+plot_worker.submit('Draw2DIM', None, "Final ADC Values", "Channel Number", "12b DAC Value", total_asic, scan_adc_list_np, os.path.join(output_dump_folder, f"final_scan_val0.pdf"), [str(x) for x in used_scan_values], _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val0.png"))
+plot_worker.submit('Draw2DIM', None, "Final ToT Values", "Channel Number", "12b DAC Value", total_asic, scan_tot_list_np, os.path.join(output_dump_folder, f"final_scan_val1.pdf"), [str(x) for x in used_scan_values], _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val1.png"))
+plot_worker.submit('Draw2DIM', None, "Final ToA Values", "Channel Number", "12b DAC Value", total_asic, scan_toa_list_np, os.path.join(output_dump_folder, f"final_scan_val2.pdf"), [str(x) for x in used_scan_values], _turn_on_points=caliblibX.TurnOnPoints(scan_toa_list_np, used_scan_values, tot_turn_on_threshold), _image_saving_path = os.path.join(output_dump_folder, f"final_scan_val2.png"))
 
 # * --- Save final calibration settings ---------------------------------------
 for _asic in range(total_asic):
@@ -346,6 +605,33 @@ for _asic in range(total_asic):
     final_i2c_settings.save_to_json(os.path.join(output_dump_folder, f"asic{_asic}_final_calib_i2c.json"))
     json_full_path = os.path.join(output_dump_folder, f"asic{_asic}_final_calib_i2c.json")
     print(f"- Saved final I2C settings for ASIC {_asic} to {json_full_path}")
+    caliblibX.ui_output_file(_asic, json_full_path)
+
+checkpoint_arrays['final_values'] = used_scan_values
+checkpoint_arrays['final_val0']   = scan_adc_list_np
+checkpoint_arrays['final_val1']   = scan_tot_list_np
+checkpoint_arrays['final_val2']   = scan_toa_list_np
+caliblibX.save_checkpoint(output_dump_folder, script_id_str, 'final_scan', -1, {
+    'total_asic'        : total_asic,
+    'target_tot'        : target_tot,
+    'toa_halves'        : toa_halves,
+    'tot_halves'        : tot_halves,
+    'toa_channel_trims' : toa_channel_trims,
+    'tot_channel_trims' : tot_channel_trims,
+    'dead_channel_list' : dead_channel_list,
+    'ui_current_step'   : ui_current_step,
+    'warm_start'        : warm_start,
+    'touch_up'          : touch_up
+}, checkpoint_arrays)
+
+if udp_target.daq_stream is not None:
+    udp_target.daq_stream.stop()
+
+if args.capture:
+    udp_target.stop_capture()
+
+plot_worker.join()
 
 if args.ui:
-    print("ui_progress:100")
\ No newline at end of file
+    caliblibX.ui_progress(100)
+    caliblibX.ui_timing(script_id_str, time.perf_counter() - script_start_time)
\ No newline at end of file
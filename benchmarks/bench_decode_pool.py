@@ -0,0 +1,73 @@
+import sys, os, json, time, argparse, platform
+import numpy as np
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+import packetlibX
+import caliblibX
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Throughput of caliblibX.decode_pool against the number of worker processes')
+parser.add_argument('-a', '--asics', type=int, help='ASIC count of the stream', default=8)
+parser.add_argument('-m', '--machine-gun', type=int, help='Machine-gun setting of the bursts', default=10)
+parser.add_argument('-b', '--bursts', type=int, help='Bursts in the stream', default=400)
+parser.add_argument('-w', '--workers', type=str, help='Comma-separated worker counts', default='1,2,4')
+parser.add_argument('-o', '--output', type=str, help='Output JSON file', default=None)
+args = parser.parse_args()
+
+worker_counts = [int(x) for x in args.workers.split(',')]
+n_channels    = args.asics * 76
+
+# * --- Fixture -------------------------------------------------------
+# - 20 different emulator bursts repeated to the requested length
+emulator  = packetlibX.board_emulator('127.0.0.208', 11000, '127.0.0.1', 11000, 11001, asic_num=args.asics, seed=0)
+bursts    = [emulator.burst_datagrams(list(range(args.asics)), args.machine_gun) for _ in range(20)]
+datagrams = [_datagram for _index in range(args.bursts) for _datagram in bursts[_index % len(bursts)]]
+megabytes = sum(len(_datagram) for _datagram in datagrams) / 1e6
+print(f"- {len(datagrams)} datagrams, {megabytes:.1f} MB, {os.cpu_count()} cores")
+
+# * --- Run -----------------------------------------------------------
+# - reference: the same decode in the calling process
+_start = time.perf_counter()
+reference = caliblibX.channel_accumulator(n_channels)
+for _datagram in datagrams:
+    reference.add_block(packetlibX.extract_values_block(packetlibX.payload_block(packetlibX.extract_raw_data(_datagram))))
+results = [{'workers': 0, 'seconds': time.perf_counter() - _start}]
+
+for _workers in worker_counts:
+    _pool  = caliblibX.decode_pool(n_channels, _workers=_workers)
+    _start = time.perf_counter()
+    for _datagram in datagrams:
+        _pool.submit(_datagram)
+    _accumulator = _pool.close()
+    _result = {'workers': _workers, 'seconds': time.perf_counter() - _start, 'waits': _pool.waits}
+    if not np.array_equal(_accumulator.counts, reference.counts) or not np.allclose(_accumulator.sums, reference.sums):
+        print(f"Error: {_workers} workers disagree with the single process decode.")
+        sys.exit(1)
+    results.append(_result)
+
+for _result in results:
+    _result['mb_per_s'] = round(megabytes / _result['seconds'], 1)
+    _label = 'in process' if _result['workers'] == 0 else f"{_result['workers']} workers"
+    print(f"-- {_label:<12} {_result['seconds']:>7.3f} s {_result['mb_per_s']:>8.1f} MB/s")
+
+if args.output is not None:
+    with open(args.output, 'w') as f:
+        json.dump({
+            'script_version': script_version_str,
+            'time'          : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python'        : platform.python_version(),
+            'numpy'         : np.__version__,
+            'cores'         : os.cpu_count(),
+            'asics'         : args.asics,
+            'machine_gun'   : args.machine_gun,
+            'datagrams'     : len(datagrams),
+            'results'       : results,
+        }, f, indent=4)
+    print(f"- Results saved to {args.output}")
@@ -0,0 +1,230 @@
+import sys, os, json, time, glob, socket, pstats, argparse, platform, threading, subprocess
+from collections import OrderedDict
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+import packetlibX
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+script_folder       = os.path.dirname(os.path.abspath(__file__))
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='End-to-end benchmark of the calibration stages against the board emulator')
+parser.add_argument('-a', '--asics', type=str, help='Comma-separated ASIC counts to benchmark (1-8)', default='2')
+parser.add_argument('-s', '--stages', type=str, help='Comma-separated stages to run in order', default='201,202,203,204')
+parser.add_argument('-i', '--i2c', type=str, help='Template I2C settings JSON file', default=os.path.join(repo_folder, 'config', 'default_2025Oct_config.json'))
+parser.add_argument('-c', '--config', type=str, help='Common settings JSON file of the emulated board', default=os.path.join(repo_folder, 'config', 'common_settings_emulator.json'))
+parser.add_argument('-o', '--output', type=str, help='Output JSON file', default=None)
+parser.add_argument('--loss', type=float, help='Probability to drop an outgoing datagram in the emulator', default=0.0)
+parser.add_argument('--latency', type=float, help='Emulator delay before every reply and burst in seconds', default=0.0)
+parser.add_argument('--seed', type=int, help='Random seed of the emulator', default=0)
+parser.add_argument('--timeout', type=float, help='Timeout of a single stage in seconds', default=7200)
+parser.add_argument('--quiet', action='store_true', help='Do not forward the stage outputs')
+args = parser.parse_args()
+
+# * --- Benchmark settings --------------------------------------------
+# - stage_scripts: calibration script of every stage
+# - stage_targets: target passed with -t
+# - stage_input: stage whose final i2c settings are used as -i, if it ran
+stage_scripts = {
+    '201': '201_IODelayX.py',
+    '202': '202_PedestalCalibX.py',
+    '203': '203_ToACalibX.py',
+    '204': '204_ToTCalibX.py',
+}
+stage_targets = {'202': 50, '203': 50, '204': 350}
+stage_input   = {'203': '202', '204': '203'}
+stage_outputs = {
+    '202': 'asic_{asic}_final_i2c_settings.json',
+    '203': 'asic{asic}_final_calib_i2c.json',
+    '204': 'asic{asic}_final_calib_i2c.json',
+}
+
+# - cpu_categories: (name, matcher) in priority order, the rest is 'other'
+cpu_categories = [
+    ('decode',      lambda f, n: f.endswith('plx_data.py') or (f.endswith('clx_calib.py') and n == 'measure_all')),
+    ('plotting',    lambda f, n: 'matplotlib' in f or 'PIL' in f or f.endswith('clx_visualize.py')),
+    ('register_io', lambda f, n: f.endswith(('plx_socket.py', 'plx_packet.py', 'clx_udp.py', 'clx_h2gcroc_settings.py')) or 'socket' in n or f.endswith('socket.py')),
+    ('statistics',  lambda f, n: 'numpy' in f or f.endswith('clx_data.py') or 'numpy' in n),
+]
+
+asic_counts = [int(x) for x in args.asics.split(',')]
+stages      = [x.strip() for x in args.stages.split(',')]
+for _asic_num in asic_counts:
+    if _asic_num < 1 or _asic_num > 8:
+        print(f"Error: ASIC count {_asic_num} is out of range (1-8).")
+        sys.exit(1)
+for _stage in stages:
+    if _stage not in stage_scripts:
+        print(f"Error: Unknown stage {_stage}, choose from {list(stage_scripts.keys())}.")
+        sys.exit(1)
+
+output_path = args.output
+if output_path is None:
+    os.makedirs(os.path.join(repo_folder, 'dump'), exist_ok=True)
+    output_path = os.path.join(repo_folder, 'dump', f"{script_id_str}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+with open(args.config, 'r') as f:
+    udp_config = json.load(f)['udp']
+with open(os.path.join(repo_folder, 'config', 'socket_pool_configX.json'), 'r') as f:
+    pool_config = json.load(f)['pool']
+
+print(f"- ASIC counts: {asic_counts}, stages: {stages}")
+print(f"- Packet loss: {args.loss}, latency: {args.latency} s")
+print(f"- Results will be written to {output_path}")
+
+# * --- Helpers -------------------------------------------------------
+def split_cpu_time(stats_path):
+    cpu_time = {_name: 0.0 for _name, _ in cpu_categories}
+    cpu_time['other'] = 0.0
+    try:
+        stats = pstats.Stats(stats_path)
+    except Exception as e:
+        print(f"- Warning: Cannot read profile {stats_path}: {e}")
+        return cpu_time
+    for (_file, _line, _name), (_cc, _nc, _tt, _ct, _callers) in stats.stats.items():
+        for _category, _match in cpu_categories:
+            if _match(_file, _name):
+                cpu_time[_category] += _tt
+                break
+        else:
+            cpu_time['other'] += _tt
+    cpu_time['total'] = sum(cpu_time.values())
+    return {_key: round(_val, 4) for _key, _val in cpu_time.items()}
+
+def wait_for_pool(timeout=10.0):
+    _start = time.time()
+    while time.time() - _start < timeout:
+        try:
+            with socket.create_connection((pool_config['control_host'], pool_config['control_port']), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+# - 202-204 check the UDP settings of the I2C files when one file per ASIC
+#   is given, so every ASIC gets a copy of the template addressed to the
+#   emulated board
+def write_template_i2c(template_path, asic_num, folder):
+    with open(template_path, 'r') as f:
+        _template = json.load(f, object_pairs_hook=OrderedDict)
+    _files = []
+    for _asic in range(asic_num):
+        _template['UDP Settings']['IP Address'] = udp_config['h2gcroc_ip']
+        _template['UDP Settings']['Port']       = str(udp_config['h2gcroc_port'])
+        _template['Target ASIC']['FPGA Address'] = int(udp_config['h2gcroc_ip'].split('.')[-1]) - 208
+        _template['Target ASIC']['ASIC Address'] = _asic
+        _files.append(os.path.join(folder, f"{script_id_str}_template_asic{_asic}.json"))
+        with open(_files[-1], 'w') as f:
+            json.dump(_template, f, indent=4)
+    return _files
+
+def newest_output_folder(script_name, existing):
+    _pattern = os.path.join(repo_folder, 'dump', script_name.split('.')[0] + '_*')
+    _folders = [f for f in glob.glob(_pattern) if os.path.isdir(f) and f not in existing]
+    return max(_folders, key=os.path.getmtime) if _folders else None
+
+# * --- Start the socket pool -----------------------------------------
+pool_process = subprocess.Popen([sys.executable, os.path.join(repo_folder, '101_SocketPool.py')], cwd=repo_folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+if not wait_for_pool():
+    print("Error: Socket pool did not start.")
+    pool_process.terminate()
+    sys.exit(1)
+
+results = {
+    'script_version': script_version_str,
+    'time'          : time.strftime('%Y-%m-%d %H:%M:%S'),
+    'python'        : platform.python_version(),
+    'platform'      : platform.platform(),
+    'git_revision'  : subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_folder, capture_output=True, text=True).stdout.strip(),
+    'settings'      : {'asics': asic_counts, 'stages': stages, 'loss': args.loss, 'latency': args.latency, 'seed': args.seed},
+    'runs'          : [],
+    'failed'        : []
+}
+
+# * --- Run the stages ------------------------------------------------
+try:
+    for _asic_num in asic_counts:
+        emulator = packetlibX.board_emulator(
+            udp_config['h2gcroc_ip'], int(udp_config['h2gcroc_port']),
+            udp_config['pc_ip'], int(udp_config['pc_cmd_port']), int(udp_config['pc_data_port']),
+            asic_num=_asic_num, seed=args.seed, loss_rate=args.loss, latency=args.latency)
+        emulator.open()
+        emulator_stop = threading.Event()
+        emulator_thread = threading.Thread(target=emulator.serve_forever, args=(emulator_stop,), daemon=True)
+        emulator_thread.start()
+
+        stage_results_folder = {}
+        template_files = write_template_i2c(args.i2c, _asic_num, os.path.dirname(output_path) or '.')
+        try:
+            for _stage in stages:
+                _script = stage_scripts[_stage]
+                _cmd_args = ['-c', args.config, '-a', str(_asic_num)]
+                if _stage != '201':
+                    _i2c_files = template_files
+                    _input_stage = stage_input.get(_stage)
+                    if _input_stage in stage_results_folder:
+                        _i2c_files = [os.path.join(stage_results_folder[_input_stage], stage_outputs[_input_stage].format(asic=_asic)) for _asic in range(_asic_num)]
+                    _cmd_args += ['-i', ','.join(_i2c_files), '-t', str(stage_targets[_stage])]
+
+                _stats_path = os.path.join(os.path.dirname(output_path) or '.', f"{script_id_str}_{_stage}_{_asic_num}.prof")
+                _existing = set(glob.glob(os.path.join(repo_folder, 'dump', '*')))
+                print(f"- Running {_script} with {_asic_num} ASIC(s)")
+
+                emulator.reset_stats()
+                _env = dict(os.environ, MPLBACKEND='Agg')
+                _start = time.perf_counter()
+                try:
+                    _process = subprocess.run(
+                        [sys.executable, os.path.join(script_folder, 'profile_script.py'), _stats_path, os.path.join(repo_folder, _script)] + _cmd_args,
+                        cwd=repo_folder, env=_env, timeout=args.timeout,
+                        stdout=subprocess.DEVNULL if args.quiet else None)
+                    _return_code = _process.returncode
+                except subprocess.TimeoutExpired:
+                    _return_code = None
+                _wall_time = time.perf_counter() - _start
+                _emulator_stats = emulator.get_stats()
+
+                _output_folder = newest_output_folder(_script, _existing)
+                if _output_folder is not None and _return_code == 0:
+                    stage_results_folder[_stage] = _output_folder
+
+                _run = {
+                    'asic_num'      : _asic_num,
+                    'stage'         : _stage,
+                    'script'        : _script,
+                    'return_code'   : _return_code,
+                    'wall_time'     : round(_wall_time, 3),
+                    'round_trips'   : _emulator_stats['round_trips'],
+                    'requests'      : _emulator_stats['requests'],
+                    'measurements'  : _emulator_stats['measurements'],
+                    'data_packets'  : _emulator_stats['data_packets'],
+                    'bytes_received': _emulator_stats['data_bytes'],
+                    'dropped'       : _emulator_stats['dropped'],
+                    'cpu_time'      : split_cpu_time(_stats_path),
+                    'output_folder' : _output_folder,
+                }
+                results['runs'].append(_run)
+                if _return_code != 0:
+                    results['failed'].append(f"{_stage}/{_asic_num}")
+                    print(f"-- Error: {_script} with {_asic_num} ASIC(s) failed (return code {_return_code})")
+                print(f"-- {_script}: {_run['wall_time']:.1f} s wall, {_run['cpu_time'].get('total', 0):.1f} s CPU, {_run['round_trips']} round trips, {_run['measurements']} measurements, {_run['bytes_received']} bytes")
+
+                # write after every stage so a long benchmark keeps its results
+                with open(output_path, 'w') as f:
+                    json.dump(results, f, indent=4)
+        finally:
+            emulator_stop.set()
+            emulator_thread.join(timeout=2.0)
+finally:
+    pool_process.terminate()
+    pool_process.wait()
+
+print(f"- Benchmark results saved to {output_path}")
+if len(results['failed']) > 0:
+    print(f"Error: Failed stages (stage/ASICs): {', '.join(results['failed'])}")
+    sys.exit(1)
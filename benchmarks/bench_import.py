@@ -0,0 +1,84 @@
+import sys, os, json, time, argparse, platform, subprocess
+import numpy as np
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Measure the startup time of import caliblibX in fresh interpreters')
+parser.add_argument('-n', '--runs', type=int, help='Number of fresh interpreter runs', default=10)
+parser.add_argument('-b', '--budget', type=float, help='Budget for the median import time in ms', default=500.0)
+parser.add_argument('-t', '--top', type=int, help='Number of slowest modules to list', default=10)
+parser.add_argument('-o', '--output', type=str, help='Output JSON file', default=None)
+args = parser.parse_args()
+
+# packages the core import must not pull in, they are loaded on first use
+heavy_modules = ['textual', 'pandas', 'matplotlib']
+
+import_code = (
+    f"import sys, time, json; sys.path.insert(0, {repo_folder!r}); "
+    "_start = time.perf_counter(); import caliblibX; _stop = time.perf_counter(); "
+    f"print(json.dumps([_stop - _start, [m for m in {heavy_modules!r} if m in sys.modules]]))"
+)
+
+# * --- Time the import -----------------------------------------------
+import_times = []
+loaded_heavy = set()
+for _run in range(args.runs):
+    _result = subprocess.run([sys.executable, '-c', import_code], capture_output=True, text=True, cwd=repo_folder)
+    if _result.returncode != 0:
+        print(f"- import caliblibX failed:\n{_result.stderr}")
+        sys.exit(2)
+    _import_time, _heavy = json.loads(_result.stdout.strip().split('\n')[-1])
+    import_times.append(_import_time * 1e3)
+    loaded_heavy.update(_heavy)
+import_times = np.array(import_times)
+
+# one more run with -X importtime for the per-module breakdown
+_result = subprocess.run([sys.executable, '-X', 'importtime', '-c', import_code], capture_output=True, text=True, cwd=repo_folder)
+module_times = []
+for _line in _result.stderr.split('\n'):
+    if not _line.startswith('import time:') or 'self [us]' in _line:
+        continue
+    _self_us, _cumulative_us, _module = _line[len('import time:'):].split('|')
+    module_times.append((_module.strip(), int(_self_us), int(_cumulative_us)))
+slowest_modules = sorted(module_times, key=lambda _m: _m[2], reverse=True)[:args.top]
+
+print(f"- import caliblibX over {args.runs} runs: median {np.median(import_times):.1f} ms, min {import_times.min():.1f} ms, max {import_times.max():.1f} ms")
+print(f"-- slowest modules (cumulative):")
+for _module, _self_us, _cumulative_us in slowest_modules:
+    print(f"   {_module:<40} {_cumulative_us / 1e3:8.1f} ms (self {_self_us / 1e3:.1f} ms)")
+
+passed = True
+if len(loaded_heavy) > 0:
+    print(f"- FAIL: import caliblibX loaded {', '.join(sorted(loaded_heavy))}")
+    passed = False
+if np.median(import_times) > args.budget:
+    print(f"- FAIL: median import time {np.median(import_times):.1f} ms is over the budget of {args.budget:.1f} ms")
+    passed = False
+if passed:
+    print(f"- PASS: within the budget of {args.budget:.1f} ms")
+
+if args.output is not None:
+    with open(args.output, 'w') as f:
+        json.dump({
+            'script_version'    : script_version_str,
+            'time'              : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python'            : platform.python_version(),
+            'runs'              : args.runs,
+            'budget_ms'         : args.budget,
+            'median_ms'         : round(float(np.median(import_times)), 3),
+            'min_ms'            : round(float(import_times.min()), 3),
+            'max_ms'            : round(float(import_times.max()), 3),
+            'heavy_modules'     : sorted(loaded_heavy),
+            'slowest_modules'   : [{'module': _m, 'self_ms': _s / 1e3, 'cumulative_ms': _c / 1e3} for _m, _s, _c in slowest_modules],
+            'passed'            : passed,
+        }, f, indent=4)
+    print(f"- Results saved to {args.output}")
+
+sys.exit(0 if passed else 1)
@@ -0,0 +1,135 @@
+import sys, os, json, time, struct, timeit, argparse, platform
+import numpy as np
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+import packetlibX
+import caliblibX
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Micro-benchmarks of the packet codec and the data decode hot paths')
+parser.add_argument('-a', '--asics', type=str, help='Comma-separated ASIC counts of the event fixtures', default='2,8')
+parser.add_argument('-m', '--machine-gun', type=int, help='Machine-gun setting of the burst fixtures', default=10)
+parser.add_argument('-r', '--recorded', type=str, help='Capture file (--capture of the calibration scripts) to add as a recorded fixture', default=None)
+parser.add_argument('--recorded-asics', type=int, help='ASIC count of the recorded datagrams', default=2)
+parser.add_argument('-n', '--number', type=int, help='Calls per timing repeat (0 for automatic)', default=0)
+parser.add_argument('--repeat', type=int, help='Timing repeats, the best one is reported', default=5)
+parser.add_argument('-o', '--output', type=str, help='Output JSON file', default=None)
+args = parser.parse_args()
+
+asic_counts = [int(x) for x in args.asics.split(',')]
+machine_gun = args.machine_gun
+
+# * --- Fixtures ------------------------------------------------------
+# - synthetic bursts come from the board emulator, so the payloads carry
+# -   the same headers, DaqH words and value ranges as the real board
+def synthetic_burst(asic_num, jumbo_en):
+    emulator = packetlibX.board_emulator('127.0.0.208', 11000, '127.0.0.1', 11000, 11001, asic_num=asic_num, seed=0)
+    for _asic in range(asic_num):
+        # inject on all channels so ToA/ToT words are filled too
+        emulator.register_block(_asic, packetlibX.subblock_address_dict["Reference_Voltage_0"])[7] = 0x40
+        emulator.register_block(_asic, packetlibX.subblock_address_dict["Reference_Voltage_1"])[7] = 0x40
+        emulator.register_block(_asic, packetlibX.subblock_address_dict["Reference_Voltage_0"])[6] = 0xFF
+        emulator.register_block(_asic, packetlibX.subblock_address_dict["Reference_Voltage_1"])[6] = 0xFF
+    return emulator.burst_datagrams(list(range(asic_num)), machine_gun, jumbo_en=jumbo_en)
+
+def recorded_burst(path):
+    # first complete burst of the capture
+    bursts = packetlibX.read_capture_bursts(path)
+    if len(bursts) == 0:
+        print(f"Error: No datagrams in {path}.")
+        sys.exit(1)
+    return bursts[0]
+
+def index_events(datagrams, asic_num):
+    # header pass of caliblibX.measure_all on a whole burst
+    payloads = [_p for _datagram in datagrams for _p in packetlibX.extract_raw_data(_datagram)]
+    n_halves = 2 * asic_num
+    n_events = len(payloads) // n_halves
+    rows, timestamps, half_good, _, _ = caliblibX.index_burst(payloads, n_halves, n_events)
+    # bunch crossings per machine-gun shot, as in measure_all
+    mg_index = ((timestamps - timestamps.min()) // 164).astype(int)
+    return payloads, rows, len(timestamps), mg_index, half_good
+
+def accumulate_events(values, mg_index, half_good, asic_num, estimator):
+    # statistics part of caliblibX.measure_all, every half packet is needed
+    cells = caliblibX.cell_accumulator(machine_gun, 2 * asic_num, len(mg_index), _histogram=estimator != 'mean')
+    cells.add(values, mg_index, half_good)
+    return cells.statistics(estimator)
+
+def filled_histogram(values, mg_index, asic_num):
+    cells = caliblibX.cell_accumulator(machine_gun, 2 * asic_num, len(mg_index), _histogram=True)
+    cells.add(values, mg_index, np.ones((len(mg_index), 2 * asic_num), dtype=bool))
+    return cells.histogram
+
+# - command packets at their real sizes
+i2c_read_reply    = struct.pack(packetlibX.rpy_i2c_read_format, 0xA0, 0x00, packetlibX.req_i2c_read_code, 32, 0x00, 0x00, *([0x5A] * 32))
+debug_data_reply  = struct.pack(packetlibX.rpy_get_debug_data_format, 0xA0, 0x00, packetlibX.req_get_debug_data_code, *([0xAC] * 33))
+normal_datagrams  = synthetic_burst(asic_counts[0], 0)
+jumbo_datagrams   = synthetic_burst(asic_counts[0], 1)
+single_payload    = packetlibX.extract_raw_data(normal_datagrams[0])[0]
+single_daqh       = single_payload[32:36]
+
+# * --- Benchmarks ----------------------------------------------------
+# - (name, function, items per call, item name)
+benchmarks = [
+    ('pack_data_req_i2c_write',        lambda: packetlibX.pack_data_req_i2c_write(0xA0, 0x00, 0x00, 32, 0x00, 0x00, 0x00, [0x5A] * 32), 1, 'packet'),
+    ('unpack_data_rpy_i2c_read',       lambda: packetlibX.unpack_data_rpy_i2c_read(i2c_read_reply), 1, 'packet'),
+    ('unpack_data_rpy_get_debug_data', lambda: packetlibX.unpack_data_rpy_get_debug_data(debug_data_reply), 1, 'packet'),
+    ('extract_raw_data (1358 B)',      lambda: packetlibX.extract_raw_data(normal_datagrams[0]), 1, 'datagram'),
+    ('extract_raw_data (jumbo)',       lambda: packetlibX.extract_raw_data(jumbo_datagrams[0]), 1, 'datagram'),
+    ('extract_values_192',             lambda: packetlibX.extract_values_192(single_payload), 1, 'half'),
+    ('DaqH helpers',                   lambda: (packetlibX.DaqH_get_H1(single_daqh), packetlibX.DaqH_get_H2(single_daqh), packetlibX.DaqH_get_H3(single_daqh), packetlibX.DaqH_start_end_good(single_daqh)), 1, 'half'),
+]
+
+event_fixtures = [(f'{_asic_num} ASICs', synthetic_burst(_asic_num, 0), _asic_num) for _asic_num in asic_counts]
+if args.recorded is not None:
+    event_fixtures.append((f'recorded {os.path.basename(args.recorded)}', recorded_burst(args.recorded), args.recorded_asics))
+
+for _label, _datagrams, _asic_num in event_fixtures:
+    _payloads, _rows, _n_events, _mg_index, _half_good = index_events(_datagrams, _asic_num)
+    _values    = caliblibX.decode_burst(_rows, _n_events, _asic_num * 76)
+    _histogram = filled_histogram(_values, _mg_index, _asic_num)
+    benchmarks.append((f'index_burst ({_label})', lambda _p=_payloads, _a=_asic_num, _n=_n_events: caliblibX.index_burst(_p, 2 * _a, _n), _n_events, 'event'))
+    benchmarks.append((f'decode_burst ({_label})', lambda _r=_rows, _n=_n_events, _a=_asic_num: caliblibX.decode_burst(_r, _n, _a * 76), _n_events, 'event'))
+    benchmarks.append((f'extract_values_block ({_label})', lambda _p=_payloads: packetlibX.extract_values_block(packetlibX.payload_block(_p)), _n_events, 'event'))
+    for _estimator in caliblibX.measure_estimators:
+        benchmarks.append((f'cell_accumulator {_estimator} ({_label})', lambda _v=_values, _m=_mg_index, _h=_half_good, _a=_asic_num, _e=_estimator: accumulate_events(_v, _m, _h, _a, _e), _n_events, 'event'))
+    benchmarks.append((f'value_histogram.statistics ({_label})', lambda _h=_histogram: _h.statistics(), _n_events, 'event'))
+
+# * --- Run -----------------------------------------------------------
+results = []
+print(f"- {'benchmark':<44} {'per call':>12} {'per item':>12}")
+for _name, _func, _items, _item_name in benchmarks:
+    _timer = timeit.Timer(_func)
+    _number = args.number if args.number > 0 else _timer.autorange()[0]
+    _best = min(_timer.repeat(repeat=args.repeat, number=_number)) / _number
+    _per_item = _best / max(_items, 1)
+    results.append({
+        'name'         : _name,
+        'per_call_us'  : round(_best * 1e6, 3),
+        'items'        : _items,
+        'item'         : _item_name,
+        'per_item_us'  : round(_per_item * 1e6, 3),
+        'number'       : _number,
+        'repeat'       : args.repeat,
+    })
+    print(f"-- {_name:<43} {_best * 1e6:>9.2f} us {_per_item * 1e6:>9.2f} us/{_item_name}")
+
+if args.output is not None:
+    with open(args.output, 'w') as f:
+        json.dump({
+            'script_version': script_version_str,
+            'time'          : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python'        : platform.python_version(),
+            'numpy'         : np.__version__,
+            'machine_gun'   : machine_gun,
+            'results'       : results,
+        }, f, indent=4)
+    print(f"- Results saved to {args.output}")
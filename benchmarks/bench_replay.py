@@ -0,0 +1,82 @@
+import sys, os, json, time, argparse, platform
+import numpy as np
+
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+import packetlibX
+import caliblibX
+
+# * --- Set up script information -------------------------------------
+script_id_str       = os.path.basename(__file__).split('.')[0]
+script_version_str  = '1.0'
+print("-- "+ script_id_str + " (v" + script_version_str + ") ----------------")
+print(f"---------------------------------------")
+
+# * --- Read command line arguments -----------------------------------
+parser = argparse.ArgumentParser(description='Replay a data capture through measure_all at full speed')
+parser.add_argument('capture', type=str, help='Capture file written with --capture')
+parser.add_argument('-c', '--config', type=str, help='Common settings JSON file of the captured board', default=None)
+parser.add_argument('-a', '--asic', type=int, help='ASIC number of the capture', default=2)
+parser.add_argument('-m', '--machine-gun', type=int, help='Machine-gun setting of the capture', default=10)
+parser.add_argument('-e', '--events', type=int, help='Expected events per measurement (default: machine gun + 1)', default=None)
+parser.add_argument('--gap', type=float, help='Receive-time gap in s that ends a burst', default=packetlibX.capture_default_gap)
+parser.add_argument('--passes', type=int, help='Replay passes over the capture', default=1)
+parser.add_argument('--save', type=str, help='npz file for the decoded means and errors of every measurement', default=None)
+parser.add_argument('-o', '--output', type=str, help='Output JSON file', default=None)
+args = parser.parse_args()
+
+expected_event_number = args.events if args.events is not None else args.machine_gun + 1
+
+# * --- Replay --------------------------------------------------------
+udp_target = caliblibX.udp_target('10.1.2.207', 11000, 11001, '10.1.2.208', 11000)
+if args.config:
+    udp_target.load_udp_json_file(args.config)
+if not udp_target.connect_to_replay(args.capture, burst_gap=args.gap):
+    sys.exit(1)
+
+measurement_times = []
+measurement_good  = 0
+decoded = {'adc_mean': [], 'adc_err': [], 'tot_mean': [], 'tot_err': [], 'toa_mean': [], 'toa_err': []}
+replay_start = time.perf_counter()
+for _pass in range(args.passes):
+    udp_target.replay_conn.rewind()
+    while not udp_target.replay_conn.exhausted():
+        _start = time.perf_counter()
+        _results = caliblibX.measure_all(udp_target, args.asic, args.machine_gun, expected_event_number, 0, _retry=1, _verbose=False)
+        measurement_times.append(time.perf_counter() - _start)
+        if np.any(_results[0] != 0):
+            measurement_good += 1
+        if args.save is not None and _pass == 0:
+            for _key, _val in zip(decoded.keys(), _results):
+                decoded[_key].append(_val)
+replay_time = time.perf_counter() - replay_start
+
+measurement_times = np.array(measurement_times)
+total_bytes = sum(_length for _, _length, _ in udp_target.replay_conn.records) * args.passes
+print(f"- Replayed {len(measurement_times)} measurements ({measurement_good} decoded) in {replay_time:.3f} s")
+if len(measurement_times) > 0:
+    print(f"-- per measurement: mean {measurement_times.mean() * 1e3:.3f} ms, median {np.median(measurement_times) * 1e3:.3f} ms")
+    print(f"-- per event: {measurement_times.sum() / (len(measurement_times) * expected_event_number) * 1e6:.2f} us")
+    print(f"-- throughput: {total_bytes / replay_time / 1e6:.2f} MB/s")
+
+if args.save is not None:
+    np.savez(args.save, **{_key: np.array(_val) for _key, _val in decoded.items()})
+    print(f"- Decoded measurements saved to {args.save}")
+
+if args.output is not None:
+    with open(args.output, 'w') as f:
+        json.dump({
+            'script_version'    : script_version_str,
+            'time'              : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python'            : platform.python_version(),
+            'capture'           : os.path.abspath(args.capture),
+            'datagrams'         : len(udp_target.replay_conn.records),
+            'bytes'             : total_bytes,
+            'passes'            : args.passes,
+            'measurements'      : int(len(measurement_times)),
+            'measurements_good' : measurement_good,
+            'replay_time'       : round(replay_time, 6),
+            'per_measurement_ms': round(float(measurement_times.mean()) * 1e3, 4) if len(measurement_times) > 0 else None,
+            'per_event_us'      : round(float(measurement_times.sum()) / (len(measurement_times) * expected_event_number) * 1e6, 3) if len(measurement_times) > 0 else None,
+        }, f, indent=4)
+    print(f"- Results saved to {args.output}")
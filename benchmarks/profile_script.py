@@ -0,0 +1,28 @@
+import sys, os, time, runpy, cProfile
+
+# * ---------------------------------------------------------------------------
+# * - brief: run a calibration script under cProfile with a CPU-time clock,
+# * -        used by the benchmarks to split the CPU time of a stage
+# * - usage: python3 profile_script.py <stats_file> <script.py> [script args]
+# * ---------------------------------------------------------------------------
+if len(sys.argv) < 3:
+    print("Usage: profile_script.py <stats_file> <script.py> [script args]")
+    sys.exit(2)
+
+stats_path  = sys.argv[1]
+script_path = os.path.abspath(sys.argv[2])
+sys.argv    = [script_path] + sys.argv[3:]
+sys.path.insert(0, os.path.dirname(script_path))
+
+exit_code = 0
+profiler  = cProfile.Profile(time.process_time)
+profiler.enable()
+try:
+    runpy.run_path(script_path, run_name='__main__')
+except SystemExit as e:
+    exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+finally:
+    profiler.disable()
+    profiler.dump_stats(stats_path)
+
+sys.exit(exit_code)
@@ -1,15 +1,41 @@
+import importlib
+
+# Core: udp, registers, measurement and storage, no Textual/pandas/matplotlib
+from .clx_events import *
 from .clx_calib import *
+from .clx_stream import *
+from .clx_decode_pool import *
 from .clx_iodelay import *
 from .clx_path import *
+from .clx_checkpoint import *
+from .clx_store import *
 from .clx_data import *
-from .clx_visualize import *
+from .clx_plot_worker import *
+from .clx_worker import *
 from .clx_h2gcroc_settings import *
 from .clx_udp import *
 
-# UI Components
-from .clx_ui import *
-from .clx_ui_201 import *
-from .clx_ui_202 import *
-from .clx_ui_203 import *
-from .clx_ui_messager import *
-from .clx_ui_file_picker import *
\ No newline at end of file
+# Plotting and UI components, imported on first use
+lazy_modules = {
+    'clx_visualize'     : ['halves_color_list', 'print_adc_to_terminal', 'plot_channel_adc', 'plot_inv_vref_scan', 'plot_channel_rms', 'Draw2DIM'],
+    'clx_ui'            : ['Page_204', 'FPGA_Settings', 'Registers_Page', 'FpgaPanel'],
+    'clx_ui_201'        : ['Page_201'],
+    'clx_ui_202'        : ['Page_202'],
+    'clx_ui_203'        : ['Page_203'],
+    'clx_ui_messager'   : ['ASIC_Number_Changed', 'ASIC_Number_Request', 'UdpJsonSelected'],
+    'clx_ui_file_picker': ['expand_path_manually', 'FilePicker', 'FolderPicker'],
+    'clx_ui_log'        : ['LogSink'],
+}
+lazy_names = {_name: _module for _module, _names in lazy_modules.items() for _name in _names}
+
+def __getattr__(name):
+    if name in lazy_modules:
+        return importlib.import_module(f'.{name}', __name__)
+    if name not in lazy_names:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{lazy_names[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(lazy_names.keys()))
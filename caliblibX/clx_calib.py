@@ -1,13 +1,13 @@
 import packetlibX
 import time, os, sys, socket, json, csv, uuid
 import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 from collections import deque
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from .clx_udp import udp_target
+from .clx_stream import daq_stream
 from .clx_data import single_channel_index_remove_cm_calib
+from .clx_events import ui_progress
 import copy
 
 color_list = ['#FF0000', '#0000FF', '#FFFF00', '#00FF00','#FF00FF', '#00FFFF', '#FFA500', '#800080', '#008080', '#FFC0CB']
@@ -79,11 +79,20 @@ def find_true_sublists(bool_list, step_size):
     return results
 
 def send_reset_adj_calib(udp_target, asic_num, sw_hard_reset_sel=0x00, sw_hard_reset=0x00, sw_soft_reset_sel=0x00, sw_soft_reset=0x00, sw_i2c_reset_sel=0x00, sw_i2c_reset=0x00, reset_pack_counter=0x00, adjustable_start=0x00, verbose=False):
+    # a reset puts the registers back to their defaults, forget the register image
+    if (sw_hard_reset or sw_soft_reset or sw_i2c_reset) and getattr(udp_target, 'register_image', None) is not None:
+        udp_target.register_image.clear()
+    if (sw_hard_reset or sw_soft_reset) and getattr(udp_target, 'daq_stream', None) is not None:
+        udp_target.daq_stream.forget_timestamp()
+    if (sw_hard_reset or sw_soft_reset) and getattr(udp_target, 'data_counter', None) is not None:
+        udp_target.data_counter.forget()
     return packetlibX.send_reset_adj(udp_target.cmd_outbound_conn, udp_target.board_ip, udp_target.board_port, asic_num=asic_num, fpga_addr=udp_target.board_id, sw_hard_reset_sel=sw_hard_reset_sel, sw_hard_reset=sw_hard_reset, sw_soft_reset_sel=sw_soft_reset_sel, sw_soft_reset=sw_soft_reset, sw_i2c_reset_sel=sw_i2c_reset_sel, sw_i2c_reset=sw_i2c_reset, reset_pack_counter=reset_pack_counter, adjustable_start=adjustable_start, verbose=verbose)
 
 def send_check_DAQ_gen_params_calib(udp_target, data_coll_en, trig_coll_en, daq_fcmd, gen_pre_fcmd, gen_fcmd, ext_trg_en, ext_trg_delay, ext_trg_deadtime, jumbo_en, gen_preimp_en, gen_pre_interval, gen_nr_of_cycle, gen_interval, daq_push_fcmd, machine_gun, 
 ext_trg_out_0_len, ext_trg_out_1_len, ext_trg_out_2_len, ext_trg_out_3_len,
 asic0_collection, asic1_collection, asic2_collection, asic3_collection, asic4_collection, asic5_collection, asic6_collection, asic7_collection, verbose=False, readback=True):
+    # the receive path sizes its reads from this (udp_target.data_datagram_size)
+    udp_target.jumbo_en = jumbo_en
     return packetlibX.send_check_DAQ_gen_params(
         udp_target.cmd_outbound_conn, udp_target.data_cmd_conn, udp_target.board_ip, udp_target.board_port, fpga_addr=udp_target.board_id,
         data_coll_en=data_coll_en, trig_coll_en=trig_coll_en, 
@@ -112,7 +121,17 @@ def send_register_calib(udp_target, asic_index, reg_key, reg_value, retry=3, ver
     # print all parameters
     if verbose:
         print_info(f"Sending register calib: ASIC {asic_index}, Register Key: {reg_key}, Register Addr: 0x{register_addr:02X}, Data: {register_data}, Retry: {retry}")
-    return packetlibX.send_check_i2c_wrapper(udp_target.cmd_outbound_conn, udp_target.data_cmd_conn, udp_target.board_ip, udp_target.board_port, asic_num=asic_index, fpga_addr=udp_target.board_id, sub_addr=register_addr, reg_addr=0x00, data=register_data, retry=retry, verbose=verbose)
+    # skip the write if the register already holds the value (worker register image)
+    register_image = getattr(udp_target, 'register_image', None)
+    if register_image is not None and register_image.get((asic_index, reg_key)) == register_data:
+        return True
+    result = packetlibX.send_check_i2c_wrapper(udp_target.cmd_outbound_conn, udp_target.data_cmd_conn, udp_target.board_ip, udp_target.board_port, asic_num=asic_index, fpga_addr=udp_target.board_id, sub_addr=register_addr, reg_addr=0x00, data=register_data, retry=retry, verbose=verbose)
+    if register_image is not None:
+        if result:
+            register_image[(asic_index, reg_key)] = register_data
+        else:
+            register_image.pop((asic_index, reg_key), None)
+    return result
 
 def HalfTurnOnAverage(_turn_on_points, _unused_chn_list, _dead_chn_list, _asic_num):
     _half_on_points = [-1 for _ in range(38*_asic_num)]
@@ -148,6 +167,8 @@ def setup_output(script_id_str, args_output=None, dump_root='dump'):
             'pdf_file': PdfPages object
         }
     """
+    from matplotlib.backends.backend_pdf import PdfPages
+
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     output_folder_name         = f'{script_id_str}_data_{timestamp}'
     output_config_json_name    = f'{script_id_str}_config_{timestamp}.json'
@@ -180,15 +201,389 @@ def setup_output(script_id_str, args_output=None, dump_root='dump'):
         'output_config_json': output_config_json_name,
     }
 
-def measure_all(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _retry=1, _verbose=False, _focus_half=[]):
+measure_estimators      = ('mean', 'median', 'trimmed')
+histogram_value_range   = 1024      # adc, tot and toa are 10-bit
+histogram_trim_fraction = 0.1       # cut from each end for the trimmed mean
+
+# * - half of a half packet (asic * 2 + half) from its address and packet id
+# *   bytes, ints or int arrays
+def payload_half_index(_address_id, _packet_id):
+    return (_address_id & 0x0F) * 2 + (_packet_id - 0x24)
+
+# * - (packets, words) channel of every value word of the half packets,
+# *   channel index (asic * 2 + half) * 38 + word
+def half_channel_ids(_halves, _words):
+    return _halves[:, np.newaxis] * 38 + np.arange(_words)[np.newaxis, :]
+
+# * ---------------------------------------------------------------------------
+# * - brief: per (machine-gun bin, channel) histograms of adc, tot and toa,
+# *          filled with np.bincount on channel * 1024 + value
+# * - the memory is fixed by the channel and bin numbers, not the events:
+# *   4 bytes * 3 * bins * channels * 1024
+# * ---------------------------------------------------------------------------
+class value_histogram:
+    def __init__(self, _n_bins, _n_channels):
+        self.n_bins     = _n_bins
+        self.n_channels = _n_channels
+        self.counts     = np.zeros((3, _n_bins, _n_channels * histogram_value_range), dtype=np.uint32)
+
+    # * - _chn_ids: (entries,) channel of each entry
+    # * - _values: (3, entries) adc, tot, toa
+    def add(self, _bin, _chn_ids, _values):
+        _chn_ids = np.asarray(_chn_ids, dtype=np.int64) * histogram_value_range
+        for _val in range(3):
+            _index = _chn_ids + np.clip(_values[_val], 0, histogram_value_range - 1).astype(np.int64)
+            np.add(self.counts[_val, _bin], np.bincount(_index, minlength=self.counts.shape[2]), out=self.counts[_val, _bin], casting='unsafe')
+
+    def merge(self, _other):
+        self.counts += _other.counts
+
+    # * - return: (bins, channels, 1024) histogram of one value
+    def histogram(self, _val):
+        return self.counts[_val].reshape(self.n_bins, self.n_channels, histogram_value_range)
+
+    # * ---------------------------------------------------------------------
+    # * - brief: statistics of every (bin, channel) histogram
+    # * - param:
+    # * -   _trim: fraction of the entries cut from each end for the
+    # * -          trimmed mean
+    # * - return:
+    # * -   dict of (3, bins, channels) arrays: counts, mean, rms, median,
+    # * -   median_err, trimmed, trimmed_err, zeros without entries
+    # * ---------------------------------------------------------------------
+    def statistics(self, _trim=histogram_trim_fraction):
+        _shape  = (3, self.n_bins, self.n_channels)
+        _result = {_key: np.zeros(_shape) for _key in ('counts', 'mean', 'rms', 'median', 'median_err', 'trimmed', 'trimmed_err')}
+        for _val in range(3):
+            # only the span of values that occur, usually a small part of the 10 bits
+            _used = np.flatnonzero(self.histogram(_val).any(axis=(0, 1)))
+            if len(_used) == 0:
+                continue
+            _x    = np.arange(_used[0], _used[-1] + 1, dtype=float)
+            _hist = self.histogram(_val)[:, :, _used[0]:_used[-1] + 1].astype(float)
+            _cdf  = np.cumsum(_hist, axis=2)
+            _n    = _cdf[:, :, -1]
+            _safe = np.maximum(_n, 1)
+            _mean = (_hist @ _x) / _safe
+            _rms  = np.sqrt(np.maximum((_hist @ (_x * _x)) / _safe - _mean * _mean, 0.0))
+
+            # middle entries (1-based) n // 2 + 1 and (n + 1) // 2, as np.median
+            _lower  = np.argmax(_cdf >= ((_n + 1) // 2)[:, :, np.newaxis], axis=2)
+            _upper  = np.argmax(_cdf >= (_n // 2 + 1)[:, :, np.newaxis], axis=2)
+            _median = _x[0] + 0.5 * (_lower + _upper)
+
+            # entries kept of each value between the _trim quantiles
+            _cut  = np.floor(_n * _trim)[:, :, np.newaxis]
+            _kept = np.clip(np.minimum(_cdf, _n[:, :, np.newaxis] - _cut) - np.maximum(_cdf - _hist, _cut), 0, None)
+            _n_kept    = np.maximum(_kept.sum(axis=2), 1)
+            _trimmed   = (_kept @ _x) / _n_kept
+            _trimmed_rms = np.sqrt(np.maximum((_kept @ (_x * _x)) / _n_kept - _trimmed * _trimmed, 0.0))
+
+            _filled = _n > 0
+            _result['counts'][_val]      = _n
+            _result['mean'][_val]        = np.where(_filled, _mean, 0.0)
+            _result['rms'][_val]         = np.where(_filled, _rms, 0.0)
+            _result['median'][_val]      = np.where(_filled, _median, 0.0)
+            # large-sample error of the median of a gaussian
+            _result['median_err'][_val]  = np.where(_filled, np.sqrt(np.pi / 2) * _rms / np.sqrt(_safe), 0.0)
+            _result['trimmed'][_val]     = np.where(_filled, _trimmed, 0.0)
+            _result['trimmed_err'][_val] = np.where(_filled, _trimmed_rms / np.sqrt(_n_kept), 0.0)
+        return _result
+
+# * ---------------------------------------------------------------------------
+# * - brief: merged statistics of the (machine-gun bin, half) cells of a
+# *          measurement, filled from the events of one or more bursts
+# * - a cell is complete once it holds _needed good half packets, later
+# *   bursts only add events to the cells that are still missing
+# * - take() books the half packets of a burst from its headers, the values
+# *   are added later with add_values(), possibly in another thread
+# * - _histogram: also fill a value_histogram, needed for the median and
+# *   trimmed mean estimators
+# * ---------------------------------------------------------------------------
+class cell_accumulator:
+    def __init__(self, _machine_gun, _n_halves, _needed, _focus_half=[], _histogram=False):
+        self.n_bins     = _machine_gun + 1
+        self.n_halves   = _n_halves
+        self.n_channels = _n_halves * 38
+        self.needed     = _needed
+        self.focus_half = list(_focus_half) if len(_focus_half) > 0 else list(range(_n_halves))
+        self.counts     = np.zeros((self.n_bins, _n_halves), dtype=int)
+        self.sums       = np.zeros((3, self.n_bins, self.n_channels))
+        self.sums_sq    = np.zeros((3, self.n_bins, self.n_channels))
+        self.histogram  = value_histogram(self.n_bins, self.n_channels) if _histogram else None
+        self.bursts     = 0
+
+    def missing(self):
+        """ (bins, halves) mask of the cells with too few good events. """
+        return self.counts < self.needed
+
+    def complete(self):
+        return not np.any(self.missing()[:, self.focus_half])
+
+    # * - _mg_index: (events,) machine-gun bin of each event, -1 if outside
+    # * - _half_good: (events, halves) half packet received and error free
+    # * - return: (events, halves) mask of the half packets to add
+    def take(self, _mg_index, _half_good):
+        self.bursts += 1
+        _open = self.missing()
+        _use  = np.zeros_like(_half_good)
+        for _mg in range(self.n_bins):
+            _mask = _mg_index == _mg
+            if not np.any(_mask):
+                continue
+            _use[_mask] = _half_good[_mask] & _open[_mg]
+            self.counts[_mg] += _use[_mask].sum(axis=0)
+        return _use
+
+    # * - _values: (3, events, channels) adc, tot, toa
+    def add_values(self, _values, _mg_index, _use):
+        for _mg in range(self.n_bins):
+            _mask = _mg_index == _mg
+            if not np.any(_mask):
+                continue
+            _use_chn = np.repeat(_use[_mask], 38, axis=1)
+            _vals    = np.where(_use_chn, _values[:, _mask, :], 0.0)
+            self.sums[:, _mg, :]    += _vals.sum(axis=1)
+            self.sums_sq[:, _mg, :] += (_vals * _vals).sum(axis=1)
+            if self.histogram is not None:
+                _events, _chn_ids = np.nonzero(_use_chn)
+                self.histogram.add(_mg, _chn_ids, _values[:, _mask, :][:, _events, _chn_ids])
+
+    def add(self, _values, _mg_index, _half_good):
+        self.add_values(_values, _mg_index, self.take(_mg_index, _half_good))
+
+    # * - add half packets without building events, all of them are added
+    # * - _values: (3, packets, words) of packetlibX.extract_values_block
+    # * - _mg_index, _halves: (packets,) machine-gun bin and half of each
+    def add_halves(self, _values, _mg_index, _halves):
+        if len(_halves) == 0:
+            return
+        np.add.at(self.counts, (_mg_index, _halves), 1)
+        _chn_ids = half_channel_ids(_halves, _values.shape[2])
+        _cells   = _chn_ids.ravel() if self.n_bins == 1 else ((_mg_index * self.n_channels)[:, np.newaxis] + _chn_ids).ravel()
+        _size    = self.n_bins * self.n_channels
+        for _val in range(3):
+            _vals = _values[_val].ravel().astype(float)
+            self.sums[_val]    += np.bincount(_cells, weights=_vals, minlength=_size).reshape(self.n_bins, self.n_channels)
+            self.sums_sq[_val] += np.bincount(_cells, weights=_vals * _vals, minlength=_size).reshape(self.n_bins, self.n_channels)
+        if self.histogram is not None:
+            for _mg in np.unique(_mg_index):
+                _mask = _mg_index == _mg
+                self.histogram.add(_mg, _chn_ids[_mask].ravel(), _values[:, _mask, :].reshape(3, -1))
+
+    def merge(self, _other):
+        self.counts  += _other.counts
+        self.sums    += _other.sums
+        self.sums_sq += _other.sums_sq
+        self.bursts  += _other.bursts
+        if self.histogram is not None and _other.histogram is not None:
+            self.histogram.merge(_other.histogram)
+
+    def moments(self):
+        """ Mean and rms (3, bins, channels) and entries (1, bins, channels), zeros in empty cells. """
+        _n    = np.repeat(self.counts, 38, axis=1)[np.newaxis, :, :]
+        _safe = np.maximum(_n, 1)
+        _mean = np.where(_n > 0, self.sums / _safe, 0.0)
+        _rms  = np.sqrt(np.maximum(self.sums_sq / _safe - _mean * _mean, 0.0))
+        return _mean, _rms, _n
+
+    # * - _estimator: 'mean', or 'median' / 'trimmed' from the histograms
+    def statistics(self, _estimator='mean'):
+        """ Estimate and its error per bin and channel, zeros in empty cells. """
+        if _estimator != 'mean' and self.histogram is not None:
+            _stats = self.histogram.statistics()
+            _mean, _err = _stats[_estimator], _stats[_estimator + '_err']
+        else:
+            _mean, _rms, _n = self.moments()
+            _err = np.where(_n > 0, _rms / np.sqrt(np.maximum(_n, 1)), 0.0)
+        return _mean[0], _err[0], _mean[1], _err[1], _mean[2], _err[2]
+
+    def quality(self):
+        return {
+            'counts'  : self.counts.copy(),
+            'complete': ~self.missing(),
+            'bursts'  : self.bursts,
+            'needed'  : self.needed,
+            'rms'     : self.moments()[1],
+        }
+
+# * ---------------------------------------------------------------------------
+# * - brief: trigger one burst and read its half packets
+# * - param:
+# * -   _stream: active daq_stream of the target, None to start and stop
+# * -            the DAQ around the burst
+# * -   _payload_number: half packets expected in the burst
+# * - return:
+# * -   list of 192-byte half packets
+# * ---------------------------------------------------------------------------
+def acquire_burst(_udp_target, _stream, _payload_number, _verbose=False):
     _cmd_socket  = _udp_target.cmd_outbound_conn
     _data_socket = _udp_target.data_data_conn
     _h2gcroc_ip  = _udp_target.board_ip
     _h2gcroc_port= _udp_target.board_port
     _fpga_addr   = _udp_target.board_id
+    _datagram_size = _udp_target.data_datagram_size()
+    # datagrams of a complete burst, with margin for stale ones
+    _datagram_limit = max(100, 2 * -(-_payload_number // packetlibX.data_payloads_per_datagram(_udp_target.jumbo_en)))
+
+    extracted_payloads_pool = []
+
+    if _stream is not None:
+        _stream.trigger()
+    else:
+        if not packetlibX.send_daq_gen_start_stop(
+            _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
+            fpga_addr=_fpga_addr, daq_push=0x00,
+            gen_start_stop=0, daq_start_stop=0xFF, verbose=False
+        ):
+            print_warn("Failed to start the generator")
+        if not packetlibX.send_daq_gen_start_stop(
+            _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
+            fpga_addr=_fpga_addr, daq_push=0x00,
+            gen_start_stop=1, daq_start_stop=0xFF, verbose=False
+        ):
+            print_warn("Failed to start the generator")
+
+    try:
+        if _stream is not None:
+            # streaming mode: read just the half packets of this burst
+            extracted_payloads_pool.extend(_stream.read_burst(_payload_number))
+        else:
+            try:
+                for _ in range(_datagram_limit):
+                    data_packet, _ = _data_socket.recvfrom(_datagram_size)
+                    if len(data_packet) > 0:
+                        _udp_target.count_data_datagram(data_packet)
+                    extracted_payloads_pool.extend(
+                        packetlibX.extract_raw_data(data_packet)
+                    )
+
+            except socket.timeout:
+                if _verbose:
+                    print_warn("Socket timeout, no data received")
+
+                if not packetlibX.send_daq_gen_start_stop(
+                    _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
+                    fpga_addr=_fpga_addr, daq_push=0x00,
+                    gen_start_stop=0, daq_start_stop=0x00, verbose=False
+                ):
+                    print_warn("Failed to stop the generator")
+
+                for _ in range(10):
+                    try:
+                        data_packet, _ = _data_socket.recvfrom(_datagram_size)
+                        if len(data_packet) > 0:
+                            _udp_target.count_data_datagram(data_packet)
+                        extracted_payloads_pool.extend(
+                            packetlibX.extract_raw_data(data_packet)
+                        )
+                        if len(data_packet) > 0:
+                            break
+                    except socket.timeout:
+                        if _verbose:
+                            print_warn("Socket timeout, no data received")
+    finally:
+        if _stream is not None:
+            _stream.rearm()
+        elif not packetlibX.send_daq_gen_start_stop(
+            _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
+            fpga_addr=_fpga_addr, daq_push=0x00,
+            gen_start_stop=0, daq_start_stop=0x00, verbose=False
+        ):
+            print_warn("Failed to stop the generator")
+
+    return extracted_payloads_pool
+
+# * ---------------------------------------------------------------------------
+# * - brief: assign the half packets of a burst to events by timestamp, only
+# *          the 32-byte headers and DaqH words are read
+# * - return:
+# * -   rows: (payload, event, half) of every assigned half packet
+# * -   timestamps: (events,) timestamp of each event
+# * -   half_good: (events, halves) half packet received and error free
+# * -   counter_half_bad: half packets with hamming or DaqH errors
+# * -   counter_half_unmatched: half packets outside of the burst
+# * ---------------------------------------------------------------------------
+def index_burst(_payloads, _n_halves, _total_event):
+    event_slots            = {}    # timestamp -> event row
+    rows                   = []
+    half_good_array        = np.zeros((_total_event, _n_halves), dtype=bool)
+    counter_half_bad       = 0
+    counter_half_unmatched = 0
+
+    for payload_192 in _payloads:
+        if len(payload_192) != 192:
+            counter_half_unmatched += 1
+            continue
+        _timestamp = int.from_bytes(payload_192[16:24], 'big')
+        if _timestamp not in event_slots:
+            if len(event_slots) >= _total_event:
+                counter_half_unmatched += 1
+                continue
+            event_slots[_timestamp] = len(event_slots)
+        _event = event_slots[_timestamp]
+
+        _half = payload_half_index(payload_192[2], payload_192[3])
+        if not 0 <= _half < _n_halves:
+            counter_half_unmatched += 1
+            continue
+
+        _DaqH = payload_192[32:36]
+        _half_good = packetlibX.DaqH_get_H1(_DaqH) == 0 and packetlibX.DaqH_get_H2(_DaqH) == 0 \
+            and packetlibX.DaqH_get_H3(_DaqH) == 0 and packetlibX.DaqH_start_end_good(_DaqH)
+        half_good_array[_event, _half] = _half_good
+        if not _half_good:
+            counter_half_bad += 1
+        rows.append((payload_192, _event, _half))
+
+    timestamps = np.array(list(event_slots.keys()), dtype=np.int64)
+    return rows, timestamps, half_good_array[:len(timestamps)], counter_half_bad, counter_half_unmatched
+
+# * ---------------------------------------------------------------------------
+# * - brief: decode the channel values of the indexed half packets
+# * - return:
+# * -   (3, events, channels) adc, tot, toa values
+# * ---------------------------------------------------------------------------
+def decode_burst(_rows, _n_events, _n_channels):
+    all_chn_value_array = np.zeros((3, _n_events, _n_channels))
+    if len(_rows) == 0:
+        return all_chn_value_array
+    _block   = packetlibX.extract_values_block(packetlibX.payload_block([_row[0] for _row in _rows]))
+    _events  = np.array([_row[1] for _row in _rows], dtype=int)
+    _halves  = np.array([_row[2] for _row in _rows], dtype=int)
+    _chn_ids = half_channel_ids(_halves, _block["_values"].shape[2])
+    all_chn_value_array[:, _events[:, np.newaxis], _chn_ids] = _block["_values"]
+    return all_chn_value_array
+
+# * ---------------------------------------------------------------------------
+# * - brief: trigger bursts and return the per machine-gun bin statistics
+# * - the events are built by timestamp, a lost or corrupted half packet only
+# *   costs its (machine-gun bin, half) cell. Retries run while cells are
+# *   missing and only fill those (see cell_accumulator)
+# * - with an _executor (concurrent.futures) the bursts are still read here,
+# *   the decoding and statistics run in the executor and a Future of the
+# *   result is returned, so the next registers can be sent meanwhile
+# * - return:
+# * -   adc, tot, toa mean and error, each (machine_gun + 1, channels), zeros
+# * -   in cells without good events; with _return_quality also the dict of
+# * -   per-cell counts and complete flags (cell_accumulator.quality) and
+# * -   the udp counter accounting of the bursts ('udp_counter', see
+# * -   packetlibX.counter_tracker.delta) and the rms of every cell ('rms',
+# * -   (3, machine_gun + 1, channels))
+# * - _estimator: 'mean', or 'median' / 'trimmed' from per-cell value
+# *   histograms (see value_histogram), less sensitive to outliers
+# * ---------------------------------------------------------------------------
+def measure_all(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _retry=1, _verbose=False, _focus_half=[], _return_quality=False, _executor=None, _estimator='mean'):
+    # DAQ kept armed by a daq_stream: trigger a burst instead of start/stop
+    _stream      = getattr(_udp_target, 'daq_stream', None)
+    if _stream is not None and not _stream.active:
+        _stream = None
+
+    if _estimator not in measure_estimators:
+        print_warn(f"Unknown estimator {_estimator}, using the mean")
+        _estimator = 'mean'
 
     _retry_left = _retry
-    _all_events_received = False
 
     n_channels = _total_asic_num * 76
     n_halves   = _total_asic_num * 2
@@ -196,287 +591,159 @@ def measure_all(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragm
 
     BC_PER_SHOT = 164  # bunch crossings per machine-gun shot
 
-    adc_mean_list = np.zeros((_machine_gun + 1, n_channels))
-    adc_err_list  = np.zeros((_machine_gun + 1, n_channels))
-    tot_mean_list = np.zeros((_machine_gun + 1, n_channels))
-    tot_err_list  = np.zeros((_machine_gun + 1, n_channels))
-    toa_mean_list = np.zeros((_machine_gun + 1, n_channels))
-    toa_err_list  = np.zeros((_machine_gun + 1, n_channels))
-    
-    while _retry_left > 0 and not _all_events_received:
+    # good half packets needed per cell: half of the events of a bin
+    _needed = max((_total_event // (_machine_gun + 1)) // 2, 1)
+    _cells  = cell_accumulator(_machine_gun, n_halves, _needed, _focus_half, _histogram=_estimator != 'mean')
+    _bursts = []    # (rows, events, mg_index, use) of the bursts to decode
+    _counter_before = _udp_target.data_counter.snapshot()
+
+    while _retry_left > 0 and not _cells.complete():
         if _retry_left < _retry:
             if _verbose:
-                print_info(f"Retrying measurement, attempts left: {_retry_left}")
+                print_info(f"Retrying measurement for {int(_cells.missing().sum())} missing cells, attempts left: {_retry_left}")
             time.sleep(0.1)
         _retry_left -= 1
 
         try:
-            extracted_payloads_pool = deque()
-            event_fragment_pool     = []
-
-            timestamps_events = []
-
-            current_half_packet_num = 0
-            current_event_num       = 0
-            counter_daqh_incorrect  = 0
-
-            all_chn_value_0_array = np.zeros((_total_event, n_channels))
-            all_chn_value_1_array = np.zeros((_total_event, n_channels))
-            all_chn_value_2_array = np.zeros((_total_event, n_channels))
-            hamming_code_array    = np.zeros((_total_event, 3 * n_halves), dtype=np.uint8)
-            daqh_good_array       = np.ones((_total_event,   n_halves), dtype=bool)
-
-            if not packetlibX.send_daq_gen_start_stop(
-                _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
-                fpga_addr=_fpga_addr, daq_push=0x00,
-                gen_start_stop=0, daq_start_stop=0xFF, verbose=False
-            ):
-                print_warn("Failed to start the generator")
-            if not packetlibX.send_daq_gen_start_stop(
-                _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
-                fpga_addr=_fpga_addr, daq_push=0x00,
-                gen_start_stop=1, daq_start_stop=0xFF, verbose=False
-            ):
-                print_warn("Failed to start the generator")
-
-            if True:
-                try:
-                    bytes_counter = 0
-                    try:
-                        for _ in range(100):
-                            data_packet, _ = _data_socket.recvfrom(1358)
-                            extracted_payloads_pool.extend(
-                                packetlibX.extract_raw_data(data_packet)
-                            )
-                            bytes_counter += len(data_packet)
-
-                    except socket.timeout:
-                        if _verbose:
-                            print_warn("Socket timeout, no data received")
-
-                        if not packetlibX.send_daq_gen_start_stop(
-                            _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
-                            fpga_addr=_fpga_addr, daq_push=0x00,
-                            gen_start_stop=0, daq_start_stop=0x00, verbose=False
-                        ):
-                            print_warn("Failed to stop the generator")
-
-                        for _ in range(10):
-                            try:
-                                data_packet, _ = _data_socket.recvfrom(1358)
-                                extracted_payloads_pool.extend(
-                                    packetlibX.extract_raw_data(data_packet)
-                                )
-                                bytes_counter += len(data_packet)
-                                if len(data_packet) > 0:
-                                    break
-                            except socket.timeout:
-                                if _verbose:
-                                    print_warn("Socket timeout, no data received")
-
-                    num_packets = bytes_counter // 1358
-                    half_packet_number = (bytes_counter - num_packets * 14) // 192
-                    event_number = half_packet_number // (2 * _total_asic_num)
-
-                    half_packet_number = int(half_packet_number)
-                    event_number = int(event_number)
-
-                    chunk_counter = 0
-                    event_chunk_buffer = []
-
-                    while len(extracted_payloads_pool) > 0:
-                        payload_192 = extracted_payloads_pool.popleft()
-                        chunk_counter += 1
-
-                        extracted_data = packetlibX.extract_values_192(
-                            payload_192, verbose=False
-                        )
-                        if extracted_data is None:
-                            print_warn(f"Failed to extract chunk #{chunk_counter}")
-                            continue
-
-                        event_chunk_buffer.append(extracted_data)
-
-                        if len(event_chunk_buffer) == chunks_per_event:
-                            timestamps = [c["_timestamp"] for c in event_chunk_buffer]
-                            
-                            if len(set(timestamps)) == 1:
-                                for _half, chunk in enumerate(event_chunk_buffer):
-                                    _DaqH = chunk["_DaqH"]
-                                    extracted_values = chunk["_extracted_values"]
-                                    byte3 = chunk["_address_id"]
-                                    byte4 = chunk["_packet_id"]
-                                    asic_id = byte3 & 0x0F
-                                    packet_id = byte4
-
-                                    uni_chn_base = asic_id * 76 + (packet_id - 0x24) * 38     
-
-                                    for j, vals in enumerate(extracted_values):
-                                        channel_id = uni_chn_base + j
-                                        all_chn_value_0_array[current_event_num, channel_id] = vals[1]
-                                        all_chn_value_1_array[current_event_num, channel_id] = vals[2]
-                                        all_chn_value_2_array[current_event_num, channel_id] = vals[3]
-
-                                    hamming_code_array[current_event_num, _half*3 + 0] = packetlibX.DaqH_get_H1(_DaqH)
-                                    hamming_code_array[current_event_num, _half*3 + 1] = packetlibX.DaqH_get_H2(_DaqH)
-                                    hamming_code_array[current_event_num, _half*3 + 2] = packetlibX.DaqH_get_H3(_DaqH)
-                                    daqh_good_array[current_event_num, _half] = packetlibX.DaqH_start_end_good(_DaqH)
-
-                                if np.all(hamming_code_array[current_event_num] == 0) and np.all(daqh_good_array[current_event_num]):
-                                    timestamps_events.append(timestamps[0])
-                                    current_event_num += 1
-                                else:
-                                    print_warn("Invalid event detected (hamming or DAQH error)")
-                            else:
-                                print_warn(f"Chunk timestamps mismatch: {timestamps}")
-
-                            event_chunk_buffer.clear()
-
-                        if current_event_num >= _total_event:
-                            _all_events_received = True
-                            break
-
-                except Exception as e:
-                    if _verbose:
-                        print_warn("Exception in receiving data")
-                        print_warn(e)
-                        print_warn('Halves received: ' + str(current_half_packet_num))
-                        print_warn('Halves expected: ' + str(_total_event * 2 * _total_asic_num))
-                        print_warn('left fragments:' + str(len(event_fragment_pool)))
-                        print_warn("current event num:" + str(current_event_num))
-                    _all_events_received = False
-                    break
-                
-            for _event in range(current_event_num):
-                if not np.all(daqh_good_array[_event] == True):
-                    counter_daqh_incorrect += 1
-
-            valid_events = current_event_num - counter_daqh_incorrect
-            min_valid_needed = max(_total_event // 2, 1)
-            if valid_events < min_valid_needed:
-                if _verbose:
-                    print_warn(
-                        f"Not enough valid events received "
-                        f"(valid={valid_events}, total={current_event_num}, expected={_total_event})"
-                    )
-                _all_events_received = False
-                continue
-            
-            if current_event_num == 0 or len(timestamps_events) == 0:
-                if _verbose:
-                    print_warn("No valid events with timestamps")
-                _all_events_received = False
-                continue
-
-            timestamps_events_arr = np.array(timestamps_events[:current_event_num], dtype=np.int64)
-            timestamps_pure = timestamps_events_arr - timestamps_events_arr[0]
+            _payloads = acquire_burst(_udp_target, _stream, _total_event * chunks_per_event, _verbose)
+            rows, timestamps_events_arr, half_good_array, counter_half_bad, counter_half_unmatched = index_burst(_payloads, n_halves, _total_event)
+        except Exception as e:
+            if _verbose:
+                print_warn("Exception in receiving data")
+                print_warn(e)
+            break
 
-            if timestamps_pure[-1] != BC_PER_SHOT * _machine_gun:
-                if _verbose:
-                    print_warn(
-                        f"Machine gun coverage not enough: "
-                        f"last_delta={timestamps_pure[-1]} expected={BC_PER_SHOT * _machine_gun}"
-                    )
-                _all_events_received = False
-                continue
+        if counter_half_bad > 0:
+            print_warn(f"Invalid half packets detected (hamming or DAQH error): {counter_half_bad}")
+        if counter_half_unmatched > 0 and _verbose:
+            print_warn(f"Half packets outside of the burst: {counter_half_unmatched}")
 
-            # ---------- vectorized statistics over events x channels ----------
+        current_event_num = len(timestamps_events_arr)
+        if current_event_num == 0:
+            if _verbose:
+                print_warn("No events with timestamps")
+            continue
 
-            # select only the rows actually filled
-            all_chn_value_0_valid = all_chn_value_0_array[:current_event_num, :]
-            all_chn_value_1_valid = all_chn_value_1_array[:current_event_num, :]
-            all_chn_value_2_valid = all_chn_value_2_array[:current_event_num, :]
+        timestamps_pure = timestamps_events_arr - timestamps_events_arr.min()
 
-            # event-good mask (global or focus-only)
-            if len(_focus_half) == 0:
-                event_good = (hamming_code_array[:current_event_num] == 0).all(axis=1) & \
-                             daqh_good_array[:current_event_num].all(axis=1)
-            else:
-                focus_halves = np.array(_focus_half, dtype=int)
-                hc_reshaped = hamming_code_array[:current_event_num].reshape(current_event_num, n_halves, 3)
-                hc_focus = hc_reshaped[:, focus_halves, :]          # shape: (events, n_focus, 3)
-                daqh_focus = daqh_good_array[:current_event_num, :][:, focus_halves]  # (events, n_focus)
-
-                cond_hc = (hc_focus == 0).all(axis=(1, 2))
-                cond_daqh = daqh_focus.all(axis=1)
-                event_good = cond_hc & cond_daqh
-
-            mg_index = timestamps_pure // BC_PER_SHOT
-            mg_index = mg_index.astype(int)
-            mg_index[mg_index < 0] = -1  # safety
-
-            valid_mg = (mg_index >= 0) & (mg_index <= _machine_gun)
-
-            # combined mask per-event that will be used for grouping
-            base_mask = event_good & valid_mg
-
-            # precompute per-bin statistics
-            event_short = 0  # kept for interface compatibility
-
-            for mg in range(_machine_gun + 1):
-                mask_mg = (mg_index == mg) & base_mask
-                n_e = int(mask_mg.sum())
-                if n_e > 0:
-                    vals_adc = all_chn_value_0_valid[mask_mg, :]  # shape: (n_e, n_channels)
-                    vals_tot = all_chn_value_1_valid[mask_mg, :]
-                    vals_toa = all_chn_value_2_valid[mask_mg, :]
-
-                    mean_adc = vals_adc.mean(axis=0)
-                    mean_tot = vals_tot.mean(axis=0)
-                    mean_toa = vals_toa.mean(axis=0)
-
-                    std_adc = vals_adc.std(axis=0, ddof=0)
-                    std_tot = vals_tot.std(axis=0, ddof=0)
-                    std_toa = vals_toa.std(axis=0, ddof=0)
-
-                    err_adc = std_adc / np.sqrt(n_e)
-                    err_tot = std_tot / np.sqrt(n_e)
-                    err_toa = std_toa / np.sqrt(n_e)
-                else:
-                    mean_adc = np.zeros(n_channels, dtype=float)
-                    mean_tot = np.zeros(n_channels, dtype=float)
-                    mean_toa = np.zeros(n_channels, dtype=float)
-                    err_adc  = np.zeros(n_channels, dtype=float)
-                    err_tot  = np.zeros(n_channels, dtype=float)
-                    err_toa  = np.zeros(n_channels, dtype=float)
-
-                mg_offset = mg + event_short
-                if mg_offset > _machine_gun:
-                    mg_offset -= (_machine_gun + 1)
-
-                adc_mean_list[mg_offset, :] = mean_adc
-                adc_err_list[mg_offset, :]  = err_adc
-                tot_mean_list[mg_offset, :] = mean_tot
-                tot_err_list[mg_offset, :]  = err_tot
-                toa_mean_list[mg_offset, :] = mean_toa
-                toa_err_list[mg_offset, :]  = err_toa
+        # the first and last shot anchor the machine-gun bins
+        if timestamps_pure.max() != BC_PER_SHOT * _machine_gun:
+            if _verbose:
+                print_warn(
+                    f"Machine gun coverage not enough: "
+                    f"last_delta={timestamps_pure.max()} expected={BC_PER_SHOT * _machine_gun}"
+                )
+            continue
 
-        finally:
-            if not packetlibX.send_daq_gen_start_stop(
-                _cmd_socket, _h2gcroc_ip, _h2gcroc_port,
-                fpga_addr=_fpga_addr, daq_push=0x00,
-                gen_start_stop=0, daq_start_stop=0x00, verbose=False
-            ):
-                print_warn("Failed to stop the generator")
+        _mg_index = (timestamps_pure // BC_PER_SHOT).astype(int)
+        _use      = _cells.take(_mg_index, half_good_array)
+        # only the half packets that go into a cell are decoded
+        _bursts.append(([_row for _row in rows if _use[_row[1], _row[2]]], current_event_num, _mg_index, _use))
 
         if _verbose:
             print_info(
-                f"daqh bad events: {counter_daqh_incorrect} "
-                f"(expected: {_total_event}, received: {current_event_num})"
+                f"bad half packets: {counter_half_bad} "
+                f"(expected events: {_total_event}, received: {current_event_num}), "
+                f"missing cells: {int(_cells.missing().sum())}"
             )
 
-    if not _all_events_received:
-        print_warn("Not enough valid events received")
-        print_warn("Returning list of zeros")
-        # arrays are already initialized as zeros
-
-    return adc_mean_list, adc_err_list, tot_mean_list, tot_err_list, toa_mean_list, toa_err_list
-
-def measure_adc(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _logger, _retry=1, _verbose=False):
-    adc_mean_list, adc_err_list, _, _, _, _ = measure_all(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _retry=_retry, _verbose=_verbose)
+    _counter_delta = _udp_target.data_counter.delta(_counter_before)
+    if _counter_delta['missing'] > 0 or (_verbose and (_counter_delta['reordered'] > 0 or _counter_delta['duplicates'] > 0)):
+        print_warn(f"UDP packet counter: {_counter_delta['missing']} data datagrams missing, {_counter_delta['reordered']} reordered, {_counter_delta['duplicates']} duplicated")
+
+    if not _cells.complete():
+        _missing = _cells.missing()[:, _cells.focus_half]
+        print_warn(f"Not enough valid events in {int(_missing.sum())} of {_missing.size} (machine gun, half) cells")
+        print_warn("Returning zeros in the missing cells")
+
+    def _finish():
+        for _rows, _n_events, _mg_index, _use in _bursts:
+            _cells.add_values(decode_burst(_rows, _n_events, n_channels), _mg_index, _use)
+        adc_mean_list, adc_err_list, tot_mean_list, tot_err_list, toa_mean_list, toa_err_list = _cells.statistics(_estimator)
+        if _return_quality:
+            _quality = _cells.quality()
+            _quality['udp_counter'] = _counter_delta
+            return adc_mean_list, adc_err_list, tot_mean_list, tot_err_list, toa_mean_list, toa_err_list, _quality
+        return adc_mean_list, adc_err_list, tot_mean_list, tot_err_list, toa_mean_list, toa_err_list
+
+    if _executor is not None:
+        return _executor.submit(_finish)
+    return _finish()
+
+def measure_adc(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _logger, _retry=1, _verbose=False, _estimator='mean'):
+    adc_mean_list, adc_err_list, _, _, _, _ = measure_all(_udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _retry=_retry, _verbose=_verbose, _estimator=_estimator)
     
     return adc_mean_list[0], adc_err_list[0]
 
+# * ---------------------------------------------------------------------------
+# * - brief: queue of (register change, burst) steps measured back to back
+# *          with the DAQ armed
+# * - usage:
+# * -   _batch = measure_batch(udp_target, asic_num, machine_gun, events, life)
+# * -   _batch.add(lambda: ...register writes of step 0...)
+# * -   _batch.add(lambda: ...register writes of step 1...)
+# * -   adc, adc_err, tot, tot_err, toa, toa_err = _batch.run()
+# * - the results are stacked to (steps, machine_gun + 1, channels), the per
+# *   step cell counts are kept in quality (see cell_accumulator.quality)
+# * - without an active daq_stream on the target the DAQ is armed for the
+# *   batch only, _stream=False measures every step with its own start/stop
+# * - _pipeline: decode step k in a worker thread while the registers of
+# *   step k + 1 are sent, the results are gathered in step order
+# * - _estimator: see measure_all
+# * ---------------------------------------------------------------------------
+class measure_batch:
+    def __init__(self, _udp_target, _total_asic_num, _machine_gun, _total_event, _fragment_life, _retry=1, _verbose=False, _focus_half=[], _stream=True, _pipeline=True, _estimator='mean'):
+        self.udp_target     = _udp_target
+        self.total_asic_num = _total_asic_num
+        self.machine_gun    = _machine_gun
+        self.total_event    = _total_event
+        self.fragment_life  = _fragment_life
+        self.retry          = _retry
+        self.verbose        = _verbose
+        self.focus_half     = _focus_half
+        self.stream         = _stream
+        self.pipeline       = _pipeline
+        self.estimator      = _estimator
+        self.steps          = []
+        self.quality        = []
+
+    def add(self, _setup=None):
+        """ Queue a step, _setup() does its register changes before the burst. """
+        self.steps.append(_setup)
+        return len(self.steps) - 1
+
+    def run(self):
+        _n_channels = self.total_asic_num * 76
+        _results    = np.zeros((6, len(self.steps), self.machine_gun + 1, _n_channels))
+        self.quality = []
+
+        _own_stream = None
+        if self.stream and (self.udp_target.daq_stream is None or not self.udp_target.daq_stream.active):
+            _own_stream = daq_stream(self.udp_target)
+            _previous_stream = self.udp_target.daq_stream
+            self.udp_target.daq_stream = _own_stream
+            _own_stream.start()
+        _executor = ThreadPoolExecutor(max_workers=1) if self.pipeline else None
+        _measured = []
+        try:
+            for _setup in self.steps:
+                if _setup is not None:
+                    _setup()
+                _measured.append(measure_all(self.udp_target, self.total_asic_num, self.machine_gun, self.total_event, self.fragment_life, self.retry, _verbose=self.verbose, _focus_half=self.focus_half, _return_quality=True, _executor=_executor, _estimator=self.estimator))
+        finally:
+            if _own_stream is not None:
+                _own_stream.stop(verbose=self.verbose)
+                self.udp_target.daq_stream = _previous_stream
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+        for _step, _step_measured in enumerate(_measured):
+            if _executor is not None:
+                _step_measured = _step_measured.result()
+            _results[:, _step] = _step_measured[:6]
+            self.quality.append(_step_measured[6])
+        self.steps = []
+        return tuple(_results)
+
 def Inj_2V5(_cmd_out_conn, _cmd_data_conn, _data_data_conn, _h2gcroc_ip, _h2gcroc_port, _fpga_address, _phase, _dac, _scan_chn_start, _scan_chn_number, _asic_num, _scan_chn_pack, _machine_gun, _expected_event_number, _fragment_life, _config, unused_chn_list, _dead_chn_list, _i2c_dict, _logger, _retry=1, _verbose=False, _cancell_flag=None, _stop_event=None):
     if _asic_num != len(_config):
         _logger.error("Number of ASICs does not match the number of configurations")
@@ -804,7 +1071,7 @@ def Inj_Normal(_cmd_out_conn, _cmd_data_conn, _data_data_conn, _h2gcroc_ip, _h2g
 
     return val0_list_assembled, val0_err_list_assembled, val1_list_assembled, val1_err_list_assembled, val2_list_assembled, val2_err_list_assembled
 
-def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_chn, _machine_gun, _expected_event_number, _fragment_life, _dead_chn_list, _asic_settings, _toa_halves, _tot_halves, _toa_channels, _tot_channels, _retry, _toa_setting=True, _verbose=False, _total_steps=0, _current_step=0):
+def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_chn, _machine_gun, _expected_event_number, _fragment_life, _dead_chn_list, _asic_settings, _toa_halves, _tot_halves, _toa_channels, _tot_channels, _retry, _toa_setting=True, _verbose=False, _total_steps=0, _current_step=0, _scan_chn_list=None, _stream=True):
     if _asic_num != len(_asic_settings):
         print_err("Number of ASICs does not match the number of configurations")
         return
@@ -820,6 +1087,44 @@ def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_c
     if _scan_chn_pack > 76 or _scan_chn_pack < 1:
         print_err("Invalid scan channel pack number")
         return
+
+    if _scan_chn_list is not None and len(_scan_chn_list) != _asic_num:
+        print_err("Length of scan channel list does not match the number of ASICs")
+        return
+
+    # -- Group the channels into packs ----------------------
+    # - all channels: channel i and i+38 of both halves are injected together
+    # - channel subset: the listed channels of each ASIC are packed densely,
+    #   so the number of packs only depends on the number of listed channels
+    _asic_packs_raw = [] # [asic][pack] 76 channel indexing
+    if _scan_chn_list is None:
+        _packs_raw = []
+        flag_all_channels_feed = False
+        max_chn_half = 38
+        current_chn_half = 0
+        while not flag_all_channels_feed:
+            _pack_valid_num = 0
+            _pack_channels_raw = []
+            while _pack_valid_num < _scan_chn_pack and not flag_all_channels_feed:
+                for _half in range(2):
+                    _chn_index = current_chn_half + _half*38
+                    if _chn_index < _scan_asic_chn:
+                        _pack_channels_raw.append(_chn_index)
+                        if single_channel_index_remove_cm_calib(_chn_index) != -1:
+                            _pack_valid_num += 1
+                current_chn_half +=1
+                if current_chn_half >= max_chn_half:
+                    flag_all_channels_feed = True
+                    break
+            if len(_pack_channels_raw) > 0:
+                _packs_raw.append(_pack_channels_raw)
+        _asic_packs_raw = [_packs_raw for _ in range(_asic_num)]
+    else:
+        for _asic in range(_asic_num):
+            _asic_chn_list = sorted([_chn for _chn in set(_scan_chn_list[_asic]) if _chn < _scan_asic_chn])
+            _asic_packs_raw.append([_asic_chn_list[_i:_i+_scan_chn_pack] for _i in range(0, len(_asic_chn_list), _scan_chn_pack)])
+    _pack_number = max([len(_packs) for _packs in _asic_packs_raw])
+
     _used_scan_values = []
     _copied_asic_settings = [copy.deepcopy(_asic_settings[i]) for i in range(_asic_num)]
 
@@ -831,6 +1136,67 @@ def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_c
     _scan_val2_list     = []
     _scan_val2_err_list = []
 
+    # -- Channel packs, each one is a step of the batch of a DAC value,
+    #    the step also switches the previous pack back off
+    _packs_channels_raw = []    # [pack][asic] 76 channel indexing
+    _packs_channels     = []    # [pack][asic] 72 channel indexing
+    for _pack_index in range(_pack_number):
+        _pack_channels_raw = [] # [asic] 76 channel indexing
+        _pack_channels = []     # [asic] 72 channel indexing
+        for _asic in range(_asic_num):
+            _asic_pack_raw = _asic_packs_raw[_asic][_pack_index] if _pack_index < len(_asic_packs_raw[_asic]) else []
+            _pack_channels_raw.append(_asic_pack_raw)
+            _pack_channels.append([single_channel_index_remove_cm_calib(_chn) for _chn in _asic_pack_raw if single_channel_index_remove_cm_calib(_chn) != -1])
+        _packs_channels_raw.append(_pack_channels_raw)
+        _packs_channels.append(_pack_channels)
+
+    def _enable_pack(_pack_channels):
+        for _asic in range(_asic_num):
+            _asic_setting = _copied_asic_settings[_asic]
+            for _chn in _pack_channels[_asic]:
+                if _asic*72 + _chn in _dead_chn_list:
+                    continue
+                _chn_toa = _toa_channels[_asic*72 + _chn]
+                _chn_tot = _tot_channels[_asic*72 + _chn]
+
+                if _toa_setting:
+                    if not _asic_setting.set_chn_trim_toa(_chn, _chn_toa):
+                        print_err(f"Failed to set TOA trim for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_trim_tot(_chn, _chn_tot):
+                    print_err(f"Failed to set TOT trim for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_highrange(_chn, True):
+                    print_err(f"Failed to set high range for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_lowrange(_chn, False):
+                    print_err(f"Failed to set low range for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_sign_dac(_chn):
+                    print_err(f"Failed to set sign DAC for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_gain_conv2(_chn):
+                    print_err(f"Failed to set gain conv2 for ASIC {_asic} channel {_chn}")
+
+                # _asic_setting.print_reg("Channel_" + str(_chn))
+                if not _asic_setting.send_channel_register(_udp_target, _chn):
+                    print_err(f"Failed to send channel register for ASIC {_asic} channel {_chn}")
+
+    def _disable_pack(_pack_channels):
+        for _asic in range(_asic_num):
+            _asic_setting = _copied_asic_settings[_asic]
+            for _chn in _pack_channels[_asic]:
+                if _asic*72 + _chn in _dead_chn_list:
+                    continue
+
+                if not _asic_setting.set_chn_highrange(_chn, False):
+                    print_err(f"Failed to set high range for ASIC {_asic} channel {_chn}")
+                if not _asic_setting.set_chn_lowrange(_chn, False):
+                    print_err(f"Failed to set low range for ASIC {_asic} channel {_chn}")
+
+                if not _asic_setting.send_channel_register(_udp_target, _chn):
+                    print_err(f"Failed to send channel register for ASIC {_asic} channel {_chn}")
+
+    def _pack_step(_pack_index):
+        if _pack_index > 0:
+            _disable_pack(_packs_channels[_pack_index - 1])
+        _enable_pack(_packs_channels[_pack_index])
+
     for _12b_dac_value in _progress_bar:
         _used_scan_values.append(_12b_dac_value)
 
@@ -879,85 +1245,28 @@ def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_c
             if not _asic_setting.send_reference_voltage_1_register(_udp_target):
                 print_err(f"Failed to send Reference Voltage 1 register for ASIC {_asic_index}")
 
-        # -- Set up channel wise registers ----------------------
-        # -------------------------------------------------------
-        flag_all_channels_feed = False
-        max_chn_half = 38
-        current_chn_half = 0
-        while not flag_all_channels_feed:
-            _pack_channels = [] # this is 72 channel indexing
-            _pack_channels_raw = [] # this is 76 channel indexing
-
-            while len(_pack_channels) < _scan_chn_pack and not flag_all_channels_feed:
-                for _half in range(2):
-                    _chn_index = current_chn_half + _half*38
-                    if _chn_index < _scan_asic_chn:
-                        _chn_valid = single_channel_index_remove_cm_calib(_chn_index)
-                        _pack_channels_raw.append(_chn_index)
-                        if _chn_valid != -1:
-                            _pack_channels.append(_chn_valid)
-                current_chn_half +=1
-                if current_chn_half >= max_chn_half:
-                    flag_all_channels_feed = True
-                    break
-
-            for _asic in range(_asic_num):
-                _asic_setting = _copied_asic_settings[_asic]
-                for _chn in _pack_channels:
-                    if _asic*72 + _chn in _dead_chn_list:
-                        continue
-                    _chn_toa = _toa_channels[_asic*72 + _chn]
-                    _chn_tot = _tot_channels[_asic*72 + _chn]
-
-                    if _toa_setting:
-                        if not _asic_setting.set_chn_trim_toa(_chn, _chn_toa):
-                            print_err(f"Failed to set TOA trim for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_trim_tot(_chn, _chn_tot):
-                        print_err(f"Failed to set TOT trim for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_highrange(_chn, True):
-                        print_err(f"Failed to set high range for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_lowrange(_chn, False):
-                        print_err(f"Failed to set low range for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_sign_dac(_chn):
-                        print_err(f"Failed to set sign DAC for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_gain_conv2(_chn):
-                        print_err(f"Failed to set gain conv2 for ASIC {_asic} channel {_chn}")
-
-                    # _asic_setting.print_reg("Channel_" + str(_chn))
-                    if not _asic_setting.send_channel_register(_udp_target, _chn):
-                        print_err(f"Failed to send channel register for ASIC {_asic} channel {_chn}")
-
-            v0_list, v0_err, v1_list, v1_err, v2_list, v2_err = measure_all(_udp_target, _asic_num, _machine_gun, _expected_event_number, _fragment_life, _retry, _focus_half=[])
+        # -- Measure the channel packs back to back -------------
+        _batch = measure_batch(_udp_target, _asic_num, _machine_gun, _expected_event_number, _fragment_life, _retry, _focus_half=[], _stream=_stream)
+        for _pack_index in range(_pack_number):
+            _batch.add(lambda _pack_index=_pack_index: _pack_step(_pack_index))
+        v0_batch, v0_err_batch, v1_batch, v1_err_batch, v2_batch, v2_err_batch = _batch.run()
+        if _pack_number > 0:
+            _disable_pack(_packs_channels[-1])
+
+        for _pack_index in range(_pack_number):
+            _pack_channels_raw = _packs_channels_raw[_pack_index]
+            _pack_channels     = _packs_channels[_pack_index]
+            v0_list, v0_err = v0_batch[_pack_index], v0_err_batch[_pack_index]
+            v1_list, v1_err = v1_batch[_pack_index], v1_err_batch[_pack_index]
+            v2_list, v2_err = v2_batch[_pack_index], v2_err_batch[_pack_index]
             # two digit channel index
-            channel_str = ', '.join([f"{ch:02d}" for ch in _pack_channels])
+            if _scan_chn_list is None:
+                channel_str = ', '.join([f"{ch:02d}" for ch in _pack_channels[0]])
+            else:
+                channel_str = ' | '.join([', '.join([f"{ch:02d}" for ch in _asic_pack]) for _asic_pack in _pack_channels])
             print(f"-- 12b DAC {_12b_dac_value:04d}, channels {channel_str}")
-            # for _asic in range(_asic_num):
-            #     _pack_channels_to_check = _pack_channels_raw.copy()
-            #     for _chn_index in range(len(_pack_channels_to_check)):
-            #         _pack_channels_to_check[_chn_index] += _asic*76
-                # append the two next channels
-                # _pack_channels_to_check.append(_pack_channels_to_check[-1] + 1)
-                # _pack_channels_to_check.append(_pack_channels_to_check[-1] + 1)
-                # print(f" ASIC {_asic}, channels {_pack_channels_to_check}:")
-                # for _mg in range(_machine_gun+1):
-                #     print(f"  MG {_mg}: V0 {v0_list[_mg][_pack_channels_to_check]}, V1 {v1_list[_mg][_pack_channels_to_check]}, V2 {v2_list[_mg][_pack_channels_to_check]}")
-
-            for _asic in range(_asic_num):
-                _asic_setting = _copied_asic_settings[_asic]
-                for _chn in _pack_channels:
-                    if _asic*72 + _chn in _dead_chn_list:
-                        continue
-
-                    if not _asic_setting.set_chn_highrange(_chn, False):
-                        print_err(f"Failed to set high range for ASIC {_asic} channel {_chn}")
-                    if not _asic_setting.set_chn_lowrange(_chn, False):
-                        print_err(f"Failed to set low range for ASIC {_asic} channel {_chn}")
-
-                    if not _asic_setting.send_channel_register(_udp_target, _chn):
-                        print_err(f"Failed to send channel register for ASIC {_asic} channel {_chn}")
-
             for _asic in range(_asic_num):
-                for _chn in _pack_channels_raw:
+                for _chn in _pack_channels_raw[_asic]:
                     _chn_v0_list, _chn_v1_list, _chn_v2_list = [], [], []
                     _chn_v0_err,  _chn_v1_err,  _chn_v2_err  = [], [], []
 
@@ -985,7 +1294,7 @@ def Scan_12b(_udp_target, _progress_bar, _asic_num, _scan_chn_pack, _scan_asic_c
 
         if _total_steps > 0:
             _current_step += 1
-            print(f"ui_progress:{int(100*_current_step/_total_steps)}")
+            ui_progress(100*_current_step/_total_steps)
 
     return _used_scan_values, _scan_val0_list, _scan_val0_err_list, _scan_val1_list, _scan_val1_err_list, _scan_val2_list, _scan_val2_err_list, _current_step
 # * -------------------------------------------------------------------------------------
\ No newline at end of file
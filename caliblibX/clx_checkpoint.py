@@ -0,0 +1,116 @@
+import os, json, time
+import numpy as np
+
+def print_err(msg):
+    print(f"[clx_checkpoint] ERROR: {msg}")
+def print_info(msg):
+    print(f"[clx_checkpoint] INFO: {msg}")
+def print_warn(msg):
+    print(f"[clx_checkpoint] WARNING: {msg}")
+
+checkpoint_json_name = 'checkpoint.json'
+checkpoint_npz_name  = 'checkpoint.npz'
+
+# * ---------------------------------------------------------------------------
+# * - brief: write the checkpoint of a calibration script into its output
+# * -        folder, the json state and npz arrays are replaced atomically
+# * - param:
+# * -   _output_folder: output dump folder of the running script
+# * -   _script_id: id string of the running script
+# * -   _stage: name of the current calibration stage
+# * -   _step: last completed step in the stage, -1 if the stage is done
+# * -   _state: json serializable dict of trims, thresholds, etc.
+# * -   _arrays: dict of numpy arrays (completed scan points)
+# * - return:
+# * -   True if the checkpoint was written, False otherwise
+# * ---------------------------------------------------------------------------
+def save_checkpoint(_output_folder, _script_id, _stage, _step, _state, _arrays=None):
+    _json_path = os.path.join(_output_folder, checkpoint_json_name)
+    _npz_path  = os.path.join(_output_folder, checkpoint_npz_name)
+    _checkpoint_json = {
+        'script_id': _script_id,
+        'stage'    : _stage,
+        'step'     : int(_step),
+        'time'     : time.strftime('%Y-%m-%d %H:%M:%S'),
+        'state'    : _state
+    }
+    try:
+        if _arrays is not None:
+            with open(_npz_path + '.tmp', 'wb') as npz_file:
+                np.savez(npz_file, **{_key: np.asarray(_val) for _key, _val in _arrays.items()})
+            os.replace(_npz_path + '.tmp', _npz_path)
+        with open(_json_path + '.tmp', 'w') as json_file:
+            json.dump(_checkpoint_json, json_file, indent=4)
+        os.replace(_json_path + '.tmp', _json_path)
+    except Exception as e:
+        print_err(f"Failed to write checkpoint to {_output_folder}: {e}")
+        return False
+    return True
+
+# * ---------------------------------------------------------------------------
+# * - brief: load a checkpoint written by save_checkpoint
+# * - param:
+# * -   _checkpoint_path: checkpoint json file or the output folder holding it
+# * -   _script_id: expected script id, None to skip the check
+# * - return:
+# * -   checkpoint: dict with output_folder, stage, step and state,
+# * -               None if loading failed
+# * -   arrays: dict of numpy arrays, empty if no npz file exists
+# * ---------------------------------------------------------------------------
+def load_checkpoint(_checkpoint_path, _script_id=None):
+    if os.path.isdir(_checkpoint_path):
+        _json_path = os.path.join(_checkpoint_path, checkpoint_json_name)
+    else:
+        _json_path = _checkpoint_path
+    _output_folder = os.path.dirname(os.path.abspath(_json_path))
+    _npz_path = os.path.join(_output_folder, checkpoint_npz_name)
+
+    try:
+        with open(_json_path, 'r') as json_file:
+            checkpoint = json.load(json_file)
+    except Exception as e:
+        print_err(f"Failed to read checkpoint {_json_path}: {e}")
+        return None, {}
+
+    if _script_id is not None and checkpoint.get('script_id') != _script_id:
+        print_err(f"Checkpoint {_json_path} was written by {checkpoint.get('script_id')}, not {_script_id}")
+        return None, {}
+
+    arrays = {}
+    if os.path.exists(_npz_path):
+        try:
+            with np.load(_npz_path) as npz_file:
+                for _key in npz_file.files:
+                    arrays[_key] = npz_file[_key]
+        except Exception as e:
+            print_warn(f"Failed to read checkpoint arrays {_npz_path}: {e}")
+
+    checkpoint['output_folder'] = _output_folder
+    print_info(f"Loaded checkpoint from {_json_path} (stage {checkpoint.get('stage')}, step {checkpoint.get('step')}, saved {checkpoint.get('time')})")
+    return checkpoint, arrays
+
+# * ---------------------------------------------------------------------------
+# * - brief: check if a stage (or a step of it) was completed in a checkpoint
+# * - param:
+# * -   _checkpoint: checkpoint dict from load_checkpoint, or None
+# * -   _stages: ordered list of the stage names used by the script
+# * -   _stage: stage name to check
+# * -   _step: step index to check, None to check the whole stage
+# * - return:
+# * -   True if the stage/step does not need to be run again
+# * ---------------------------------------------------------------------------
+def checkpoint_completed(_checkpoint, _stages, _stage, _step=None):
+    if _checkpoint is None:
+        return False
+    if _checkpoint.get('stage') not in _stages or _stage not in _stages:
+        return False
+    _done_stage_index = _stages.index(_checkpoint['stage'])
+    _stage_index      = _stages.index(_stage)
+    _done_step        = _checkpoint.get('step', -1)
+    if _done_stage_index != _stage_index:
+        return _done_stage_index > _stage_index
+    if _done_step == -1:
+        return True
+    if _step is None:
+        return False
+    return _step <= _done_step
@@ -86,6 +86,141 @@ def tune_chn_trim_inv(_best_chn_trim, _adc_mean_list, _halves_target_adc, _adc_t
                 if _best_chn_trim[_asic][_half * 36 + _chn_in_half] > 63:
                     _best_chn_trim[_asic][_half * 36 + _chn_in_half] = 63
 
+# * ---------------------------------------------------------------------------
+# * - brief: fit the adc-vs-trim slope of every channel from a few trim points
+# * -        (least squares, vectorized over all channels)
+# * - param:
+# * -   _trim_points: [point_num][asic_num * 72] trims used for each point
+# * -   _adc_points: [point_num][asic_num * 72] measured adc mean (without
+# * -                common-mode and calibration channels)
+# * -   _min_slope: minimum |slope| (adc per trim code) for a usable fit
+# * - return:
+# * -   _chn_slope: [asic_num * 72] adc change per trim code; channels
+# * -               without a usable fit get the median slope of their half
+# * ---------------------------------------------------------------------------
+def fit_chn_trim_slope(_trim_points, _adc_points, _min_slope = 0.1):
+    _trims = np.asarray(_trim_points, dtype=float)
+    _adcs  = np.asarray(_adc_points, dtype=float)
+    if _trims.shape != _adcs.shape or _trims.ndim != 2 or _trims.shape[1] % 36 != 0:
+        print_err("Shape of _trim_points and _adc_points do not match!")
+        return np.zeros(_adcs.shape[-1])
+
+    _trims_centered = _trims - _trims.mean(axis=0)
+    _adcs_centered  = _adcs - _adcs.mean(axis=0)
+    _cov = (_trims_centered * _adcs_centered).sum(axis=0)
+    _var = (_trims_centered ** 2).sum(axis=0)
+    _chn_slope = np.divide(_cov, _var, out=np.zeros_like(_cov), where=_var > 0)
+
+    # channels with a flat or wrong-sign response (dead, clamped trims)
+    # take the median slope of the other channels in the same half
+    _slope_halves = _chn_slope.reshape(-1, 36)
+    _global_valid = np.abs(_chn_slope) >= _min_slope
+    _global_median = np.median(_chn_slope[_global_valid]) if np.any(_global_valid) else 0.0
+    for _half in range(_slope_halves.shape[0]):
+        _half_slope = _slope_halves[_half]
+        _sign = np.sign(np.median(_half_slope)) if np.any(_half_slope != 0) else np.sign(_global_median)
+        _valid = _half_slope * _sign >= _min_slope
+        if np.any(_valid):
+            _half_slope[~_valid] = np.median(_half_slope[_valid])
+        else:
+            _half_slope[:] = _global_median
+    return _slope_halves.reshape(-1)
+
+# * ---------------------------------------------------------------------------
+# * - brief: keep the trim with the smallest |adc - target| measured so far
+# * -        for every channel
+# * - param:
+# * -   _trim_history: dict filled here ('trim', 'diff': [asic_num * 72]),
+# * -                  start a new one whenever inv_vref changes
+# * -   _trim: [asic_num * 72] trims of the measurement
+# * -   _adc_diff: [asic_num * 72] target - measured adc
+# * - return:
+# * -   best trims and their adc differences
+# * ---------------------------------------------------------------------------
+def update_trim_history(_trim_history, _trim, _adc_diff):
+    if 'trim' not in _trim_history:
+        _trim_history['trim'] = np.array(_trim, dtype=float)
+        _trim_history['diff'] = np.array(_adc_diff, dtype=float)
+    else:
+        _better = np.abs(_adc_diff) < np.abs(_trim_history['diff'])
+        _trim_history['trim'][_better] = np.asarray(_trim, dtype=float)[_better]
+        _trim_history['diff'][_better] = np.asarray(_adc_diff, dtype=float)[_better]
+    return _trim_history['trim'].copy(), _trim_history['diff'].copy()
+
+# * ---------------------------------------------------------------------------
+# * - brief: from the measured adc mean values and the fitted adc-vs-trim
+# * -        slopes, move every out-of-tolerance channel directly to its
+# * -        predicted trim
+# * - param:
+# * -   _best_chn_trim: [asic_num][72] current best channel trims settings
+# * -   _adc_mean_list: [asic_num * 76] measured adc mean
+# * -   _halves_target_adc: [asic_num * 2] target adc for each half
+# * -   _chn_slope: [asic_num * 72] slopes from fit_chn_trim_slope
+# * -   _adc_tolerance: tolerance within which no adjustment will be made
+# * -   _dead_chn_list: dead channel indexes, left untouched
+# * -   _trim_history: dict of update_trim_history, the step then starts
+# * -                  from the best trim measured so far of every channel
+# * - return:
+# * -   _changed_num: number of channels whose trim was changed
+# * ---------------------------------------------------------------------------
+def solve_chn_trim_inv(_best_chn_trim, _adc_mean_list, _halves_target_adc, _chn_slope, _adc_tolerance = 2, _dead_chn_list = [], _trim_history = None):
+    if len(_best_chn_trim) * 2 != len(_halves_target_adc):
+        print_err("Length of _best_chn_trim and _halves_target_adc do not match!")
+        return 0
+    if len(_best_chn_trim) != len(_adc_mean_list) // 76:
+        print_err("Length of _best_chn_trim and _adc_mean_list do not match!")
+        return 0
+    if len(_best_chn_trim) * 72 != len(_chn_slope):
+        print_err("Length of _best_chn_trim and _chn_slope do not match!")
+        return 0
+
+    _asic_num = len(_best_chn_trim)
+    _adc      = np.asarray(channel_list_remove_cm_calib(_adc_mean_list), dtype=float)
+    _set_trim = np.asarray(_best_chn_trim, dtype=float).reshape(-1)
+    _slope    = np.asarray(_chn_slope, dtype=float)
+    _adc_diff = np.repeat(np.asarray(_halves_target_adc, dtype=float), 36) - _adc
+    _trim     = _set_trim
+    if _trim_history is not None:
+        _trim, _adc_diff = update_trim_history(_trim_history, _set_trim, _adc_diff)
+
+    _active = (np.abs(_adc_diff) > _adc_tolerance) & (_slope != 0)
+    for _dead_chn in _dead_chn_list:
+        if 0 <= _dead_chn < _active.size:
+            _active[_dead_chn] = False
+
+    _trim_step = np.zeros_like(_trim)
+    _trim_step[_active] = _adc_diff[_active] / _slope[_active]
+    # a sub-code step is rounded up to one code only when the channel is
+    # well out of tolerance, otherwise it would just follow the noise
+    _force_step = _active & (np.abs(_trim_step) < 1) & (np.abs(_adc_diff) > 2 * _adc_tolerance)
+    _trim_step = np.where(_force_step, np.sign(_trim_step), _trim_step)
+    _new_trim = np.clip(np.rint(_trim + _trim_step), 0, 63).astype(int)
+
+    _changed_num = int(np.count_nonzero(_new_trim != _set_trim))
+    for _asic in range(_asic_num):
+        _best_chn_trim[_asic][:] = _new_trim[_asic * 72 : (_asic + 1) * 72].tolist()
+    return _changed_num
+
+# * ---------------------------------------------------------------------------
+# * - brief: after the last tuning attempt, go back to the best trim measured
+# * -        of every channel (see update_trim_history)
+# * - return:
+# * -   _changed_num: number of channels whose trim was changed
+# * ---------------------------------------------------------------------------
+def restore_best_chn_trim(_best_chn_trim, _trim_history, _adc_mean_list, _halves_target_adc, _dead_chn_list = []):
+    _set_trim = np.asarray(_best_chn_trim, dtype=float).reshape(-1)
+    _adc      = np.asarray(channel_list_remove_cm_calib(_adc_mean_list), dtype=float)
+    _adc_diff = np.repeat(np.asarray(_halves_target_adc, dtype=float), 36) - _adc
+    _trim, _  = update_trim_history(_trim_history, _set_trim, _adc_diff)
+    for _dead_chn in _dead_chn_list:
+        if 0 <= _dead_chn < _trim.size:
+            _trim[_dead_chn] = _set_trim[_dead_chn]
+    _new_trim = _trim.astype(int)
+    _changed_num = int(np.count_nonzero(_new_trim != _set_trim))
+    for _asic in range(len(_best_chn_trim)):
+        _best_chn_trim[_asic][:] = _new_trim[_asic * 72 : (_asic + 1) * 72].tolist()
+    return _changed_num
+
 # * ---------------------------------------------------------------------------
 # * - brief: calculate the average adc value for each half of each asic,
 # * -        excluding specified ignored and dead channels
@@ -195,4 +330,84 @@ def dead_chn_discrimination(_adc_mean_scan_array, _dead_chn_threshold = 20):
             if _adc_rms < _dead_chn_threshold:
                 _dead_chn_list.append(_chn_base + _chn)
 
-    return _dead_chn_list, _chn_rms_list
\ No newline at end of file
+    return _dead_chn_list, _chn_rms_list
+
+# * ---------------------------------------------------------------------------
+# * - brief: predict the next inv_vref of every half from the points measured
+# * -        so far, interpolating inside the bracketing segment around the
+# * -        target or extrapolating from the two closest points (secant)
+# * - param:
+# * -   _vref_points: [half][point_num] measured inv_vref values (nan = unused)
+# * -   _adc_points: [half][point_num] measured half average adc
+# * -   _halves_target_adc: [half] target adc for each half
+# * -   _halves_slope: [half] fallback adc-vs-vref slope if only one point
+# * -                  is available, None to skip
+# * -   _vref_min: lower limit of the inv_vref setting
+# * -   _vref_max: upper limit of the inv_vref setting
+# * - return:
+# * -   _next_vref: [half] predicted inv_vref for the target
+# * -   _local_slope: [half] adc-vs-vref slope used for the prediction
+# * ---------------------------------------------------------------------------
+def interpolate_halves_inv_vref(_vref_points, _adc_points, _halves_target_adc, _halves_slope = None, _vref_min = 0, _vref_max = 1023):
+    _next_vref   = []
+    _local_slope = []
+    for _half in range(len(_halves_target_adc)):
+        _vref  = np.asarray(_vref_points[_half], dtype=float)
+        _adc   = np.asarray(_adc_points[_half], dtype=float)
+        _valid = ~np.isnan(_vref) & ~np.isnan(_adc)
+        _vref  = _vref[_valid]
+        _adc   = _adc[_valid]
+        _slope = float(_halves_slope[_half]) if _halves_slope is not None else 0.0
+
+        if _vref.size == 0:
+            _next_vref.append((_vref_min + _vref_max) // 2)
+            _local_slope.append(_slope)
+            continue
+
+        # average the points measured at the same vref, sorted by vref
+        _uniq_vref, _uniq_index = np.unique(_vref, return_inverse=True)
+        _uniq_adc = np.bincount(_uniq_index, weights=_adc) / np.bincount(_uniq_index)
+        _diff = _uniq_adc - _halves_target_adc[_half]
+        _best = int(np.argmin(np.abs(_diff)))
+
+        _pair = None
+        _bracket = np.nonzero(np.sign(_diff[:-1]) * np.sign(_diff[1:]) <= 0)[0]
+        if _bracket.size > 0:
+            _segment = _bracket[np.argmin(np.abs(_bracket + 0.5 - _best))]
+            _pair = (_segment, _segment + 1)
+        elif _uniq_vref.size >= 2:
+            _pair = tuple(np.argsort(np.abs(_diff))[:2])
+        if _pair is not None:
+            _pair_slope = (_uniq_adc[_pair[1]] - _uniq_adc[_pair[0]]) / (_uniq_vref[_pair[1]] - _uniq_vref[_pair[0]])
+            if _pair_slope != 0 and np.isfinite(_pair_slope):
+                _slope = float(_pair_slope)
+
+        if _slope != 0 and np.isfinite(_slope):
+            _vref_predicted = _uniq_vref[_best] - _diff[_best] / _slope
+        else:
+            _vref_predicted = _uniq_vref[_best]
+        _next_vref.append(int(min(max(round(_vref_predicted), _vref_min), _vref_max)))
+        _local_slope.append(_slope)
+    return _next_vref, _local_slope
+
+# * ---------------------------------------------------------------------------
+# * - brief: merge the result of a scan over a channel subset into a full scan
+# * -        array, channels outside the subset keep their previous values
+# * - param:
+# * -   _base_array: [scan_point][asic_num * 76] previous full scan values
+# * -   _new_array: [scan_point][asic_num * 76] values of the subset scan
+# * -   _asic_num: total number of asics
+# * -   _scan_chn_list: [asic] scanned channel indexes (76 indexing)
+# * - return:
+# * -   _merged_array: [scan_point][asic_num * 76] merged scan values
+# * ---------------------------------------------------------------------------
+def merge_scan_channels(_base_array, _new_array, _asic_num, _scan_chn_list):
+    _new_array = np.asarray(_new_array)
+    if _base_array is None or np.shape(_base_array) != _new_array.shape:
+        print_err("Shape of _base_array and _new_array do not match, using the new scan only!")
+        return _new_array
+    _merged_array = np.array(_base_array, copy=True)
+    for _asic in range(_asic_num):
+        for _chn in _scan_chn_list[_asic]:
+            _merged_array[:, _asic*76 + _chn] = _new_array[:, _asic*76 + _chn]
+    return _merged_array
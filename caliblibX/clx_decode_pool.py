@@ -0,0 +1,227 @@
+import os, sys, queue
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import packetlibX
+from .clx_calib import cell_accumulator, payload_half_index
+
+def print_err(msg):
+    print(f"[clx_decode_pool] ERROR: {msg}", file=sys.stderr)
+def print_info(msg):
+    print(f"[clx_decode_pool] INFO: {msg}", file=sys.stdout)
+def print_warn(msg):
+    print(f"[clx_decode_pool] WARNING: {msg}", file=sys.stdout)
+
+decode_pool_slot_bytes     = 4 << 20   # datagram bytes per shared memory slot
+decode_pool_slot_datagrams = 4096      # datagrams per slot
+decode_pool_header_size    = 14
+decode_pool_payload_size   = 192
+decode_pool_max_datagram   = decode_pool_header_size + 46 * decode_pool_payload_size   # jumbo datagram
+
+# * ---------------------------------------------------------------------------
+# * - brief: per-channel statistics of adc, tot and toa over the good half
+# * -        packets of a stream, mergeable across processes
+# * - a cell_accumulator with a single machine-gun bin, so the estimators
+# *   (mean, median, trimmed) are the ones of measure_all
+# * - channel index: (asic * 2 + half) * 38 + word, as in measure_all
+# * - _histogram: also fill the value histograms for median and trimmed
+# * ---------------------------------------------------------------------------
+class channel_accumulator(cell_accumulator):
+    def __init__(self, _n_channels, _histogram=False):
+        # no cell is ever complete, every good half packet is added
+        super().__init__(0, _n_channels // 38, np.iinfo(np.int64).max, _histogram=_histogram)
+        self.halves      = 0
+        self.halves_bad  = 0
+        self.datagrams   = 0
+
+    def add_block(self, _block):
+        """ Add the output of packetlibX.extract_values_block. """
+        _good  = _block["_good"]
+        _half  = payload_half_index(_block["_address_id"].astype(int), _block["_packet_id"].astype(int))
+        self.halves     += len(_good)
+        self.halves_bad += int(np.count_nonzero(~_good))
+        _good  = _good & (_half >= 0) & (_half < self.n_halves)
+        if np.all(_good):
+            self.add_halves(_block["_values"], np.zeros(len(_half), dtype=int), _half)
+        else:
+            self.add_halves(_block["_values"][:, _good, :], np.zeros(np.count_nonzero(_good), dtype=int), _half[_good])
+
+    def merge(self, _other):
+        super().merge(_other)
+        self.halves     += _other.halves
+        self.halves_bad += _other.halves_bad
+        self.datagrams  += _other.datagrams
+
+    def channel_counts(self):
+        """ Good half packets added to each channel, (channels,). """
+        return np.repeat(self.counts[0], 38)
+
+    def statistics(self, _estimator='mean'):
+        """ Estimate, its error and the rms, each (3, channels), zeros without data. """
+        _adc, _adc_err, _tot, _tot_err, _toa, _toa_err = super().statistics(_estimator)
+        return np.stack([_adc[0], _tot[0], _toa[0]]), np.stack([_adc_err[0], _tot_err[0], _toa_err[0]]), self.moments()[1][:, 0]
+
+# * - 192-byte payloads of the datagrams of a slot, datagrams made only of
+# *   aligned payloads are cut by reshape, others go through extract_raw_data
+def slot_payload_block(_data, _lengths):
+    _blocks  = []
+    _offset  = 0
+    for _length in _lengths:
+        _datagram = _data[_offset:_offset + _length]
+        _offset  += _length
+        _body = _datagram[decode_pool_header_size:]
+        if len(_body) > 0 and len(_body) % decode_pool_payload_size == 0:
+            _aligned = _body.reshape(-1, decode_pool_payload_size)
+            if np.all((_aligned[:, 0] == 0xAA) & (_aligned[:, 1] == 0x5A)):
+                _blocks.append(_aligned)
+                continue
+            # padding at the end of a burst, keep the marked payloads
+            _marked = (_aligned[:, 0] == 0xAA) & (_aligned[:, 1] == 0x5A)
+            if np.all(_marked[:np.count_nonzero(_marked)]):
+                _blocks.append(_aligned[_marked])
+                continue
+        _blocks.append(packetlibX.payload_block(packetlibX.extract_raw_data(_datagram.tobytes())))
+    if len(_blocks) == 0:
+        return np.zeros((0, decode_pool_payload_size), dtype=np.uint8)
+    return np.concatenate(_blocks)
+
+def decode_worker(_shm_name, _slot_bytes, _slot_datagrams, _n_channels, _histogram, _tasks, _free, _results):
+    _shm = shared_memory.SharedMemory(name=_shm_name)
+    _accumulator = channel_accumulator(_n_channels, _histogram)
+    _header_bytes = 4 * _slot_datagrams
+    try:
+        while True:
+            _task = _tasks.get()
+            if _task is None:
+                break
+            _slot, _count = _task
+            _base    = _slot * (_header_bytes + _slot_bytes)
+            _lengths = np.ndarray((_count,), dtype=np.uint32, buffer=_shm.buf, offset=_base)
+            _data    = np.ndarray((_slot_bytes,), dtype=np.uint8, buffer=_shm.buf, offset=_base + _header_bytes)
+            _block   = slot_payload_block(_data, _lengths.tolist())
+            if len(_block) > 0:
+                _accumulator.add_block(packetlibX.extract_values_block(_block))
+            _accumulator.datagrams += _count
+            del _lengths, _data
+            _free.put(_slot)
+    finally:
+        _results.put(_accumulator)
+        _shm.close()
+
+# * ---------------------------------------------------------------------------
+# * - brief: decode a datagram stream on several cores
+# * - the datagrams are received into (recv_into) or copied to slots of one
+# *   shared memory block; a full slot is handed to a worker process by its
+# *   index, the workers accumulate per-channel statistics that are merged
+# *   by close()
+# * - param:
+# * -   _n_channels: 76 * number of ASICs
+# * -   _workers: worker processes, default all cores but one
+# * -   _slots: shared memory slots, default 2 per worker
+# * -   _histogram: fill value histograms for the median and trimmed mean
+# * - usage:
+# * -   pool = decode_pool(8 * 76, _workers=4)
+# * -   while running: pool.receive(data_socket)   # or pool.submit(datagram)
+# * -   accumulator = pool.close()
+# * ---------------------------------------------------------------------------
+class decode_pool:
+    def __init__(self, _n_channels, _workers=None, _slots=None, _slot_bytes=decode_pool_slot_bytes, _slot_datagrams=decode_pool_slot_datagrams, _histogram=False):
+        self.n_channels     = _n_channels
+        self.histogram      = _histogram
+        self.workers        = _workers if _workers is not None else max((os.cpu_count() or 2) - 1, 1)
+        self.slots          = _slots if _slots is not None else 2 * self.workers
+        self.slot_bytes     = _slot_bytes
+        self.slot_datagrams = _slot_datagrams
+        self.header_bytes   = 4 * _slot_datagrams
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * (self.header_bytes + self.slot_bytes))
+
+        # fork: spawn would run the top level of the (flat) calling script again
+        _context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        self.tasks   = _context.Queue()
+        self.free    = _context.Queue()
+        self.results = _context.Queue()
+        for _slot in range(self.slots):
+            self.free.put(_slot)
+        self.processes = [_context.Process(target=decode_worker, args=(self.shm.name, self.slot_bytes, self.slot_datagrams, self.n_channels, self.histogram, self.tasks, self.free, self.results), daemon=True) for _ in range(self.workers)]
+        for _process in self.processes:
+            _process.start()
+
+        self.slot      = None
+        self.lengths   = None
+        self.data      = None
+        self.offset    = 0
+        self.count     = 0
+        self.waits     = 0
+        self.closed    = False
+
+    def take_slot(self):
+        try:
+            self.slot = self.free.get_nowait()
+        except queue.Empty:
+            # all slots are being decoded, the workers are behind
+            self.waits += 1
+            self.slot = self.free.get()
+        _base = self.slot * (self.header_bytes + self.slot_bytes)
+        self.lengths = np.ndarray((self.slot_datagrams,), dtype=np.uint32, buffer=self.shm.buf, offset=_base)
+        self.data    = self.shm.buf[_base + self.header_bytes:_base + self.header_bytes + self.slot_bytes]
+        self.offset  = 0
+        self.count   = 0
+
+    def flush(self):
+        """ Hand the current slot to the workers. """
+        if self.slot is None:
+            return
+        if self.count > 0:
+            self.tasks.put((self.slot, self.count))
+        else:
+            self.free.put(self.slot)
+        self.data.release()
+        self.slot, self.lengths, self.data = None, None, None
+
+    def room(self, _size):
+        if self.slot is not None and (self.count >= self.slot_datagrams or self.offset + _size > self.slot_bytes):
+            self.flush()
+        if self.slot is None:
+            self.take_slot()
+
+    def submit(self, _datagram):
+        """ Copy one datagram into the current slot. """
+        _size = len(_datagram)
+        if _size > self.slot_bytes:
+            print_warn(f"Datagram of {_size} bytes does not fit into a slot, dropped")
+            return
+        self.room(_size)
+        self.data[self.offset:self.offset + _size] = _datagram
+        self.lengths[self.count] = _size
+        self.offset += _size
+        self.count  += 1
+
+    def receive(self, _sock, _max_size=decode_pool_max_datagram):
+        """ Receive one datagram with recv_into straight into the current slot, returns its size. """
+        self.room(_max_size)
+        _size = _sock.recv_into(self.data[self.offset:self.offset + _max_size])
+        if _size > 0:
+            self.lengths[self.count] = _size
+            self.offset += _size
+            self.count  += 1
+        return _size
+
+    def close(self):
+        """ Decode what is left, stop the workers and return the merged channel_accumulator. """
+        _merged = channel_accumulator(self.n_channels, self.histogram)
+        if self.closed:
+            return _merged
+        self.closed = True
+        self.flush()
+        for _ in self.processes:
+            self.tasks.put(None)
+        for _ in self.processes:
+            try:
+                _merged.merge(self.results.get(timeout=60))
+            except queue.Empty:
+                print_err("A decode worker did not report back")
+        for _process in self.processes:
+            _process.join(timeout=5)
+        self.shm.close()
+        self.shm.unlink()
+        return _merged
@@ -0,0 +1,69 @@
+import os, sys, json, time, threading
+
+def print_err(msg):
+    print(f"[clx_events] ERROR: {msg}", file=sys.stderr)
+def print_info(msg):
+    print(f"[clx_events] INFO: {msg}", file=sys.stdout)
+def print_warn(msg):
+    print(f"[clx_events] WARNING: {msg}", file=sys.stdout)
+
+# * ---------------------------------------------------------------------------
+# * UI event channel of the calibration scripts
+# * - one JSON object per line, separate from the human-readable output:
+# *   a pipe given by the UI in CLX_EVENT_FD, or the connection of the
+# *   calibration worker running the script (set_event_sink)
+# * - events (all with 'event' and 'time'):
+# *   progress      value (percent)
+# *   asic_values   asic, name, values, final
+# *   output_file   asic, path, kind
+# *   timing        name, seconds
+# * - without a channel the events are dropped
+# * ---------------------------------------------------------------------------
+
+event_fd_env = 'CLX_EVENT_FD'
+
+event_sink      = None
+event_sink_lock = threading.Lock()
+event_file      = None
+
+def set_event_sink(_sink):
+    """ Send the events to _sink(event_dict), None to fall back to CLX_EVENT_FD. """
+    global event_sink
+    event_sink = _sink
+
+def open_event_fd():
+    global event_file
+    if event_file is None and os.environ.get(event_fd_env, '') != '':
+        try:
+            event_file = os.fdopen(int(os.environ[event_fd_env]), 'w', buffering=1)
+        except (OSError, ValueError) as e:
+            print_warn(f"Cannot open the event channel {os.environ[event_fd_env]}: {e}")
+            os.environ[event_fd_env] = ''
+    return event_file
+
+def emit_event(_event, **_fields):
+    _message = {'event': _event, 'time': round(time.time(), 3)}
+    _message.update(_fields)
+    with event_sink_lock:
+        if event_sink is not None:
+            event_sink(_message)
+            return
+        _file = open_event_fd()
+        if _file is None:
+            return
+        try:
+            _file.write(json.dumps(_message) + '\n')
+        except (OSError, ValueError):
+            pass
+
+def ui_progress(_percent):
+    emit_event('progress', value=int(_percent))
+
+def ui_asic_values(_asic, _name, _values, _final=False):
+    emit_event('asic_values', asic=int(_asic), name=_name, values=[int(_v) for _v in _values], final=_final)
+
+def ui_output_file(_asic, _path, _kind='i2c'):
+    emit_event('output_file', asic=int(_asic), path=str(_path), kind=_kind)
+
+def ui_timing(_name, _seconds):
+    emit_event('timing', name=_name, seconds=round(float(_seconds), 3))
@@ -1,9 +1,6 @@
 import packetlibX
 import time, os, sys, socket, json, csv, uuid
 import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 from collections import deque
 from collections import OrderedDict
 from .clx_calib import send_register_calib
@@ -187,6 +184,45 @@ class h2gcroc_registers_full:
             return False
         return True
     
+    def get_chn_trim_inv(self, channel_index):
+        if channel_index < 0 or channel_index > 71:
+            print_err("Channel index must be between 0 and 71")
+            return None
+        reg_key = f"Channel_{channel_index}"
+        try:
+            return (self.register_settings[reg_key][3] >> 2) & 0x3F
+        except KeyError:
+            print_err(f"Channel register {reg_key} not found in settings")
+            return None
+
+    def get_chn_trim_inv_all(self):
+        trim_values = [self.get_chn_trim_inv(ch_index) for ch_index in range(72)]
+        if None in trim_values:
+            return None
+        return trim_values
+
+    def get_chn_trim_toa(self, channel_index):
+        if channel_index < 0 or channel_index > 71:
+            print_err("Channel index must be between 0 and 71")
+            return None
+        reg_key = f"Channel_{channel_index}"
+        try:
+            return (self.register_settings[reg_key][1] >> 2) & 0x3F
+        except KeyError:
+            print_err(f"Channel register {reg_key} not found in settings")
+            return None
+
+    def get_chn_trim_tot(self, channel_index):
+        if channel_index < 0 or channel_index > 71:
+            print_err("Channel index must be between 0 and 71")
+            return None
+        reg_key = f"Channel_{channel_index}"
+        try:
+            return (self.register_settings[reg_key][2] >> 2) & 0x3F
+        except KeyError:
+            print_err(f"Channel register {reg_key} not found in settings")
+            return None
+
     def set_chn_lowrange(self, channel_index, enable=True):
         if channel_index < 0 or channel_index > 71:
             print_err("Channel index must be between 0 and 71")
@@ -366,6 +402,45 @@ class h2gcroc_registers_full:
             return False
         return True
     
+    def get_inv_vref(self, half_index):
+        if half_index not in [0, 1]:
+            print_err("Half index must be 0 or 1")
+            return None
+        reg_key = f"Reference_Voltage_{half_index}"
+        try:
+            vref_reg = self.register_settings[reg_key]
+            # bit 0-7 of reg#4 and bit 2-3 of reg#1
+            return (vref_reg[4] << 2) | ((vref_reg[1] >> 2) & 0x03)
+        except KeyError:
+            print_err(f"Reference Voltage register {reg_key} not found in settings")
+            return None
+
+    def get_toa_vref(self, half_index):
+        if half_index not in [0, 1]:
+            print_err("Half index must be 0 or 1")
+            return None
+        reg_key = f"Reference_Voltage_{half_index}"
+        try:
+            vref_reg = self.register_settings[reg_key]
+            # reg#3 and bit 5-4 of reg#1
+            return (vref_reg[3] << 2) | ((vref_reg[1] >> 4) & 0x03)
+        except KeyError:
+            print_err(f"Reference Voltage register {reg_key} not found in settings")
+            return None
+
+    def get_tot_vref(self, half_index):
+        if half_index not in [0, 1]:
+            print_err("Half index must be 0 or 1")
+            return None
+        reg_key = f"Reference_Voltage_{half_index}"
+        try:
+            vref_reg = self.register_settings[reg_key]
+            # reg#2 and bit 7-6 of reg#1
+            return (vref_reg[2] << 2) | ((vref_reg[1] >> 6) & 0x03)
+        except KeyError:
+            print_err(f"Reference Voltage register {reg_key} not found in settings")
+            return None
+
     def set_12b_dac(self, dac_value, half_index):
         if dac_value < 0 or dac_value > 4095:
             print_err("12b DAC value must be between 0 and 4095")
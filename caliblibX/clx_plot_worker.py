@@ -0,0 +1,140 @@
+import os, sys, queue, pickle, atexit, threading, subprocess, importlib.util
+
+def print_err(msg):
+    print(f"[clx_plot_worker] ERROR: {msg}")
+def print_info(msg):
+    print(f"[clx_plot_worker] INFO: {msg}")
+def print_warn(msg):
+    print(f"[clx_plot_worker] WARNING: {msg}")
+
+# plot functions of clx_visualize a job may call, all return (fig, ax)
+plot_worker_functions = ['plot_channel_adc', 'plot_inv_vref_scan', 'plot_channel_rms', 'Draw2DIM']
+# plot workers with a running process, joined at exit or by the calibration
+# worker after each job (atexit does not run between in-process jobs)
+plot_workers_running  = []
+
+def plot_backend_available():
+    return importlib.util.find_spec('matplotlib') is not None
+
+# * - renders one job, reports the saved file (Draw2DIM saves its own image)
+def render_plot_job(_job):
+    _func_name, _image_path, _args, _kwargs = _job
+    if _func_name not in plot_worker_functions:
+        print_err(f"Unknown plot function {_func_name}")
+        return False
+    _saved_path = _image_path if _image_path is not None else _kwargs.get('_image_saving_path')
+    try:
+        from matplotlib import pyplot as plt
+        from . import clx_visualize
+        fig, _ = getattr(clx_visualize, _func_name)(*_args, **_kwargs)
+        if _image_path is not None:
+            fig.savefig(_image_path)
+        plt.close(fig)
+    except Exception as e:
+        print_err(f"Failed to render {_func_name} to {_saved_path}: {e}")
+        return False
+    if _saved_path is not None:
+        print_info(f"Saved {_saved_path}")
+    return True
+
+# * ---------------------------------------------------------------------------
+# * - brief: renders plots in a separate python process (matplotlib Agg), so
+# * -        the hardware loops never wait for matplotlib; jobs are pickled
+# * -        on submit and written to the process stdin by a feeder thread
+# * - param:
+# * -   _background: False to render in the calling process (no worker)
+# * - without matplotlib the plots are skipped, submit() returns False
+# * ---------------------------------------------------------------------------
+class plot_worker:
+    def __init__(self, _background=True):
+        self.jobs    = queue.Queue()
+        self.process = None
+        self.feeder  = None
+        self.enabled = True
+        if _background:
+            self.start()
+        else:
+            self.check_backend()
+
+    def check_backend(self):
+        if not plot_backend_available():
+            print_warn("matplotlib is not installed, the plots are skipped")
+            self.enabled = False
+        return self.enabled
+
+    def start(self):
+        if not self.check_backend():
+            return
+        _package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _worker_code = f"import sys; sys.path.insert(0, {_package_parent!r}); from caliblibX.clx_plot_worker import plot_worker_main; plot_worker_main()"
+        try:
+            self.process = subprocess.Popen([sys.executable, '-c', _worker_code], stdin=subprocess.PIPE, env=dict(os.environ, MPLBACKEND='Agg'))
+        except Exception as e:
+            print_warn(f"Failed to start the plot worker, plotting in the main process: {e}")
+            self.process = None
+            return
+        self.feeder = threading.Thread(target=self.feed, daemon=True)
+        self.feeder.start()
+        plot_workers_running.append(self)
+
+    def feed(self):
+        while True:
+            _job = self.jobs.get()
+            try:
+                if _job is None:
+                    self.process.stdin.close()
+                    return
+                self.process.stdin.write(_job)
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                print_err(f"Plot worker is gone, dropping the remaining plots: {e}")
+                self.enabled = False
+                return
+
+    # * - brief: queue a plot, rendered with clx_visualize.<_func_name>
+    # * -        (*_args, **_kwargs) and saved to _image_path if given
+    # * - return: False if the plot is skipped (no matplotlib, worker gone)
+    def submit(self, _func_name, _image_path, *_args, **_kwargs):
+        _job = (_func_name, _image_path, _args, _kwargs)
+        if not self.enabled:
+            return False
+        if self.process is None:
+            return render_plot_job(_job)
+        # pickled right away, the arrays may be changed by the caller afterwards
+        self.jobs.put(pickle.dumps(_job, protocol=pickle.HIGHEST_PROTOCOL))
+        return True
+
+    # * - brief: wait until all queued plots are rendered, the process is
+    # * -        killed if it does not finish within _timeout
+    def join(self, _timeout=None):
+        if self.process is None:
+            return
+        self.jobs.put(None)
+        self.feeder.join(_timeout)
+        try:
+            self.process.wait(_timeout)
+        except subprocess.TimeoutExpired:
+            print_warn("Plot worker did not finish in time, dropping the remaining plots")
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        if self in plot_workers_running:
+            plot_workers_running.remove(self)
+
+# * - brief: join the plot workers that are still running (the job ended
+# * -        before its join, e.g. by sys.exit or an exception)
+def join_plot_workers(_timeout=None):
+    for _worker in list(plot_workers_running):
+        _worker.join(_timeout)
+
+atexit.register(join_plot_workers)
+
+def plot_worker_main():
+    _stdin = sys.stdin.buffer
+    while True:
+        try:
+            _job = pickle.load(_stdin)
+        except EOFError:
+            break
+        render_plot_job(_job)
+        sys.stdout.flush()
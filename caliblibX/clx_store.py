@@ -0,0 +1,105 @@
+import os, json, time
+import numpy as np
+
+def print_err(msg):
+    print(f"[clx_store] ERROR: {msg}")
+def print_info(msg):
+    print(f"[clx_store] INFO: {msg}")
+def print_warn(msg):
+    print(f"[clx_store] WARNING: {msg}")
+
+store_folder_name = 'scan_results'
+store_index_name  = 'index.json'
+
+# * ---------------------------------------------------------------------------
+# * - brief: per-run container of scan results, one .npy file per array and a
+# * -        json index of the records; records are appended incrementally
+# * -        and the arrays can be memory-mapped for later analysis
+# * ---------------------------------------------------------------------------
+class scan_store:
+    # * - param:
+    # * -   _output_folder: output dump folder of the run, the store is created
+    # * -                   in its scan_results sub-folder (or reopened on resume)
+    # * -   _script_id: id string of the running script
+    def __init__(self, _output_folder, _script_id=None):
+        self.folder     = os.path.join(_output_folder, store_folder_name)
+        self.index_path = os.path.join(self.folder, store_index_name)
+        os.makedirs(self.folder, exist_ok=True)
+        self.index = {'script_id': _script_id, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'records': []}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as index_file:
+                    self.index = json.load(index_file)
+            except Exception as e:
+                print_warn(f"Failed to read store index {self.index_path}, starting a new one: {e}")
+
+    # * - brief: append a record (e.g. one scan round) to the store
+    # * - param:
+    # * -   _name: record name, an existing record with the same name is replaced
+    # * -   _arrays: dict of array-like values (scan values, means, errors, ...)
+    # * -   _attrs: json serializable dict of settings of the record
+    # * - return:
+    # * -   True if the record was written, False otherwise
+    def append(self, _name, _arrays, _attrs=None):
+        _record = {
+            'name'  : _name,
+            'time'  : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'attrs' : _attrs if _attrs is not None else {},
+            'arrays': {}
+        }
+        try:
+            for _key, _val in _arrays.items():
+                if _val is None:
+                    continue
+                _array = np.asarray(_val)
+                _file_name = f'{_name}_{_key}.npy'
+                _file_path = os.path.join(self.folder, _file_name)
+                with open(_file_path + '.tmp', 'wb') as npy_file:
+                    np.save(npy_file, _array)
+                os.replace(_file_path + '.tmp', _file_path)
+                _record['arrays'][_key] = {'file': _file_name, 'shape': list(_array.shape), 'dtype': str(_array.dtype)}
+            _old_record = self.record(_name)
+            if _old_record is not None:
+                for _key, _val in _old_record['arrays'].items():
+                    if _key not in _record['arrays'] and os.path.exists(os.path.join(self.folder, _val['file'])):
+                        os.remove(os.path.join(self.folder, _val['file']))
+            self.index['records'] = [_r for _r in self.index['records'] if _r['name'] != _name] + [_record]
+            with open(self.index_path + '.tmp', 'w') as index_file:
+                json.dump(self.index, index_file, indent=4)
+            os.replace(self.index_path + '.tmp', self.index_path)
+        except Exception as e:
+            print_err(f"Failed to write record {_name} to {self.folder}: {e}")
+            return False
+        return True
+
+    def names(self):
+        return [_r['name'] for _r in self.index['records']]
+
+    def record(self, _name):
+        for _r in self.index['records']:
+            if _r['name'] == _name:
+                return _r
+        return None
+
+    # * - brief: load an array of a record, memory-mapped by default
+    def load(self, _name, _key, _mmap_mode='r'):
+        _record = self.record(_name)
+        if _record is None or _key not in _record['arrays']:
+            print_err(f"No array {_key} in record {_name} of {self.folder}")
+            return None
+        return np.load(os.path.join(self.folder, _record['arrays'][_key]['file']), mmap_mode=_mmap_mode)
+
+# * ---------------------------------------------------------------------------
+# * - brief: open the scan store of a finished run for analysis
+# * - param:
+# * -   _path: output dump folder of the run or its scan_results folder
+# * - return:
+# * -   scan_store, None if the folder holds no store
+# * ---------------------------------------------------------------------------
+def open_scan_store(_path):
+    if os.path.basename(os.path.normpath(_path)) == store_folder_name:
+        _path = os.path.dirname(os.path.normpath(_path))
+    if not os.path.exists(os.path.join(_path, store_folder_name, store_index_name)):
+        print_err(f"No scan store in {_path}")
+        return None
+    return scan_store(_path)
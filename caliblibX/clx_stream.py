@@ -0,0 +1,123 @@
+import sys, socket
+import packetlibX
+
+def print_err(msg):
+    print(f"[clx_stream] ERROR: {msg}", file=sys.stderr)
+def print_info(msg):
+    print(f"[clx_stream] INFO: {msg}", file=sys.stdout)
+def print_warn(msg):
+    print(f"[clx_stream] WARNING: {msg}", file=sys.stdout)
+
+# * ---------------------------------------------------------------------------
+# * - brief: DAQ streaming mode of a udp_target, the DAQ stays armed for the
+# *          whole scan and every measurement only triggers a generator burst
+# * - usage:
+# * -   udp_target.daq_stream = daq_stream(udp_target)
+# * -   udp_target.daq_stream.start()     # after the DAQ/gen parameters are set
+# * -   ... measure_all calls ...          # trigger() / read_burst() / rearm()
+# * -   udp_target.daq_stream.stop()
+# * - the received data is one continuous stream, the bursts are separated
+# *   by timestamp: half packets not newer than the last one of the previous
+# *   burst are late data of that burst and are dropped
+# * ---------------------------------------------------------------------------
+class daq_stream:
+    def __init__(self, _udp_target, _daq_mask=0xFF):
+        self.udp_target     = _udp_target
+        self.daq_mask       = _daq_mask
+        self.active         = False
+        self.last_timestamp = -1
+        self.bursts         = 0
+        self.stale_payloads = 0
+
+    def send_gen(self, _gen_start_stop, _daq_start_stop):
+        return packetlibX.send_daq_gen_start_stop(
+            self.udp_target.cmd_outbound_conn, self.udp_target.board_ip, self.udp_target.board_port,
+            fpga_addr=self.udp_target.board_id, daq_push=0x00,
+            gen_start_stop=_gen_start_stop, daq_start_stop=_daq_start_stop, verbose=False
+        )
+
+    # * - arm the DAQ with the generator stopped
+    def start(self):
+        if not self.send_gen(0, self.daq_mask):
+            print_warn("Failed to arm the DAQ")
+            return False
+        self.drain()
+        self.active         = True
+        self.last_timestamp = -1
+        return True
+
+    # * - stop generator and DAQ, drop what is left in the data connection
+    def stop(self, verbose=True):
+        if not self.active:
+            return
+        if not self.send_gen(0, 0x00):
+            print_warn("Failed to stop the DAQ")
+        self.drain()
+        self.active = False
+        if verbose:
+            print_info(f"DAQ stream stopped after {self.bursts} bursts ({self.stale_payloads} late half packets dropped)")
+            print_info(f"UDP packet counter of the data datagrams: {self.udp_target.data_counter.summary()}")
+
+    # * - timestamps restart after a reset of the board
+    def forget_timestamp(self):
+        self.last_timestamp = -1
+
+    def drain(self):
+        _conn    = self.udp_target.data_data_conn
+        _timeout = _conn.gettimeout()
+        _conn.settimeout(0)
+        try:
+            while True:
+                data_packet = _conn.recvfrom(self.udp_target.data_datagram_size())[0]
+                if len(data_packet) == 0:
+                    break
+                self.udp_target.count_data_datagram(data_packet)
+        except (BlockingIOError, socket.timeout, OSError):
+            pass
+        finally:
+            _conn.settimeout(_timeout)
+
+    # * - start one generator burst, the DAQ is already armed
+    def trigger(self):
+        self.drain()
+        if not self.send_gen(1, self.daq_mask):
+            print_warn("Failed to trigger the generator")
+            return False
+        self.bursts += 1
+        return True
+
+    # * - stop the generator after a burst so that the next trigger() is a
+    # *   start edge again, the DAQ stays armed
+    def rearm(self):
+        if not self.send_gen(0, self.daq_mask):
+            print_warn("Failed to rearm the generator")
+
+    # * ---------------------------------------------------------------------
+    # * - brief: read the half packets of the triggered burst
+    # * - param:
+    # * -   _payload_number: half packets expected in the burst
+    # * - return:
+    # * -   list of 192-byte half packets, shorter than _payload_number if
+    # * -   the data connection timed out before the burst was complete
+    # * ---------------------------------------------------------------------
+    def read_burst(self, _payload_number):
+        _payloads = []
+        _newest   = self.last_timestamp
+        _datagram_size = self.udp_target.data_datagram_size()
+        while len(_payloads) < _payload_number:
+            try:
+                data_packet, _ = self.udp_target.data_data_conn.recvfrom(_datagram_size)
+            except socket.timeout:
+                break
+            if len(data_packet) == 0:
+                break
+            self.udp_target.count_data_datagram(data_packet)
+            for _payload in packetlibX.extract_raw_data(data_packet):
+                _timestamp = int.from_bytes(_payload[16:24], 'big')
+                if _timestamp <= self.last_timestamp:
+                    self.stale_payloads += 1
+                    continue
+                _newest = max(_newest, _timestamp)
+                _payloads.append(_payload)
+        self.last_timestamp = _newest
+        return _payloads
@@ -9,6 +9,14 @@ def print_info(msg):
 def print_warn(msg):
     print(f"[clx_udp] WARNING: {msg}", file=sys.stdout)
 
+# pool connection kept open by a calibration worker (see clx_worker), targets
+# of the same board created by the jobs it runs reuse it in connect_to_pool
+shared_pool_target = None
+
+def share_pool_connection(_udp_target):
+    global shared_pool_target
+    shared_pool_target = _udp_target
+
 # * ---------------------------------------------------------------------------
 # * - brief: class to hold UDP connection settings
 # * ---------------------------------------------------------------------------
@@ -22,7 +30,19 @@ class udp_target:
         # extract board_id from ip by minus 208 from last octet
         self.board_id      = int(board_ip.split('.')[-1]) - 208
 
-        self.pool_conn_setup = False
+        self.pool_conn_setup  = False
+        self.pool_conn_shared = False
+        self.capture_writer   = None
+        # last value written to each (asic, register key), None to disable,
+        # used by send_register_calib to skip writes of unchanged registers
+        self.register_image   = None
+        # daq_stream keeping the DAQ armed between measurements, None to
+        # start and stop the DAQ in every measure_all call
+        self.daq_stream       = None
+        # udp packet counter of the data datagrams (packetlibX.counter_tracker)
+        self.data_counter     = packetlibX.counter_tracker()
+        # jumbo_en of the last DAQ configuration, sets the data datagram size
+        self.jumbo_en         = 0
 
     def load_udp_json(self, json_dict):
         try:
@@ -64,6 +84,9 @@ class udp_target:
         self.data_host    = json_dict["data_host"]
         self.data_port    = json_dict["data_port"]
         self.buffer_size  = json_dict["buffer_size"]
+        # kernel buffers of the pool connections, None for the system default
+        self.rcvbuf       = json_dict.get("rcvbuf")
+        self.sndbuf       = json_dict.get("sndbuf")
 
     def load_pool_json_file(self, json_path):
         try:
@@ -73,21 +96,131 @@ class udp_target:
         except Exception as e:
             print_err(f"Failed to load pool settings from JSON file: {e}")
 
+    def same_board(self, other):
+        return self.board_ip == other.board_ip and self.board_port == other.board_port and self.pc_ip == other.pc_ip \
+            and self.pc_port_cmd == other.pc_port_cmd and self.pc_port_data == other.pc_port_data
+
     def connect_to_pool(self, timeout=2.0):
+        if shared_pool_target is not None and shared_pool_target is not self and shared_pool_target.pool_conn_setup and self.same_board(shared_pool_target):
+            self.adopt_pool_connection(shared_pool_target, timeout)
+            return
         self.worker_id = str(uuid.uuid4())
         try:
             self.ctrl_conn, self.data_cmd_conn, self.data_data_conn, self.cmd_outbound_conn, self.pool_do = init_worker_sockets(self.worker_id, self.board_ip, self.pc_ip, self.control_host, self.control_port, self.data_host, self.data_port, self.pc_port_cmd, self.pc_port_data, timeout)
         except Exception as e:
             print_err(f"Failed to connect to pool: {e}")
 
+        self.set_socket_buffers()
+
         self.pool_do("register", "cmd",  self.pc_port_cmd)
         self.pool_do("register", "data", self.pc_port_data)
 
         self.pool_conn_setup = True
 
+    # * - the data connection takes whole bursts forwarded by the pool, the
+    # *   command socket sends the register writes
+    def set_socket_buffers(self):
+        rcvbuf = getattr(self, 'rcvbuf', None)
+        sndbuf = getattr(self, 'sndbuf', None)
+        try:
+            if rcvbuf:
+                packetlibX.set_socket_buffer(self.data_data_conn, rcvbuf, socket.SO_RCVBUF)
+            if sndbuf:
+                packetlibX.set_socket_buffer(self.cmd_outbound_conn, sndbuf, socket.SO_SNDBUF)
+        except Exception as e:
+            print_warn(f"Failed to set the socket buffers: {e}")
+            return
+        if rcvbuf or sndbuf:
+            print_info(f"Data connection rcvbuf {packetlibX.socket_buffer_sizes(self.data_data_conn)[0]} B, command socket sndbuf {packetlibX.socket_buffer_sizes(self.cmd_outbound_conn)[1]} B")
+
+    # * - use the open pool connection and register image of another target,
+    # *   the connection stays registered when this target is deleted
+    def adopt_pool_connection(self, other, timeout=2.0):
+        self.worker_id         = other.worker_id
+        self.ctrl_conn         = other.ctrl_conn
+        self.data_cmd_conn     = other.data_cmd_conn
+        self.data_data_conn    = other.data_data_conn
+        self.cmd_outbound_conn = other.cmd_outbound_conn
+        self.pool_do           = other.pool_do
+        self.register_image    = other.register_image
+        self.data_counter      = other.data_counter
+        self.jumbo_en          = other.jumbo_en
+        for _conn in (self.ctrl_conn, self.data_cmd_conn, self.data_data_conn, self.cmd_outbound_conn):
+            _conn.settimeout(timeout)
+        # drop what is left from the previous user of the connection
+        for _conn in (self.data_cmd_conn, self.data_data_conn):
+            _conn.setblocking(False)
+            try:
+                while len(_conn.recv(65536)) > 0:
+                    pass
+            except (BlockingIOError, socket.timeout, OSError):
+                pass
+            _conn.settimeout(timeout)
+        self.pool_conn_setup  = True
+        self.pool_conn_shared = True
+        print_info(f"Using the open pool connection of worker {self.worker_id}")
+
+    # * - udp packet counters of every board and port seen by the pool
+    def pool_stats(self):
+        if not self.pool_conn_setup:
+            print_err("Cannot query the pool before connecting to it")
+            return None
+        try:
+            self.ctrl_conn.send(json.dumps({"action": "stats", "worker_id": self.worker_id}).encode())
+            return json.loads(self.ctrl_conn.recv(65536).decode())
+        except Exception as e:
+            print_err(f"Failed to query the pool statistics: {e}")
+            return None
+
+    # * - size of the data datagrams with the current DAQ configuration
+    def data_datagram_size(self):
+        return packetlibX.data_datagram_size(getattr(self, 'jumbo_en', 0))
+
+    # * - account the udp packet counter of a received data datagram
+    def count_data_datagram(self, data_packet):
+        return self.data_counter.update_datagram(data_packet, int(self.board_ip.split('.')[-1]) & 0xFF)
+
+    # * - record every datagram received on the data connection into a
+    # *   capture file (see packetlibX.capture_writer), call after connect_to_pool
+    def start_capture(self, capture_path):
+        if not self.pool_conn_setup:
+            print_err("Cannot start capture before connecting to the pool")
+            return False
+        self.stop_capture()
+        try:
+            self.capture_writer = packetlibX.capture_writer(capture_path)
+        except Exception as e:
+            print_err(f"Failed to open capture file {capture_path}: {e}")
+            return False
+        self.data_data_conn = packetlibX.capture_socket(self.data_data_conn, self.capture_writer)
+        print_info(f"Capturing data datagrams to {capture_path}")
+        return True
+
+    def stop_capture(self):
+        if self.capture_writer is None:
+            return
+        self.data_data_conn = self.data_data_conn.sock
+        self.capture_writer.close()
+        print_info(f"Captured {self.capture_writer.records} datagrams ({self.capture_writer.bytes} bytes) to {self.capture_writer.path}")
+        self.capture_writer = None
+
+    # * - replay a capture file instead of the pool, the generator start
+    # *   requests of measure_all release the captured bursts one by one
+    def connect_to_replay(self, capture_path, burst_gap=packetlibX.capture_default_gap, loop=False):
+        self.replay_conn = packetlibX.replay_socket(capture_path, burst_gap=burst_gap, loop=loop)
+        if self.replay_conn.data is None:
+            print_err(f"Failed to open capture file {capture_path}")
+            return False
+        self.cmd_outbound_conn = self.replay_conn
+        self.data_data_conn    = self.replay_conn
+        print_info(f"Replaying {len(self.replay_conn.records)} datagrams from {capture_path}")
+        return True
+
     # make sure the connection is closed when the object is deleted
     def __del__(self):
-        if self.pool_conn_setup:
+        if self.capture_writer is not None:
+            self.stop_capture()
+        if self.pool_conn_setup and not self.pool_conn_shared:
             self.pool_do("unregister", "cmd",  self.pc_port_cmd)
             self.pool_do("unregister", "data", self.pc_port_data)
             try:
@@ -166,7 +299,7 @@ def init_worker_sockets(
     )
 
     # Send hello frames
-    hello_data = {"action": "hello", "worker_id": worker_id, "direction": "data"}
+    hello_data = {"action": "hello", "worker_id": worker_id, "direction": "data", "framing": "length"}
     hello_cmd  = {"action": "hello", "worker_id": worker_id, "direction": "cmd"}
 
     data_cmd_conn.send(json.dumps(hello_cmd).encode())
@@ -185,4 +318,5 @@ def init_worker_sockets(
         resp = json.loads(ctrl_conn.recv(1024).decode())
         return resp
 
-    return ctrl_conn, data_cmd_conn, data_data_conn, cmd_outbound_conn, pool_do
\ No newline at end of file
+    # the data datagrams come length-prefixed, see packetlibX.framed_socket
+    return ctrl_conn, data_cmd_conn, packetlibX.framed_socket(data_data_conn), cmd_outbound_conn, pool_do
\ No newline at end of file
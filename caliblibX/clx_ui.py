@@ -26,6 +26,7 @@ from pathlib import Path
 
 from caliblibX.clx_ui_messager import *
 from caliblibX.clx_ui_file_picker import FilePicker, FolderPicker
+from caliblibX.clx_worker import calib_worker_client, calib_job
 
 from caliblibX.clx_ui_201 import Page_201
 from caliblibX.clx_ui_202 import Page_202
@@ -228,6 +229,9 @@ class FpgaPanel(Static):
         self.page203_init_dict = None
         self.page204_init_dict = None
 
+        # long-lived worker running the calibration scripts of this FPGA
+        self.calib_worker = calib_worker_client(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
         if initial_dict:
             self.load_from_dict(initial_dict)
 
@@ -300,6 +304,9 @@ class FpgaPanel(Static):
             self.on_list_view_selected(ListView.Selected(menu, menu.children[0], 0))
         return super()._on_mount(event)
 
+    async def on_unmount(self) -> None:
+        await self.calib_worker.stop()
+
     def on_list_view_selected(self, event: ListView.Selected) -> None:
         """When user selects from the left list, switch the right content."""
         menu_id = f"{self.fpga_id}-menu"
@@ -315,6 +322,10 @@ class FpgaPanel(Static):
         switcher = self.query_one(f"#{self.fpga_id}-content", ContentSwitcher)
         switcher.current = page_id
 
+    async def run_calib_job(self, argv: list[str]) -> calib_job:
+        """Run a calibration script on the worker of this FPGA (or as a subprocess)."""
+        return await self.calib_worker.run(argv, self.udp_config_file)
+
     def get_202_output_files(self) -> list[str]:
         """Get the list of output files generated by the pedestal scan."""
         page202 = self.query_one(Page_202)
@@ -29,6 +29,8 @@ from pathlib import Path
 
 from caliblibX.clx_ui_messager import *
 from caliblibX.clx_ui_file_picker import FilePicker, FolderPicker
+from caliblibX.clx_ui_log import LogSink
+from caliblibX.clx_worker import calib_job
 
 # ! === 202 PedestalX Page =====================================================
 class Page_202(Static):
@@ -112,7 +114,7 @@ class Page_202(Static):
             self.load_from_dict(initial_dict)
 
         self.process_running: bool = False
-        self.process: asyncio.subprocess.Process | None = None
+        self.process: calib_job | None = None
 
     def save_to_dict(self) -> dict:
         """Save current settings to a dictionary."""
@@ -345,47 +347,38 @@ class Page_202(Static):
 
         log.write_line(f"▶ Running command: {self.run_cmd}")
 
-        self.process = await asyncio.create_subprocess_exec(
-            *self.run_cmd.split(),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-        )
+        self.process = await self.parent_panel.run_calib_job(self.run_cmd.split())
+        log_sink = LogSink(log)
 
         self.running_output_unordered_list = []
         self.running_output_unordered_asic = []
 
-        async def read_stream(stream):
-            
+        async def read_events(job):
+            # events are applied in batches, one per frame
             while True:
-                line = await stream.readline()
-                if not line:
+                events = await job.next_events()
+                if events is None:
                     break
-                text = line.decode(errors="ignore").rstrip("\n")
-                # if the line starts with "ui_progress:", update the progress bar
-                if text.startswith("ui_progress:"):
-                    try:
-                        progress_payload = text.split(":", 1)[1].strip().rstrip("%")
-                        progress_value = int(progress_payload)
-                        progress_bar = self.query_one("#pedestal-progress-bar", ProgressBar)
-                        bounded_value = max(0, min(progress_bar.total, progress_value))
-                        progress_bar.update(progress=bounded_value)
-                    except (IndexError, ValueError):
-                        pass
-                # print(f"- Saved final I2C settings for ASIC {_asic} to {output_i2c_path}")
-                elif text.startswith("- Saved final I2C settings for ASIC"):
-                    try:
-                        parts = text.split(" ")
-                        _asic = parts[7]
-                        output_i2c_path = parts[9]
-                        self.running_output_unordered_asic.append(int(_asic))
-                        self.running_output_unordered_list.append(output_i2c_path)
-                        # self.notify(f"Pedestal output for ASIC {_asic} saved to {output_i2c_path}", severity="info")
-                    except (IndexError, ValueError):
-                        pass
-                else:
-                    log.write_line(text)
+                lines = []
+                progress_value = None
+                for event in events:
+                    if event["event"] == "line":
+                        lines.append(event["text"])
+                    elif event["event"] == "progress":
+                        progress_value = event["value"]
+                    elif event["event"] == "output_file":
+                        self.running_output_unordered_asic.append(event["asic"])
+                        self.running_output_unordered_list.append(event["path"])
+                    elif event["event"] == "timing":
+                        lines.append(f"⏱ {event['name']}: {event['seconds']:.1f} s")
+                log_sink.write_lines(lines)
+                if progress_value is not None:
+                    progress_bar = self.query_one("#pedestal-progress-bar", ProgressBar)
+                    bounded_value = max(0, min(progress_bar.total, progress_value))
+                    progress_bar.update(progress=bounded_value)
 
-        await read_stream(self.process.stdout)
+        await read_events(self.process)
+        log_sink.close()
 
         rc = await self.process.wait()
 
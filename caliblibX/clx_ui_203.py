@@ -23,6 +23,8 @@ from textual.containers import Horizontal, Vertical, Center, Middle
 
 from caliblibX.clx_ui_messager import *
 from caliblibX.clx_ui_file_picker import FilePicker, FolderPicker
+from caliblibX.clx_ui_log import LogSink
+from caliblibX.clx_worker import calib_job
 
 class Page_203(Static):
     """Page for 203_ToAX script."""
@@ -126,7 +128,7 @@ class Page_203(Static):
             self.load_from_dict(initial_dict)
 
         self.process_running: bool = False
-        self.process: asyncio.subprocess.Process | None = None
+        self.process: calib_job | None = None
 
     def save_to_dict(self) -> dict:
         """Save current settings to a dictionary."""
@@ -306,63 +308,50 @@ class Page_203(Static):
 
         log.write_line(f"▶ Running command: {self.run_cmd}")
 
-        self.process = await asyncio.create_subprocess_exec(
-            *self.run_cmd.split(),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-        )
+        self.process = await self.parent_panel.run_calib_job(self.run_cmd.split())
+        log_sink = LogSink(log)
 
         self.running_output_unordered_list = []
         self.running_output_unordered_asic = []
 
-        async def read_stream(stream):
-            
+        async def read_events(job):
+            # events are applied in batches, one per frame
             while True:
-                line = await stream.readline()
-                if not line:
+                events = await job.next_events()
+                if events is None:
                     break
-                text = line.decode(errors="ignore").rstrip("\n")
-                # if the line starts with "ui_progress:", update the progress bar
-                if text.startswith("ui_progress:"):
-                    try:
-                        progress_payload = text.split(":", 1)[1].strip().rstrip("%")
-                        progress_value = int(progress_payload)
-                        progress_bar = self.query_one("#toa-progress-bar", ProgressBar)
-                        bounded_value = max(0, min(progress_bar.total, progress_value))
-                        progress_bar.update(progress=bounded_value)
-                    except (IndexError, ValueError):
-                        pass
-                # print(f"ui_asic{_asic}: " + " ".join([f"{int(x):3d}" for x in toa_turn_on_asic_valid]))
-                elif text.startswith("ui_asic"):
-                    try:
-                        asic_values_str = text.split(":", 1)[1].strip()
-                        asic_values = asic_values_str.split(" ") 
-                        asic_index_str = text.split("ui_asic",1)[1].split(":",1)[0].strip()
-                        asic_index = int(asic_index_str)
+                lines = []
+                progress_value = None
+                for event in events:
+                    if event["event"] == "line":
+                        lines.append(event["text"])
+                    elif event["event"] == "progress":
+                        progress_value = event["value"]
+                    elif event["event"] == "asic_values" and event["name"] == "toa_turn_on":
+                        asic_values = [x for x in event["values"] if x >= 0]
+                        if not asic_values:
+                            continue
+                        asic_index = event["asic"]
                         # load to sparkline
                         sparkline = self.query_one(f"#toa_sparkline_asic{asic_index}", Sparkline)
-                        sparkline.data = [int(x) for x in asic_values if x.strip().isdigit()]
+                        sparkline.data = asic_values
                         # update sparkline label
-                        max_value = max([int(x) for x in asic_values if x.strip().isdigit()])
-                        min_value = min([int(x) for x in asic_values if x.strip().isdigit()])
                         sparkline_label = self.query_one(f"#toa_sparkline_grid_asic{asic_index} > .value_label", Label)
-                        sparkline_label.update(f"ASIC {asic_index} ToA ({min_value}-{max_value}):")
-                    except (IndexError, ValueError):
-                        pass
-                elif text.startswith("- Saved final I2C settings for ASIC"):
-                    try:
-                        parts = text.split(" ")
-                        _asic = parts[7]
-                        output_i2c_path = parts[9]
-                        self.running_output_unordered_asic.append(int(_asic))
-                        self.running_output_unordered_list.append(output_i2c_path)
-                        self.notify(f"Pedestal output for ASIC {_asic} saved to {output_i2c_path}", severity="info")
-                    except (IndexError, ValueError):
-                        pass
-                else:
-                    log.write_line(text)
+                        sparkline_label.update(f"ASIC {asic_index} ToA ({min(asic_values)}-{max(asic_values)}):")
+                    elif event["event"] == "output_file":
+                        self.running_output_unordered_asic.append(event["asic"])
+                        self.running_output_unordered_list.append(event["path"])
+                        self.notify(f"ToA output for ASIC {event['asic']} saved to {event['path']}", severity="info")
+                    elif event["event"] == "timing":
+                        lines.append(f"⏱ {event['name']}: {event['seconds']:.1f} s")
+                log_sink.write_lines(lines)
+                if progress_value is not None:
+                    progress_bar = self.query_one("#toa-progress-bar", ProgressBar)
+                    bounded_value = max(0, min(progress_bar.total, progress_value))
+                    progress_bar.update(progress=bounded_value)
 
-        await read_stream(self.process.stdout)
+        await read_events(self.process)
+        log_sink.close()
 
         rc = await self.process.wait()
 
@@ -0,0 +1,60 @@
+from collections import deque
+from textual.widgets import Log
+
+# ! === Throttled Log Sink ====================================================
+class LogSink:
+    """Buffers lines for a Log widget and writes them at a fixed frame rate.
+
+    At most `max_lines` lines are kept between two frames, older ones are
+    dropped. Consecutive repeats of a line are collapsed into one line with
+    a repeat count. Dropped and collapsed lines are counted in `suppressed`.
+    """
+
+    def __init__(self, log: Log, fps: float = 20, max_lines: int = 500) -> None:
+        self.log = log
+        self.pending: deque[str] = deque(maxlen=max_lines)
+        self.last_line: str | None = None
+        self.repeats = 0
+        self.dropped = 0
+        self.suppressed = 0
+        self.timer = log.set_interval(1 / fps, self.flush)
+
+    def write(self, line: str) -> None:
+        if line == self.last_line:
+            self.repeats += 1
+            return
+        self._close_repeats()
+        self._append(line)
+        self.last_line = line
+
+    def write_lines(self, lines: list[str]) -> None:
+        for line in lines:
+            self.write(line)
+
+    def _append(self, line: str) -> None:
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+            self.suppressed += 1
+        self.pending.append(line)
+
+    def _close_repeats(self) -> None:
+        if self.repeats > 0:
+            self._append(f"  ↑ repeated {self.repeats} more time{'s' if self.repeats > 1 else ''}")
+            self.suppressed += self.repeats
+            self.repeats = 0
+
+    def flush(self) -> None:
+        """Write the pending lines to the Log widget, called once per frame."""
+        self._close_repeats()
+        if self.dropped > 0:
+            self.log.write_line(f"… {self.dropped} lines suppressed ({self.suppressed} in total)")
+            self.dropped = 0
+        if self.pending:
+            self.log.write_lines(list(self.pending))
+            self.pending.clear()
+
+    def close(self) -> None:
+        """Stop the frame timer and write what is left."""
+        self.timer.stop()
+        self.flush()
+        self.last_line = None
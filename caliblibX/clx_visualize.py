@@ -1,6 +1,4 @@
-from matplotlib import pyplot as plt
 import numpy as np
-import pandas as pd
 from .clx_data import channel_list_remove_cm_calib, single_channel_index_remove_cm_calib
 
 # light background colors for at most 16 halves
@@ -62,6 +60,7 @@ def print_adc_to_terminal(adc_values_mean, adc_values_err, channel_nums = [3, 4,
 # * -   fig, ax: matplotlib figure and axis objects
 # * ---------------------------------------------------------------------------
 def plot_channel_adc(adc_mean_list, adc_err_list, info_str, dead_channels=[], halves_target=[]):
+    from matplotlib import pyplot as plt
     fig, ax = plt.subplots(1, 1, figsize=(12, 9))
 
     asic_num = int(len(adc_mean_list) / 76)
@@ -117,9 +116,61 @@ def plot_channel_adc(adc_mean_list, adc_err_list, info_str, dead_channels=[], ha
     )
     return fig, ax
 
+# * ---------------------------------------------------------------------------
+# * - brief: plot the half-wise average adc of an inverted reference voltage scan
+# * - param:
+# * -   vref_list: [halves][points] inv_vref settings, nan if not measured
+# * -   adc_avg_list: [halves][points] average adc of the half
+# * -   adc_err_list: [halves][points] error of the average adc
+# * -   best_inv_vref: [halves] chosen inv_vref, drawn as vertical lines
+# * -   target: target adc value, drawn as horizontal line
+# * -   title: plot title
+# * ---------------------------------------------------------------------------
+def plot_inv_vref_scan(vref_list, adc_avg_list, adc_err_list, best_inv_vref, target, title):
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(1, 1, figsize=(10, 6))
+    for _half in range(len(vref_list)):
+        _measured = ~np.isnan(vref_list[_half, :])
+        _order = np.argsort(vref_list[_half, _measured])
+        ax.errorbar(
+            vref_list[_half, _measured][_order],
+            adc_avg_list[_half, _measured][_order],
+            yerr=adc_err_list[_half, _measured][_order],
+            marker='.',
+            label=f'Half {_half}'
+        )
+        # draw the best point as a vertical line
+        ax.axvline(x=best_inv_vref[_half], color='r', linestyle='--', alpha=0.5)
+    ax.axhline(y=target, color='gray', linestyle=':', alpha=0.5)
+    ax.set_title(title)
+    ax.set_xlabel('Inverted Reference Voltage Setting')
+    ax.set_ylabel('Average ADC Value')
+    ax.legend()
+    fig.tight_layout()
+    return fig, ax
+
+# * ---------------------------------------------------------------------------
+# * - brief: histogram of the channel rms used for the dead channel search
+# * ---------------------------------------------------------------------------
+def plot_channel_rms(rms_values, threshold):
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(1, 1, figsize=(8, 5))
+    ax.hist(rms_values, bins=50, color='blue', alpha=0.7)
+    ax.axvline(x=threshold, color='r', linestyle='--', label='Dead Channel Threshold')
+    ax.set_title('Channel RMS Distribution from Inverted Vref Scan')
+    ax.set_xlabel('Channel RMS')
+    ax.set_ylabel('Number of Channels')
+    ax.legend()
+    return fig, ax
+
 def Draw2DIM(_title, _x_label, _y_label, _total_asic, _data, _saving_path, _y_ticks=None, _turn_on_points=None, _data_saving_path=None, _image_saving_path=None):
+    from matplotlib import pyplot as plt
     if _data_saving_path is not None:
-        pd.DataFrame(_data).to_csv(_data_saving_path, index=False, header=False)
+        if _data_saving_path.endswith('.npy'):
+            np.save(_data_saving_path, np.asarray(_data))
+        else:
+            import pandas as pd
+            pd.DataFrame(_data).to_csv(_data_saving_path, index=False, header=False)
 
     fig, ax = plt.subplots(figsize=(10, 6))
     cax = ax.imshow(_data, aspect='auto', cmap='viridis', interpolation='nearest')
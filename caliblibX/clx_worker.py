@@ -0,0 +1,377 @@
+import os, sys, json, time, runpy, socket, asyncio, threading, traceback, contextlib
+from collections import deque
+from .clx_events import set_event_sink, event_fd_env
+from .clx_plot_worker import join_plot_workers
+
+def print_err(msg):
+    print(f"[clx_worker] ERROR: {msg}", file=sys.stderr)
+def print_info(msg):
+    print(f"[clx_worker] INFO: {msg}", file=sys.stdout)
+def print_warn(msg):
+    print(f"[clx_worker] WARNING: {msg}", file=sys.stdout)
+
+# scripts a calibration worker runs, relative to the repository folder
+calib_worker_script     = '106_CalibWorker.py'
+calib_worker_jobs       = ['201_IODelayX.py', '202_PedestalCalibX.py', '203_ToACalibX.py', '204_ToTCalibX.py']
+calib_worker_port_line  = 'calib_worker_port:'
+calib_worker_start_timeout = 10.0
+calib_worker_plot_timeout  = 60.0  # s, for the plots left by a job
+
+# * - file-like object replacing stdout/stderr of a job, every complete line
+# *   is sent to the client as a line event
+class event_stream:
+    def __init__(self, _send):
+        self.send   = _send
+        self.buffer = ''
+        self.lock   = threading.Lock()
+
+    def write(self, _text):
+        with self.lock:
+            self.buffer += _text
+            while '\n' in self.buffer:
+                _line, self.buffer = self.buffer.split('\n', 1)
+                self.send({'event': 'line', 'text': _line})
+        return len(_text)
+
+    def flush(self):
+        pass
+
+    def flush_line(self):
+        with self.lock:
+            if self.buffer != '':
+                self.send({'event': 'line', 'text': self.buffer})
+                self.buffer = ''
+
+    def isatty(self):
+        return False
+
+# * ---------------------------------------------------------------------------
+# * - brief: long-lived calibration worker of one FPGA; keeps the pool
+# * -        connection of its udp_target and runs the calibration scripts
+# * -        in-process on request, so a rerun does not pay for the
+# * -        interpreter start, the imports and the pool connection; the
+# * -        register image is cleared at the start of every job (the board
+# * -        may have been changed by another run in between) and only skips
+# * -        unchanged writes within the job
+# * - protocol: JSON lines over a local TCP connection, one request per line
+# * -   {'action': 'run', 'script': '202_PedestalCalibX.py', 'args': [...]}
+# * -       -> {'event': 'started'}, the output lines of the script as
+# * -          {'event': 'line'}, its UI events (see clx_events) and
+# * -          {'event': 'finished', 'code': rc, 'time': s}
+# * -   {'action': 'ping'}             -> {'event': 'pong', ...}
+# * -   {'action': 'forget_registers'} -> {'event': 'done'}
+# * -   {'action': 'shutdown'}         -> {'event': 'done'}
+# * - param:
+# * -   _udp_target: udp_target connected to the pool, shared with the jobs
+# * -   _script_folder: folder of the calibration scripts
+# * -   _host, _port: local address to listen on, port 0 picks a free port
+# * ---------------------------------------------------------------------------
+class calib_worker:
+    def __init__(self, _udp_target, _script_folder, _host='127.0.0.1', _port=0):
+        self.udp_target    = _udp_target
+        self.script_folder = _script_folder
+        self.running       = True
+        self.jobs_done     = 0
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((_host, _port))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+
+    def serve_forever(self):
+        while self.running:
+            conn, _ = self.server.accept()
+            with conn:
+                self.handle(conn)
+        self.server.close()
+
+    def handle(self, _conn):
+        _file = _conn.makefile('rwb')
+
+        def send(_event):
+            try:
+                _file.write((json.dumps(_event) + '\n').encode())
+                _file.flush()
+            except (OSError, ValueError):
+                pass
+
+        for _raw in _file:
+            try:
+                _request = json.loads(_raw.decode())
+                _action  = _request.get('action', '')
+            except (ValueError, AttributeError):
+                send({'event': 'error', 'text': 'Invalid request'})
+                continue
+            if _action == 'run':
+                self.run_job(_request.get('script', ''), _request.get('args', []), send)
+            elif _action == 'ping':
+                _image = self.udp_target.register_image
+                send({'event': 'pong', 'jobs': self.jobs_done, 'registers': len(_image) if _image is not None else 0})
+            elif _action == 'forget_registers':
+                if self.udp_target.register_image is not None:
+                    self.udp_target.register_image.clear()
+                send({'event': 'done'})
+            elif _action == 'shutdown':
+                self.running = False
+                send({'event': 'done'})
+                return
+            else:
+                send({'event': 'error', 'text': f'Unknown action {_action}'})
+
+    def run_job(self, _script, _args, _send):
+        if _script not in calib_worker_jobs:
+            _send({'event': 'error', 'text': f'Unknown calibration script {_script}'})
+            _send({'event': 'finished', 'code': 2, 'time': 0.0})
+            return
+        _script_path = os.path.join(self.script_folder, _script)
+        _stream = event_stream(_send)
+        _argv   = sys.argv
+        _code   = 0
+        if self.udp_target.register_image is not None:
+            self.udp_target.register_image.clear()
+        _send({'event': 'started', 'script': _script})
+        _start  = time.perf_counter()
+        sys.argv = [_script_path] + [str(_arg) for _arg in _args]
+        set_event_sink(_send)
+        try:
+            with contextlib.redirect_stdout(_stream), contextlib.redirect_stderr(_stream):
+                try:
+                    runpy.run_path(_script_path, run_name='__main__')
+                except SystemExit as e:
+                    _code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception:
+                    traceback.print_exc()
+                    _code = 1
+                finally:
+                    # atexit does not run between jobs, finish the plots the
+                    # job did not join itself
+                    join_plot_workers(calib_worker_plot_timeout)
+        finally:
+            sys.argv = _argv
+            set_event_sink(None)
+        _stream.flush_line()
+        self.jobs_done += 1
+        _send({'event': 'finished', 'code': _code, 'time': round(time.perf_counter() - _start, 3)})
+
+# * - exit the worker when the process that started it is gone
+def exit_with_parent(_interval=1.0):
+    _parent_pid = os.getppid()
+    def watch():
+        while os.getppid() == _parent_pid:
+            time.sleep(_interval)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+# * ---------------------------------------------------------------------------
+# * - brief: a calibration run started from the UI, either a job of the
+# * -        calibration worker or a plain subprocess (human output on stdout,
+# * -        UI events on the pipe given in CLX_EVENT_FD); next_event returns
+# * -        the events of the run and None at its end, like a process it has
+# * -        returncode, wait() and kill()
+# * ---------------------------------------------------------------------------
+class calib_job:
+    frame_interval = 1 / 30     # s, batching interval of next_events
+
+    def __init__(self, _worker=None, _process=None):
+        self.worker     = _worker
+        self.process    = _process
+        self.writer     = None
+        self.returncode = None
+        self.killed     = False
+        self.ended      = False
+        self.events     = asyncio.Queue()
+        self.task       = None
+
+    def open_worker(self, _reader, _writer):
+        self.writer = _writer
+        self.task   = asyncio.create_task(self.feed_worker(_reader))
+
+    async def open_process(self, _event_fd):
+        _event_reader = asyncio.StreamReader()
+        await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(_event_reader), os.fdopen(_event_fd, 'rb'))
+        self.task = asyncio.create_task(self.feed_process(_event_reader))
+
+    async def feed_events(self, _reader):
+        while True:
+            try:
+                _line = await _reader.readline()
+            except (ConnectionError, OSError):
+                _line = b''
+            if not _line:
+                return
+            try:
+                _event = json.loads(_line.decode())
+            except ValueError:
+                continue
+            await self.events.put(_event)
+            if _event.get('event') == 'finished':
+                # the worker keeps the connection open for further requests
+                self.returncode = _event.get('code', 1)
+                return
+
+    async def feed_lines(self, _stream):
+        while True:
+            _line = await _stream.readline()
+            if not _line:
+                return
+            await self.events.put({'event': 'line', 'text': _line.decode(errors='ignore').rstrip('\n')})
+
+    async def feed_worker(self, _reader):
+        await self.feed_events(_reader)
+        if self.returncode is None:
+            # worker gone before the end of the job
+            self.returncode = -9 if self.killed else 1
+        self.worker.busy = False
+        self.writer.close()
+        await self.events.put(None)
+
+    async def feed_process(self, _event_reader):
+        await asyncio.gather(self.feed_lines(self.process.stdout), self.feed_events(_event_reader))
+        self.returncode = await self.process.wait()
+        await self.events.put(None)
+
+    async def next_event(self):
+        if self.ended:
+            return None
+        _event = await self.events.get()
+        if _event is None:
+            self.ended = True
+        return _event
+
+    # * - all events that arrived within one frame, None at the end of the run
+    async def next_events(self):
+        _event = await self.next_event()
+        if _event is None:
+            return None
+        await asyncio.sleep(self.frame_interval)
+        _events = [_event]
+        while not self.events.empty():
+            _event = self.events.get_nowait()
+            if _event is None:
+                # keep the end for the next call
+                self.events.put_nowait(None)
+                break
+            _events.append(_event)
+        return _events
+
+    async def wait(self):
+        while await self.next_event() is not None:
+            pass
+        return self.returncode
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+        else:
+            # an in-process job cannot be interrupted, restart the worker
+            self.killed = True
+            self.worker.kill()
+
+# * ---------------------------------------------------------------------------
+# * - brief: UI side of the calibration worker of one FPGA; the worker is
+# * -        started on the first run and restarted when the UDP config
+# * -        changes, runs fall back to a subprocess if it is not available
+# * ---------------------------------------------------------------------------
+class calib_worker_client:
+    def __init__(self, _script_folder='.'):
+        self.script_folder = _script_folder
+        self.process     = None
+        self.port        = None
+        self.config_file = None
+        self.busy        = False
+        self.output      = deque(maxlen=100)
+        self.drain_task  = None
+
+    def is_running(self):
+        return self.process is not None and self.process.returncode is None and self.port is not None
+
+    async def start(self, _config_file):
+        await self.stop()
+        _cmd = [sys.executable, '-u', os.path.join(self.script_folder, calib_worker_script), '--port', '0']
+        if _config_file:
+            _cmd += ['-c', _config_file]
+        self.config_file = _config_file
+        try:
+            self.process = await asyncio.create_subprocess_exec(*_cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+            while self.port is None:
+                _line = await asyncio.wait_for(self.process.stdout.readline(), calib_worker_start_timeout)
+                if not _line:
+                    break
+                _text = _line.decode(errors='ignore').rstrip('\n')
+                self.output.append(_text)
+                if _text.startswith(calib_worker_port_line):
+                    self.port = int(_text.split(':', 1)[1])
+        except (OSError, ValueError, asyncio.TimeoutError):
+            pass
+        if self.port is None:
+            self.kill()
+            return False
+        self.drain_task = asyncio.create_task(self.drain(self.process))
+        return True
+
+    async def drain(self, _process):
+        # output of the worker between jobs (pool connection, errors)
+        while True:
+            _line = await _process.stdout.readline()
+            if not _line:
+                break
+            self.output.append(_line.decode(errors='ignore').rstrip('\n'))
+
+    # * - param:
+    # * -   _argv: command line of the calibration script
+    # * -          (e.g. python3 -u ./202_PedestalCalibX.py --ui -t 100)
+    # * -   _config_file: UDP config file of the FPGA
+    # * - return:
+    # * -   calib_job of the run
+    async def run(self, _argv, _config_file):
+        _scripts = [_arg for _arg in _argv if _arg.endswith('.py')]
+        if len(_scripts) > 0 and os.path.basename(_scripts[0]) in calib_worker_jobs and not self.busy:
+            if not self.is_running() or _config_file != self.config_file:
+                await self.start(_config_file)
+            if self.is_running():
+                try:
+                    _reader, _writer = await asyncio.open_connection('127.0.0.1', self.port)
+                    _request = {'action': 'run', 'script': os.path.basename(_scripts[0]), 'args': _argv[_argv.index(_scripts[0]) + 1:]}
+                    _writer.write((json.dumps(_request) + '\n').encode())
+                    await _writer.drain()
+                    self.busy = True
+                    _job = calib_job(_worker=self)
+                    _job.open_worker(_reader, _writer)
+                    return _job
+                except OSError:
+                    self.kill()
+        _event_fd, _event_write_fd = os.pipe()
+        try:
+            _process = await asyncio.create_subprocess_exec(*_argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                pass_fds=(_event_write_fd,), env=dict(os.environ, **{event_fd_env: str(_event_write_fd)}))
+        finally:
+            os.close(_event_write_fd)
+        _job = calib_job(_process=_process)
+        await _job.open_process(_event_fd)
+        return _job
+
+    def kill(self):
+        if self.process is not None and self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        self.process = None
+        self.port    = None
+        self.busy    = False
+
+    async def stop(self, _timeout=2.0):
+        if self.is_running() and not self.busy:
+            try:
+                _reader, _writer = await asyncio.open_connection('127.0.0.1', self.port)
+                _writer.write((json.dumps({'action': 'shutdown'}) + '\n').encode())
+                await _writer.drain()
+                await asyncio.wait_for(_reader.readline(), _timeout)
+                await asyncio.wait_for(self.process.wait(), _timeout)
+                _writer.close()
+            except (OSError, asyncio.TimeoutError):
+                pass
+        self.kill()
+        if self.drain_task is not None:
+            self.drain_task.cancel()
+            self.drain_task = None
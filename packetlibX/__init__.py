@@ -1,4 +1,7 @@
 from .plx_packet import *
 from .plx_regsettings import *
 from .plx_socket import *
-from .plx_data import *
\ No newline at end of file
+from .plx_data import *
+from .plx_emulator import *
+from .plx_capture import *
+from .plx_record import *
\ No newline at end of file
@@ -0,0 +1,175 @@
+import os, mmap, socket, struct, time
+from .plx_packet import *
+
+# * ---------------------------------------------------------------------------
+# * Raw capture of the received data datagrams
+# * - file header: magic, version, reserved ('<8sII', 16 bytes)
+# * - records:     receive time in s, length ('<dI', 12 bytes), datagram
+# * - little-endian and unpadded, so a file can be memory-mapped and
+# *   walked record by record without parsing the datagrams
+# * ---------------------------------------------------------------------------
+
+capture_magic           = b'H2GCAPT1'
+capture_version         = 1
+capture_file_format     = '<8sII'
+capture_record_format   = '<dI'
+capture_file_size       = struct.calcsize(capture_file_format)
+capture_record_size     = struct.calcsize(capture_record_format)
+capture_default_gap     = 0.05      # receive-time gap in s that ends a burst
+
+class capture_writer:
+    def __init__(self, path):
+        self.path    = path
+        self.records = 0
+        self.bytes   = 0
+        self.file    = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(struct.pack(capture_file_format, capture_magic, capture_version, 0))
+
+    def write(self, datagram, recv_time=None):
+        if recv_time is None:
+            recv_time = time.time()
+        self.file.write(struct.pack(capture_record_format, recv_time, len(datagram)))
+        self.file.write(datagram)
+        self.records += 1
+        self.bytes   += len(datagram)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# * - socket wrapper that records every non-empty datagram it receives
+class capture_socket:
+    def __init__(self, sock, writer):
+        self.sock   = sock
+        self.writer = writer
+
+    def recvfrom(self, bufsize, *flags):
+        data, addr = self.sock.recvfrom(bufsize, *flags)
+        if len(data) > 0:
+            self.writer.write(data)
+        return data, addr
+
+    def recv(self, bufsize, *flags):
+        data = self.sock.recv(bufsize, *flags)
+        if len(data) > 0:
+            self.writer.write(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+def read_capture_index(path):
+    """ Return the memory-mapped capture and the (offset, length, time) of every record. """
+    with open(path, 'rb') as f:
+        if os.path.getsize(path) < capture_file_size:
+            print(f"Capture file {path} is too short")
+            return None, []
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _ = struct.unpack_from(capture_file_format, data, 0)
+    if magic != capture_magic or version != capture_version:
+        print(f"Capture file {path} has an unknown format")
+        data.close()
+        return None, []
+
+    records = []
+    offset  = capture_file_size
+    while offset + capture_record_size <= len(data):
+        recv_time, length = struct.unpack_from(capture_record_format, data, offset)
+        offset += capture_record_size
+        if offset + length > len(data):
+            print(f"Capture file {path} ends in a truncated record")
+            break
+        records.append((offset, length, recv_time))
+        offset += length
+    return data, records
+
+def read_capture_bursts(path, burst_gap=capture_default_gap):
+    """ Split a capture into bursts (lists of datagrams) at receive-time gaps. """
+    data, records = read_capture_index(path)
+    if data is None:
+        return []
+    bursts = []
+    last_time = None
+    for offset, length, recv_time in records:
+        if last_time is None or recv_time - last_time > burst_gap:
+            bursts.append([])
+        bursts[-1].append(data[offset:offset + length])
+        last_time = recv_time
+    data.close()
+    return bursts
+
+# * - replay source standing in for both the command and the data socket:
+# *   a generator start request (0 -> 1) releases the next captured burst,
+# *   recvfrom returns its datagrams back to back and raises socket.timeout
+# *   at the end of the burst, like the board going quiet
+class replay_socket:
+    def __init__(self, path, burst_gap=capture_default_gap, loop=False):
+        self.path      = path
+        self.burst_gap = burst_gap
+        self.loop      = loop
+        self.data, self.records = read_capture_index(path)
+        self.position  = 0
+        self.armed     = False
+        self.started   = False
+        self.gen_start_stop = 0
+        self.bursts_replayed = 0
+        self.timeout   = None
+
+    def sendto(self, data, addr):
+        if len(data) > 8 and data[8] == req_daq_gen_start_code:
+            _, _, _, daq_push, gen_start_stop, daq_start_stop = struct.unpack(req_daq_gen_start_format, data[:46])
+            if gen_start_stop == 1 and self.gen_start_stop == 0 and daq_start_stop != 0:
+                if self.started:
+                    self.skip_burst()
+                self.armed = True
+                self.bursts_replayed += 1
+            self.gen_start_stop = gen_start_stop
+        return len(data)
+
+    def recvfrom(self, bufsize, *flags):
+        if self.loop and self.position >= len(self.records) and len(self.records) > 0:
+            self.position = 0
+        if not self.armed or self.position >= len(self.records):
+            raise socket.timeout("replay burst finished")
+        offset, length, recv_time = self.records[self.position]
+        if self.position > 0 and recv_time - self.records[self.position - 1][2] > self.burst_gap and self.started:
+            # gap to the previous datagram: the current burst is over
+            self.armed   = False
+            self.started = False
+            raise socket.timeout("replay burst finished")
+        self.started   = True
+        self.position += 1
+        return self.data[offset:offset + min(length, bufsize)], None
+
+    def recv(self, bufsize, *flags):
+        return self.recvfrom(bufsize, *flags)[0]
+
+    def skip_burst(self):
+        # drop what is left of a burst that was not read to its end
+        while 0 < self.position < len(self.records) and self.records[self.position][2] - self.records[self.position - 1][2] <= self.burst_gap:
+            self.position += 1
+        self.started = False
+
+    def rewind(self):
+        self.position = 0
+        self.armed    = False
+        self.started  = False
+
+    def exhausted(self):
+        return not self.loop and self.position >= len(self.records)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
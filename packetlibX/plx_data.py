@@ -1,3 +1,6 @@
+import numpy as np
+from collections import deque
+
 def extract_values_192(bytes_input, verbose=False):
     """Extract data values from a 192-byte payload (32B header + 160B data)."""
     if len(bytes_input) != 192:
@@ -45,6 +48,19 @@ def extract_values_192(bytes_input, verbose=False):
         "_extracted_values": _extracted_values
     }
 
+# * - data datagram layout: 14-byte header, then 192-byte half packets,
+# *   7 per datagram or 46 with jumbo_en (the last one of a burst is padded)
+data_header_size        = 14
+data_payload_size       = 192
+data_payloads_normal    = 7
+data_payloads_jumbo     = 46
+
+def data_payloads_per_datagram(jumbo_en):
+    return data_payloads_jumbo if jumbo_en else data_payloads_normal
+
+def data_datagram_size(jumbo_en):
+    return data_header_size + data_payload_size * data_payloads_per_datagram(jumbo_en)
+
 def extract_raw_data(data):
     HEADER_SIZE = 14
     PAYLOAD_SIZE = 192
@@ -65,6 +81,98 @@ def extract_raw_data(data):
 
     return payloads
 
+# * ---------------------------------------------------------------------------
+# * UDP packet counter
+# * - bytes 0-3 of every datagram of the board (big-endian), followed by the
+# *   last octet of the board ip (byte 4) and the board port (byte 5); the
+# *   command replies and the data datagrams count separately
+# * ---------------------------------------------------------------------------
+def datagram_counter(data):
+    if len(data) < 4:
+        return None
+    return int.from_bytes(data[0:4], 'big')
+
+class counter_tracker:
+    """ Sequence continuity of the udp packet counter of one stream.
+
+    missing:    counters skipped by a forward jump, a late datagram that
+                fills such a gap is taken back out
+    reordered:  datagrams older than the newest one, not seen before
+    duplicates: counters received twice (within the last `window`)
+    unaligned:  chunks without a datagram header at the front (TCP
+                forwarding of the pool may split or join datagrams)
+    """
+    def __init__(self, window=4096):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.received   = 0
+        self.missing    = 0
+        self.reordered  = 0
+        self.duplicates = 0
+        self.unaligned  = 0
+        self.forget()
+
+    # * - the counter restarts after a board reset
+    def forget(self):
+        self.last       = None
+        self.recent     = deque()
+        self.recent_set = set()
+
+    def remember(self, counter):
+        if len(self.recent) >= self.window:
+            self.recent_set.discard(self.recent.popleft())
+        self.recent.append(counter)
+        self.recent_set.add(counter)
+
+    def update(self, counter):
+        """ Account one counter, returns 'first', 'next', 'gap', 'reordered' or 'duplicate'. """
+        self.received += 1
+        if self.last is None:
+            self.last = counter
+            self.remember(counter)
+            return 'first'
+        if counter in self.recent_set:
+            self.duplicates += 1
+            return 'duplicate'
+        self.remember(counter)
+        _step = (counter - self.last) & 0xFFFFFFFF
+        if _step < 0x80000000:
+            self.missing += _step - 1
+            self.last = counter
+            return 'next' if _step == 1 else 'gap'
+        self.reordered += 1
+        self.missing = max(self.missing - 1, 0)
+        return 'reordered'
+
+    def update_datagram(self, data, board_octet=None):
+        """ Account a received datagram, chunks without a header are only counted as unaligned. """
+        if len(data) < 14 or (board_octet is not None and data[4] != board_octet):
+            self.unaligned += 1
+            return None
+        return self.update(datagram_counter(data))
+
+    def snapshot(self):
+        return {
+            'received'  : self.received,
+            'missing'   : self.missing,
+            'reordered' : self.reordered,
+            'duplicates': self.duplicates,
+            'unaligned' : self.unaligned,
+        }
+
+    def delta(self, before):
+        """ Counts since an earlier snapshot. """
+        return {_key: _value - before.get(_key, 0) for _key, _value in self.snapshot().items()}
+
+    def loss_rate(self):
+        _expected = self.received - self.duplicates + self.missing
+        return self.missing / _expected if _expected > 0 else 0.0
+
+    def summary(self):
+        return f"received {self.received}, missing {self.missing} ({100 * self.loss_rate():.3f}%), reordered {self.reordered}, duplicates {self.duplicates}"
+
 def DaqH_get_H1(_daqh):
     if len(_daqh) != 4:
         return None
@@ -87,4 +195,36 @@ def DaqH_get_H3(_daqh):
 
 def DaqH_start_end_good(_daqh):
     # return ((_daqh[-1] & 0x0F) == 0x05)
-    return ((_daqh[0] >> 4) == 0x0F or (_daqh[0] >> 4) == 0x05 or (_daqh[0] >> 4) == 0x02) and ((_daqh[-1] & 0x0F) == 0x05 or (_daqh[-1] & 0x0F) == 0x02)
\ No newline at end of file
+    return ((_daqh[0] >> 4) == 0x0F or (_daqh[0] >> 4) == 0x05 or (_daqh[0] >> 4) == 0x02) and ((_daqh[-1] & 0x0F) == 0x05 or (_daqh[-1] & 0x0F) == 0x02)
+
+def payload_block(payloads):
+    """Stack 192-byte payloads into an (n, 192) uint8 array, other lengths are skipped."""
+    payloads = [p for p in payloads if len(p) == 192]
+    if len(payloads) == 0:
+        return np.zeros((0, 192), dtype=np.uint8)
+    return np.frombuffer(b''.join(payloads), dtype=np.uint8).reshape(-1, 192)
+
+def extract_values_block(block):
+    """Vectorized extract_values_192 of an (n, 192) uint8 payload block.
+
+    Returns:
+        dict: _timestamp (n,), _address_id (n,), _packet_id (n,), _good (n,)
+        hamming bits clear and DaqH start/end good, _values (3, n, 37)
+        val0, val1, val2 of the 37 words of each payload.
+    """
+    block = np.asarray(block, dtype=np.uint8).reshape(-1, 192)
+    timestamps = block[:, 16:24].copy().view('>u8').reshape(-1).astype(np.int64)
+    daqh_first = block[:, 32]
+    daqh_last  = block[:, 35]
+    start_good = np.isin(daqh_first >> 4, (0x0F, 0x05, 0x02))
+    end_good   = np.isin(daqh_last & 0x0F, (0x05, 0x02))
+    good       = start_good & end_good & ((daqh_last & 0x70) == 0)
+    words  = block[:, 36:184].copy().view('>u4').astype(np.uint32)
+    values = np.stack([(words >> 20) & 0x3FF, (words >> 10) & 0x3FF, words & 0x3FF])
+    return {
+        "_timestamp": timestamps,
+        "_address_id": block[:, 2].copy(),
+        "_packet_id": block[:, 3].copy(),
+        "_good": good,
+        "_values": values
+    }
@@ -0,0 +1,398 @@
+import socket, struct, time
+import numpy as np
+from .plx_packet import *
+
+# * ---------------------------------------------------------------------------
+# * Software emulator of the KCU FPGA and its H2GCROC ASICs
+# * - speaks the plx_packet command formats on the board UDP port
+# * - keeps an I2C register memory per ASIC (sub-address x 32 bytes)
+# * - replies to bitslip / debug requests with a configurable lock window
+# * - sends machine-gun bursts of 192-byte half-packets on generator start
+# * - simple analog model: pedestal vs inv_vref / trim_inv, ToA and ToT
+# *   turn-on vs the 12-bit injection DAC and toa/tot vref / trims
+# * ---------------------------------------------------------------------------
+
+emulator_bc_per_shot        = 164
+emulator_header_size        = 14
+emulator_payload_size       = 192
+emulator_payloads_normal    = 7
+emulator_payloads_jumbo     = 46
+emulator_locked_pattern     = 0xaccccccc
+emulator_unlocked_pattern   = 0x5a5a5a5a
+
+emulator_default_model = {
+    'ped_half_mean'     : 120.0,    # pedestal of a half at inv_vref 512 and trim_inv 31
+    'ped_half_spread'   : 15.0,
+    'ped_chn_spread'    : 10.0,     # channel offsets, compensated by trim_inv
+    'ped_vref_gain'     : -0.5,     # adc per inv_vref code
+    'ped_trim_gain'     : 1.2,      # adc per trim_inv code
+    'ped_noise'         : 1.5,
+    'inj_adc_gain'      : 0.25,     # adc per 12b dac code in the injected sample
+    'inj_sample'        : 3,        # machine-gun sample carrying the injected pulse
+    'toa_vref_zero'     : 100.0,    # toa_vref where the half turns on at dac 0
+    'toa_vref_gain'     : 1.0,      # turn-on dac per toa_vref code
+    'toa_trim_gain'     : 1.5,      # turn-on dac per trim_toa code (decreasing)
+    'toa_chn_spread'    : 6.0,
+    'toa_value'         : 400.0,
+    'tot_vref_zero'     : 150.0,
+    'tot_vref_gain'     : 1.0,
+    'tot_trim_gain'     : 3.0,
+    'tot_chn_spread'    : 15.0,
+    'tot_value'         : 100.0,
+    'tot_value_gain'    : 0.3,      # tot per dac code above the turn-on
+    'dead_adc'          : 5,        # flat adc value of dead channels
+}
+
+def emulator_raw_to_valid(raw_index_in_half, half_index):
+    if raw_index_in_half == 0 or raw_index_in_half == 19:
+        return -1
+    if raw_index_in_half < 19:
+        return half_index * 36 + raw_index_in_half - 1
+    return half_index * 36 + raw_index_in_half - 2
+
+class board_emulator:
+    def __init__(self, board_ip, board_port, pc_ip, pc_cmd_port, pc_data_port, asic_num=2, lock_window=(200, 300), dead_channels=[], model=None, seed=0, loss_rate=0.0, latency=0.0, verbose=False):
+        self.board_ip       = board_ip
+        self.board_port     = board_port
+        self.pc_ip          = pc_ip
+        self.pc_cmd_port    = pc_cmd_port
+        self.pc_data_port   = pc_data_port
+        self.asic_num       = asic_num
+        self.lock_window    = lock_window
+        self.dead_channels  = list(dead_channels)
+        self.loss_rate      = loss_rate     # probability to drop an outgoing datagram
+        self.latency        = latency       # seconds before a reply or burst is sent
+        self.verbose        = verbose
+        self.fpga_address   = int(board_ip.split('.')[-1]) - 208
+
+        self.model = dict(emulator_default_model)
+        if model is not None:
+            self.model.update(model)
+
+        self.registers = [dict() for _ in range(asic_num)]
+        self.bitslip   = [[bytes(10), bytes(10)] for _ in range(asic_num)]
+        self.daq_gen_packet = bytearray(struct.calcsize(req_daq_gen2_write_format))
+        self.daq_start_stop = 0
+        self.gen_start_stop = 0
+        self.timestamp      = 0x1000
+        self.cmd_counter    = 0
+        self.data_counter   = 0
+        self.asic_packet_counter = [0] * 8
+
+        self.rng     = np.random.default_rng(seed)
+        self.net_rng = np.random.default_rng(seed + 1)
+        self.reset_stats()
+        self.ped_half_offset = self.rng.normal(self.model['ped_half_mean'], self.model['ped_half_spread'], (asic_num, 2, 1))
+        self.ped_chn_offset  = self.rng.normal(0.0, self.model['ped_chn_spread'], (asic_num, 2, 37))
+        self.toa_chn_offset  = self.rng.normal(0.0, self.model['toa_chn_spread'], (asic_num, 2, 37))
+        self.tot_chn_offset  = self.rng.normal(0.0, self.model['tot_chn_spread'], (asic_num, 2, 37))
+
+        self.socket = None
+
+    # * --- Sockets --- *
+    def open(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try: self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        except (AttributeError, OSError): pass
+        self.socket.bind((self.board_ip, self.board_port))
+        self.socket.settimeout(0.5)
+        print(f"[Emulator] Board {self.board_ip}:{self.board_port} (FPGA {self.fpga_address}, {self.asic_num} ASICs) -> PC {self.pc_ip}:{self.pc_cmd_port}/{self.pc_data_port}", flush=True)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def serve_forever(self, stop_event=None):
+        if self.socket is None:
+            self.open()
+        try:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    data, _ = self.socket.recvfrom(8192)
+                except socket.timeout:
+                    continue
+                self.handle_request(data)
+        finally:
+            self.close()
+
+    # * --- Statistics --- *
+    def reset_stats(self):
+        self.stats = {
+            'requests'      : {},
+            'round_trips'   : 0,
+            'measurements'  : 0,
+            'data_packets'  : 0,
+            'data_bytes'    : 0,
+            'dropped'       : 0,
+        }
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['requests'] = dict(self.stats['requests'])
+        return stats
+
+    def network_send(self, datagram, port):
+        if self.loss_rate > 0 and self.net_rng.random() < self.loss_rate:
+            self.stats['dropped'] += 1
+            return False
+        self.socket.sendto(datagram, (self.pc_ip, port))
+        return True
+
+    def send_reply(self, reply):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        reply = bytearray(reply)
+        # leading bytes: udp packet counter, board ip and port
+        reply[0:4] = self.cmd_counter.to_bytes(4, 'big')
+        reply[4]   = int(self.board_ip.split('.')[-1]) & 0xFF
+        reply[5]   = self.board_port & 0xFF
+        self.cmd_counter = (self.cmd_counter + 1) & 0xFFFFFFFF
+        self.stats['round_trips'] += 1
+        self.network_send(bytes(reply), self.pc_cmd_port)
+
+    # * --- Requests --- *
+    def handle_request(self, data):
+        if len(data) < 9:
+            return
+        header       = data[6]
+        fpga_address = data[7]
+        packet_type  = data[8]
+        asic_index   = header & 0x0F
+        self.stats['requests'][f'0x{packet_type:02X}'] = self.stats['requests'].get(f'0x{packet_type:02X}', 0) + 1
+        if self.verbose:
+            print(f"[Emulator] request 0x{packet_type:02X} for ASIC {asic_index}")
+        if packet_type == req_i2c_write_code:
+            self.handle_i2c_write(data, asic_index)
+        elif packet_type == req_i2c_read_code:
+            self.handle_i2c_read(data, header, fpga_address, asic_index)
+        elif packet_type == req_daq_gen_write_code:
+            self.daq_gen_packet = bytearray(data[:len(self.daq_gen_packet)])
+        elif packet_type == req_daq_gen_read_code:
+            reply = bytearray(self.daq_gen_packet)
+            reply[6], reply[7], reply[8] = header, fpga_address, req_daq_gen_read_code
+            self.send_reply(reply)
+        elif packet_type == req_daq_gen_start_code:
+            self.handle_daq_gen_start(data)
+        elif packet_type == req_set_bitslip_code:
+            self.handle_set_bitslip(data, asic_index)
+        elif packet_type == req_get_bitslip_code:
+            self.handle_get_bitslip(header, fpga_address, asic_index)
+        elif packet_type == req_get_debug_data_code:
+            self.handle_get_debug_data(header, fpga_address, asic_index)
+        elif packet_type == req_status_code:
+            self.handle_status(header, fpga_address)
+        elif packet_type == req_sys_monitor_code:
+            self.handle_sys_monitor(header, fpga_address)
+        elif packet_type == req_get_pack_counter_code:
+            self.handle_pack_counter(header, fpga_address)
+        elif packet_type in (req_reset_adj_code, req_set_parameters_code, req_trg_param_write_code):
+            pass
+        elif self.verbose:
+            print(f"[Emulator] Unsupported request type 0x{packet_type:02X}")
+
+    def register_block(self, asic_index, subaddr):
+        if asic_index >= self.asic_num:
+            return None
+        if subaddr not in self.registers[asic_index]:
+            self.registers[asic_index][subaddr] = bytearray(32)
+        return self.registers[asic_index][subaddr]
+
+    def handle_i2c_write(self, data, asic_index):
+        _, _, _, byte5, subaddr_10_3, byte7, *payload = struct.unpack(req_i2c_write_format, data[:46])
+        length  = byte5 & 0x3F
+        subaddr = (subaddr_10_3 << 3) | ((byte7 & 0xE0) >> 5)
+        regaddr = byte7 & 0x1F
+        block = self.register_block(asic_index, subaddr)
+        if block is None:
+            return
+        length = min(length, 32 - regaddr)
+        block[regaddr:regaddr + length] = bytes(payload[:length])
+
+    def handle_i2c_read(self, data, header, fpga_address, asic_index):
+        _, _, _, byte5, subaddr_10_3, byte7 = struct.unpack(req_i2c_read_format, data[:46])
+        subaddr = (subaddr_10_3 << 3) | ((byte7 & 0xE0) >> 5)
+        regaddr = byte7 & 0x1F
+        block = self.register_block(asic_index, subaddr)
+        if block is None:
+            return
+        payload = bytes(block[regaddr:]) + bytes(regaddr)
+        self.send_reply(struct.pack(rpy_i2c_read_format, header, fpga_address, req_i2c_read_code, byte5, subaddr_10_3, byte7, *payload))
+
+    def handle_set_bitslip(self, data, asic_index):
+        unpacked = struct.unpack(req_set_bitslip_format, data[:46])
+        if asic_index >= self.asic_num:
+            return
+        self.bitslip[asic_index] = [bytes(unpacked[4:14]), bytes(unpacked[14:24])]
+
+    def handle_get_bitslip(self, header, fpga_address, asic_index):
+        if asic_index >= self.asic_num:
+            return
+        a0, a1 = self.bitslip[asic_index]
+        self.send_reply(struct.pack(rpy_get_bitslip_format, header, fpga_address, req_get_bitslip_code, *a0, *a1))
+
+    def line_delay(self, asic_index, line_index):
+        # line_index: 0-3 trigger lines, 4-5 data lines, from the a0/a1 block of the asic
+        block = self.bitslip[asic_index][asic_index % 2]
+        return (block[3 + line_index] << 1) | ((block[9] >> (5 - line_index)) & 0x01)
+
+    def handle_get_debug_data(self, header, fpga_address, asic_index):
+        if asic_index >= self.asic_num:
+            return
+        line_values = []
+        for _line in range(6):
+            _delay = self.line_delay(asic_index, _line)
+            _locked = self.lock_window[0] <= _delay <= self.lock_window[1]
+            line_values.append(emulator_locked_pattern if _locked else emulator_unlocked_pattern)
+        line_bytes = b''.join(v.to_bytes(4, 'big') for v in line_values)
+        bx_counter = self.timestamp & 0xFFF
+        self.send_reply(struct.pack(rpy_get_debug_data_format, header, fpga_address, req_get_debug_data_code, bx_counter >> 8, bx_counter & 0xFF, 0, 0, 0x3F, 0, 0, 0, 0, *line_bytes))
+
+    def handle_status(self, header, fpga_address):
+        status = [0] * 37
+        status[1] = 0x01        # hw main version
+        status[2] = 0x01        # fw main version
+        status[3] = (1 << self.asic_num) - 1
+        status[25] = self.daq_start_stop
+        status[28] = 0x02 | (self.gen_start_stop & 0x01)
+        self.send_reply(struct.pack(rpy_status_format, header, fpga_address, req_status_code, *status))
+
+    def handle_sys_monitor(self, header, fpga_address):
+        monitor = [0x01, 0x00, 0x9C, 0x40, 0x55, 0x55, 0x55, 0x55, 0xE3, 0x8E, 0xE3, 0x8E]
+        self.send_reply(struct.pack(rpy_sys_monitor_format, header, fpga_address, req_sys_monitor_code, *monitor, self.daq_gen_packet[18] & 0x01, self.asic_num, 0x01, 0x00))
+
+    def handle_pack_counter(self, header, fpga_address):
+        counters = []
+        for _count in self.asic_packet_counter:
+            counters += [(_count >> 16) & 0xFF, (_count >> 8) & 0xFF, _count & 0xFF]
+        self.send_reply(struct.pack(rpy_get_pack_counter_format, header, fpga_address, req_get_pack_counter_code, *counters))
+
+    def handle_daq_gen_start(self, data):
+        _, _, _, daq_push, gen_start_stop, daq_start_stop = struct.unpack(req_daq_gen_start_format, data[:46])
+        self.daq_start_stop = daq_start_stop
+        started = gen_start_stop == 1 and self.gen_start_stop == 0
+        self.gen_start_stop = gen_start_stop
+        if started and self.daq_start_stop != 0:
+            self.send_burst()
+
+    # * --- DAQ generator --- *
+    def daq_gen_setting(self):
+        settings = struct.unpack(req_daq_gen2_write_format, bytes(self.daq_gen_packet))
+        fields = settings[5:]
+        return {
+            'jumbo_en'       : fields[5],
+            'gen_nr_of_cycle': int.from_bytes(bytes(fields[9:13]), 'big'),
+            'gen_interval'   : int.from_bytes(bytes(fields[13:17]), 'big'),
+            'machine_gun'    : fields[18],
+            'asic_collection': fields[25:33],
+        }
+
+    def send_burst(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self.stats['measurements'] += 1
+        setting = self.daq_gen_setting()
+        asic_list = [_asic for _asic in range(self.asic_num) if setting['asic_collection'][_asic] != 0 and (self.daq_start_stop >> _asic) & 0x01]
+        datagrams = self.burst_datagrams(asic_list, setting['machine_gun'], max(setting['gen_nr_of_cycle'], 1), setting['gen_interval'], setting['jumbo_en'])
+        for _datagram in datagrams:
+            if self.network_send(_datagram, self.pc_data_port):
+                self.stats['data_packets'] += 1
+                self.stats['data_bytes']   += len(_datagram)
+
+    def burst_datagrams(self, asic_list, machine_gun, cycles=1, gen_interval=1, jumbo_en=0):
+        # also used by the benchmarks to build realistic data fixtures
+        payloads = []
+        for _cycle in range(cycles):
+            _values = [self.model_values(_asic, machine_gun) for _asic in asic_list]
+            for _sample in range(machine_gun + 1):
+                _timestamp = self.timestamp + _sample * emulator_bc_per_shot
+                for _asic_pos, _asic in enumerate(asic_list):
+                    for _half in range(2):
+                        payloads.append(self.half_packet(_asic, _half, _timestamp, _values[_asic_pos][:, _sample, _half, :]))
+                    self.asic_packet_counter[_asic] = (self.asic_packet_counter[_asic] + 2) & 0xFFFFFF
+            self.timestamp += (machine_gun + 1) * emulator_bc_per_shot + max(gen_interval, 1)
+
+        per_packet = emulator_payloads_jumbo if jumbo_en else emulator_payloads_normal
+        return [self.data_datagram(payloads[_start:_start + per_packet], per_packet) for _start in range(0, len(payloads), per_packet)]
+
+    def data_datagram(self, payloads, per_packet):
+        header = bytearray(emulator_header_size)
+        header[0:4] = self.data_counter.to_bytes(4, 'big')
+        header[4]   = int(self.board_ip.split('.')[-1]) & 0xFF
+        header[5]   = self.board_port & 0xFF
+        self.data_counter = (self.data_counter + 1) & 0xFFFFFFFF
+        # the last packet of a burst is padded to the full datagram size
+        padding = bytes(emulator_payload_size * (per_packet - len(payloads)))
+        return bytes(header) + b''.join(payloads) + padding
+
+    def half_packet(self, asic_index, half_index, timestamp, values):
+        # values: [3][37] adc, tot, toa of the 37 words of the half
+        words = (values[0].astype(np.uint32) << 20) | (values[1].astype(np.uint32) << 10) | values[2].astype(np.uint32)
+        head = bytearray(32)
+        head[0], head[1] = 0xAA, 0x5A
+        head[2] = ((self.fpga_address & 0x0F) << 4) | (asic_index & 0x0F)
+        head[3] = rpy_dq0_code + half_index
+        head[16:24] = int(timestamp).to_bytes(8, 'big')
+        # DaqH: start nibble 0xF, end nibble 0x5, hamming bits cleared
+        daqh = bytes([0xF0 | ((timestamp >> 8) & 0x0F), timestamp & 0xFF, 0x00, 0x05])
+        return bytes(head) + daqh + words.astype('>u4').tobytes() + bytes(8)
+
+    # * --- Analog model --- *
+    def half_register_values(self, asic_index, half_index):
+        ref = self.register_block(asic_index, subblock_address_dict[f"Reference_Voltage_{half_index}"])
+        return {
+            'inv_vref' : (ref[4] << 2) | ((ref[1] >> 2) & 0x03),
+            'toa_vref' : (ref[3] << 2) | ((ref[1] >> 4) & 0x03),
+            'tot_vref' : (ref[2] << 2) | ((ref[1] >> 6) & 0x03),
+            'dac'      : ref[6] | ((ref[7] & 0x0F) << 8),
+            'intctest' : (ref[7] & 0x40) != 0,
+        }
+
+    def model_values(self, asic_index, machine_gun):
+        m = self.model
+        shape = (machine_gun + 1, 2, 37)
+        adc = np.zeros(shape)
+        tot = np.zeros(shape)
+        toa = np.zeros(shape)
+        inj_sample = min(int(m['inj_sample']), machine_gun)
+
+        for _half in range(2):
+            _ref = self.half_register_values(asic_index, _half)
+            _trim_inv = np.zeros(37)
+            _trim_toa = np.zeros(37)
+            _trim_tot = np.zeros(37)
+            _injected = np.zeros(37, dtype=bool)
+            _dead     = np.zeros(37, dtype=bool)
+            for _j in range(37):
+                _valid = emulator_raw_to_valid(_j, _half)
+                if _valid == -1:
+                    _trim_inv[_j] = 31
+                    continue
+                _chn = self.register_block(asic_index, subblock_address_dict[f"Channel_{_valid}"])
+                _trim_toa[_j] = _chn[1] >> 2
+                _trim_tot[_j] = _chn[2] >> 2
+                _trim_inv[_j] = _chn[3] >> 2
+                _injected[_j] = _ref['intctest'] and (_chn[4] & 0x06) != 0
+                _dead[_j]     = asic_index * 72 + _valid in self.dead_channels
+
+            _pedestal = self.ped_half_offset[asic_index, _half] + self.ped_chn_offset[asic_index, _half] \
+                + m['ped_vref_gain'] * (_ref['inv_vref'] - 512) + m['ped_trim_gain'] * (_trim_inv - 31)
+            adc[:, _half, :] = _pedestal + self.rng.normal(0.0, m['ped_noise'], (machine_gun + 1, 37))
+
+            _dac = _ref['dac']
+            _toa_on = m['toa_vref_gain'] * (_ref['toa_vref'] - m['toa_vref_zero']) - m['toa_trim_gain'] * (_trim_toa - 32) + self.toa_chn_offset[asic_index, _half]
+            _tot_on = m['tot_vref_gain'] * (_ref['tot_vref'] - m['tot_vref_zero']) - m['tot_trim_gain'] * (_trim_tot - 32) + self.tot_chn_offset[asic_index, _half]
+            _jitter = self.rng.normal(0.0, 0.5, 37)
+            _toa_fired = _injected & (_dac + _jitter >= _toa_on)
+            _tot_fired = _injected & (_dac + _jitter >= _tot_on)
+            adc[inj_sample, _half, _injected] += m['inj_adc_gain'] * _dac
+            toa[inj_sample, _half, _toa_fired] = m['toa_value'] + self.rng.normal(0.0, 2.0, int(_toa_fired.sum()))
+            tot[inj_sample, _half, _tot_fired] = m['tot_value'] + m['tot_value_gain'] * (_dac - _tot_on[_tot_fired]) + self.rng.normal(0.0, 2.0, int(_tot_fired.sum()))
+
+            adc[:, _half, _dead] = m['dead_adc']
+            toa[:, _half, _dead] = 0
+            tot[:, _half, _dead] = 0
+
+        values = np.stack([adc, tot, toa])
+        return np.clip(np.rint(values), 0, 1023).astype(np.uint32)
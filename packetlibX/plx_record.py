@@ -0,0 +1,123 @@
+import os, mmap, json, struct, time
+import numpy as np
+from .plx_capture import *
+
+# * ---------------------------------------------------------------------------
+# * Continuous recording of the data datagrams into rotating files
+# * - every file is a capture file (see plx_capture), so read_capture_index,
+# *   read_capture_bursts and replay_socket work on it unchanged
+# * - the files are preallocated and memory-mapped, datagrams are received
+# *   with recv_into straight behind their record header; a file is cut to
+# *   its used size when it is closed
+# * - next to every file an index (<name>.idx.npy, record_index_dtype) and
+# *   for the run an index.json with the files, their record count and time
+# *   range
+# * ---------------------------------------------------------------------------
+
+record_default_file_size    = 1 << 30       # bytes per file before rotation
+record_max_datagram         = 9000          # jumbo frame
+record_index_dtype          = np.dtype([('offset', '<u8'), ('length', '<u4'), ('time', '<f8'), ('counter', '<u4')])
+
+class record_writer:
+    def __init__(self, folder, prefix='run', file_size=record_default_file_size, max_datagram=record_max_datagram):
+        self.folder       = folder
+        self.prefix       = prefix
+        self.file_size    = max(file_size, capture_file_size + capture_record_size + max_datagram)
+        self.max_datagram = max_datagram
+        self.files        = []      # summaries of the closed files
+        self.records      = 0
+        self.bytes        = 0
+        self.last_counter = None
+        self.file_index   = -1
+        self.file         = None
+        os.makedirs(folder, exist_ok=True)
+        self.open_file()
+
+    def open_file(self):
+        self.file_index += 1
+        self.path = os.path.join(self.folder, f'{self.prefix}_{self.file_index:04d}.h2gcap')
+        self.file = open(self.path, 'w+b')
+        try:
+            os.posix_fallocate(self.file.fileno(), 0, self.file_size)
+        except (AttributeError, OSError):
+            self.file.truncate(self.file_size)
+        self.map    = mmap.mmap(self.file.fileno(), self.file_size)
+        self.view   = memoryview(self.map)
+        struct.pack_into(capture_file_format, self.map, 0, capture_magic, capture_version, 0)
+        self.offset = capture_file_size
+        self.index  = []
+
+    def close_file(self):
+        if self.file is None:
+            return
+        self.view.release()
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.offset)
+        self.file.close()
+        self.file = None
+        _index = np.array(self.index, dtype=record_index_dtype)
+        np.save(self.path[:-len('.h2gcap')] + '.idx.npy', _index)
+        self.files.append({
+            'file'      : os.path.basename(self.path),
+            'records'   : len(_index),
+            'bytes'     : int(self.offset),
+            'first_time': float(_index['time'][0]) if len(_index) > 0 else None,
+            'last_time' : float(_index['time'][-1]) if len(_index) > 0 else None,
+        })
+        with open(os.path.join(self.folder, 'index.json'), 'w') as f:
+            json.dump({'prefix': self.prefix, 'files': self.files}, f, indent=4)
+
+    def rotate(self):
+        self.close_file()
+        self.open_file()
+
+    def commit(self, length, recv_time):
+        # record header in front of the datagram already in the map
+        _start = self.offset + capture_record_size
+        struct.pack_into(capture_record_format, self.map, self.offset, recv_time, length)
+        self.last_counter = int.from_bytes(self.map[_start:_start + 4], 'big') if length >= 4 else None
+        self.index.append((_start, length, recv_time, self.last_counter or 0))
+        self.offset  = _start + length
+        self.records += 1
+        self.bytes   += length
+
+    def room(self, size):
+        if self.offset + capture_record_size + size > self.file_size:
+            self.rotate()
+
+    def receive(self, sock):
+        """ recv_into the current file, returns the datagram size (0 if nothing was received). """
+        self.room(self.max_datagram)
+        _start = self.offset + capture_record_size
+        _slot  = self.view[_start:_start + self.max_datagram]
+        try:
+            _size = sock.recv_into(_slot)
+        finally:
+            _slot.release()
+        if _size > 0:
+            self.commit(_size, time.time())
+        return _size
+
+    def write(self, datagram, recv_time=None):
+        """ Copy a datagram into the current file. """
+        _size = len(datagram)
+        self.room(_size)
+        _start = self.offset + capture_record_size
+        self.view[_start:_start + _size] = datagram
+        self.commit(_size, time.time() if recv_time is None else recv_time)
+
+    def last_datagram(self):
+        """ View of the last recorded datagram, release it before the next receive. """
+        _start, _length = self.index[-1][0], self.index[-1][1]
+        return self.view[_start:_start + _length]
+
+    def close(self):
+        self.close_file()
+
+def read_record_index(folder):
+    """ Return the run index.json and the per-file record indices. """
+    with open(os.path.join(folder, 'index.json'), 'r') as f:
+        run_index = json.load(f)
+    file_indices = [np.load(os.path.join(folder, _file['file'][:-len('.h2gcap')] + '.idx.npy')) for _file in run_index['files']]
+    return run_index, file_indices
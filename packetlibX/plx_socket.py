@@ -1,4 +1,4 @@
-import socket
+import os, sys, socket, struct
 from .plx_packet import *
 import time
 
@@ -582,4 +582,99 @@ def send_daq_gen_start_stop(socket, addr, port, fpga_addr, daq_push, gen_start_s
         for i in range(0, len(data_packet), 8):
             print(" ".join(f"{b:02X}" for b in data_packet[i:i+8]))
     socket.sendto(data_packet, (addr, port))
-    return True
\ No newline at end of file
+    return True
+
+# SO_RCVBUFFORCE/SO_SNDBUFFORCE ignore net.core.rmem_max/wmem_max but need
+# CAP_NET_ADMIN, not every Python build exports them
+socket_buffer_force = {
+    socket.SO_RCVBUF: getattr(socket, 'SO_RCVBUFFORCE', 33 if sys.platform.startswith('linux') else None),
+    socket.SO_SNDBUF: getattr(socket, 'SO_SNDBUFFORCE', 32 if sys.platform.startswith('linux') else None),
+}
+
+def set_socket_buffer(_socket, size, option=socket.SO_RCVBUF):
+    """ Request a kernel buffer size, returns the effective size (Linux reports twice the request). """
+    force = socket_buffer_force.get(option)
+    try:
+        if force is None:
+            raise PermissionError
+        _socket.setsockopt(socket.SOL_SOCKET, force, size)
+    except (PermissionError, OSError):
+        _socket.setsockopt(socket.SOL_SOCKET, option, size)
+    return _socket.getsockopt(socket.SOL_SOCKET, option)
+
+def socket_buffer_sizes(_socket):
+    return _socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), _socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+
+def udp_socket_stats(_socket):
+    """ Receive queue and kernel drop counter of a UDP socket from /proc/net/udp(6), None where unavailable. """
+    try:
+        inode = str(os.fstat(_socket.fileno()).st_ino)
+    except (OSError, ValueError):
+        return None
+    for table in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(table, 'r') as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) >= 13 and fields[9] == inode:
+                return {
+                    'rx_queue': int(fields[4].split(':')[1], 16),
+                    'tx_queue': int(fields[4].split(':')[0], 16),
+                    'drops'   : int(fields[12]),
+                }
+    return None
+
+# * ---------------------------------------------------------------------------
+# * Length-prefixed datagrams on a TCP connection of the socket pool
+# * - a worker asks for it in its hello ("framing": "length"), the pool then
+# *   sends every forwarded datagram as '<I' length + datagram
+# * - TCP keeps no datagram boundaries, without the framing a read of the
+# *   datagram size only works while every datagram has exactly that size
+# * ---------------------------------------------------------------------------
+frame_header_format = '<I'
+frame_header_size   = struct.calcsize(frame_header_format)
+
+class framed_socket:
+    def __init__(self, sock):
+        self.sock   = sock
+        self.buffer = bytearray()
+
+    def next_frame(self):
+        if len(self.buffer) < frame_header_size:
+            return None
+        length = struct.unpack_from(frame_header_format, self.buffer, 0)[0]
+        if len(self.buffer) < frame_header_size + length:
+            return None
+        frame = bytes(self.buffer[frame_header_size:frame_header_size + length])
+        del self.buffer[:frame_header_size + length]
+        return frame
+
+    # * - one whole datagram, whatever bufsize is; a timeout keeps the part
+    # *   of a frame received so far for the next call
+    def recvfrom(self, bufsize, *flags):
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame, None
+            chunk = self.sock.recv(max(bufsize, 65536))
+            if len(chunk) == 0:
+                return b'', None
+            self.buffer += chunk
+
+    def recv(self, bufsize, *flags):
+        return self.recvfrom(bufsize, *flags)[0]
+
+    # * - one whole datagram into buffer, cut to its size as a UDP socket
+    # *   does; the raw socket's recv_into would read the frame headers
+    def recv_into(self, buffer, nbytes=0, *flags):
+        frame = self.recvfrom(0)[0]
+        view = memoryview(buffer).cast('B')
+        size = min(len(frame), nbytes if nbytes > 0 else len(view))
+        view[:size] = frame[:size]
+        return size
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)